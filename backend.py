@@ -0,0 +1,313 @@
+"""
+LP/MIP backends of the master problems.
+Rows and columns are identified by their index, in the order they were added,
+removing columns moves the following ones down.
+Bases use the gurobi convention: 0 basic, -1 nonbasic at lower bound,
+-2 nonbasic at upper bound, -3 superbasic.
+"""
+GUROBI = "gurobi"
+GLPK = "glpk"
+
+GREATER_EQUAL = ">"
+LESS_EQUAL = "<"
+EQUAL = "="
+
+
+def create_backend(backend, name="master"):
+    if backend == GUROBI:
+        return GurobiBackend(name)
+    elif backend == GLPK:
+        return GlpkBackend(name)
+    raise ValueError("Unknown backend %s" % backend)
+
+
+class GurobiBackend:
+    def __init__(self, name="master", model=None):
+        import gurobipy
+        self._grb = gurobipy
+        if model is None:
+            model = gurobipy.Model(name)
+            model.params.outputflag = 0
+        self._m = model
+        self._rows = model.getConstrs()
+        self._cols = model.getVars()
+
+    def _bound(self, val):
+        if val == float("inf"):
+            return self._grb.GRB.INFINITY
+        if val == -float("inf"):
+            return -self._grb.GRB.INFINITY
+        return val
+
+    def add_row(self, sense, rhs, name=""):
+        constr = self._m.addConstr(0, sense, rhs, name=name)
+        self._rows.append(constr)
+        return len(self._rows) - 1
+
+    def add_col(self, obj, lb, ub, rows, coeffs, name=""):
+        grb_col = self._grb.Column(coeffs, [self._rows[i] for i in rows])
+        v = self._m.addVar(self._bound(lb), self._bound(ub), obj, self._grb.GRB.CONTINUOUS, name, grb_col)
+        self._cols.append(v)
+        return len(self._cols) - 1
+
+    def set_bounds(self, col, lb, ub):
+        v = self._cols[col]
+        v.lb = self._bound(lb)
+        v.ub = self._bound(ub)
+
+    def set_obj(self, col, obj):
+        self._cols[col].obj = obj
+
+    def remove_cols(self, cols):
+        """
+        Remove columns, the columns after them move down
+        :param cols: column indices
+        :return:
+        """
+        removed = set(cols)
+        self._m.remove([self._cols[j] for j in removed])
+        self._cols = [v for j, v in enumerate(self._cols) if j not in removed]
+
+    def num_cols(self):
+        return len(self._cols)
+
+    def update(self):
+        self._m.update()
+
+    def set_dual_simplex(self, dual_simplex):
+        self._m.params.method = 1 if dual_simplex else -1
+
+    def set_binary(self):
+        for v in self._cols:
+            v.vtype = self._grb.GRB.BINARY
+        self._m.update()
+
+    def set_time_limit(self, seconds):
+        self._m.params.timelimit = seconds
+
+    def optimize(self):
+        self._m.optimize()
+
+    def is_optimal(self):
+        return self._m.status == self._grb.GRB.OPTIMAL
+
+    def has_solution(self):
+        return self._m.solcount > 0
+
+    def status(self):
+        return self._m.status
+
+    def objval(self):
+        return self._m.objval
+
+    def iter_count(self):
+        return int(self._m.itercount)
+
+    def values(self):
+        return self._m.getAttr("X", self._cols)
+
+    def duals(self):
+        return self._m.getAttr("Pi", self._rows)
+
+    def reduced_costs(self):
+        return self._m.getAttr("RC", self._cols)
+
+    def get_basis(self):
+        return self._m.getAttr("VBasis", self._cols), self._m.getAttr("CBasis", self._rows)
+
+    def set_basis(self, vbasis, cbasis):
+        self._m.setAttr("VBasis", self._cols, vbasis)
+        self._m.setAttr("CBasis", self._rows, cbasis)
+        self._m.update()
+
+    def copy(self):
+        self._m.update()
+        return GurobiBackend(model=self._m.copy())
+
+
+class GlpkBackend:
+    """
+    GLPK through swiglpk, runs without a license.
+    GLPK indices start at 1, the indices of this interface at 0.
+    """
+
+    def __init__(self, name="master", lp=None):
+        import swiglpk
+        self._glp = swiglpk
+        # the branch and cut prints some messages whatever the message level
+        swiglpk.glp_term_out(swiglpk.GLP_OFF)
+        if lp is None:
+            lp = swiglpk.glp_create_prob()
+            swiglpk.glp_set_prob_name(lp, name)
+            swiglpk.glp_set_obj_dir(lp, swiglpk.GLP_MIN)
+        self._lp = lp
+        self._smcp = swiglpk.glp_smcp()
+        swiglpk.glp_init_smcp(self._smcp)
+        self._smcp.msg_lev = swiglpk.GLP_MSG_OFF
+        self._iocp = swiglpk.glp_iocp()
+        swiglpk.glp_init_iocp(self._iocp)
+        self._iocp.msg_lev = swiglpk.GLP_MSG_OFF
+        self._mip = False
+        self._iter_count = 0
+
+    def __del__(self):
+        if self._lp is not None:
+            self._glp.glp_delete_prob(self._lp)
+            self._lp = None
+
+    @staticmethod
+    def _array(array_type, values):
+        # glpk arrays start at 1
+        array = array_type(len(values) + 1)
+        for k, value in enumerate(values):
+            array[k + 1] = value
+        return array
+
+    def _set_bounds(self, col, lb, ub):
+        glp = self._glp
+        if lb == -float("inf") and ub == float("inf"):
+            glp.glp_set_col_bnds(self._lp, col, glp.GLP_FR, 0, 0)
+        elif ub == float("inf"):
+            glp.glp_set_col_bnds(self._lp, col, glp.GLP_LO, lb, 0)
+        elif lb == -float("inf"):
+            glp.glp_set_col_bnds(self._lp, col, glp.GLP_UP, 0, ub)
+        elif lb == ub:
+            glp.glp_set_col_bnds(self._lp, col, glp.GLP_FX, lb, ub)
+        else:
+            glp.glp_set_col_bnds(self._lp, col, glp.GLP_DB, lb, ub)
+
+    def add_row(self, sense, rhs, name=""):
+        glp = self._glp
+        i = glp.glp_add_rows(self._lp, 1)
+        if name:
+            glp.glp_set_row_name(self._lp, i, name)
+        if sense == GREATER_EQUAL:
+            glp.glp_set_row_bnds(self._lp, i, glp.GLP_LO, rhs, 0)
+        elif sense == LESS_EQUAL:
+            glp.glp_set_row_bnds(self._lp, i, glp.GLP_UP, 0, rhs)
+        else:
+            glp.glp_set_row_bnds(self._lp, i, glp.GLP_FX, rhs, rhs)
+        return i - 1
+
+    def add_col(self, obj, lb, ub, rows, coeffs, name=""):
+        glp = self._glp
+        j = glp.glp_add_cols(self._lp, 1)
+        glp.glp_set_obj_coef(self._lp, j, obj)
+        self._set_bounds(j, lb, ub)
+        glp.glp_set_mat_col(self._lp, j, len(rows), self._array(glp.intArray, [i + 1 for i in rows]),
+                            self._array(glp.doubleArray, [float(a) for a in coeffs]))
+        return j - 1
+
+    def set_bounds(self, col, lb, ub):
+        self._set_bounds(col + 1, lb, ub)
+
+    def set_obj(self, col, obj):
+        self._glp.glp_set_obj_coef(self._lp, col + 1, obj)
+
+    def remove_cols(self, cols):
+        cols = sorted(set(cols))
+        self._glp.glp_del_cols(self._lp, len(cols), self._array(self._glp.intArray, [j + 1 for j in cols]))
+
+    def num_cols(self):
+        return self._glp.glp_get_num_cols(self._lp)
+
+    def update(self):
+        pass
+
+    def set_dual_simplex(self, dual_simplex):
+        self._smcp.meth = self._glp.GLP_DUALP if dual_simplex else self._glp.GLP_PRIMAL
+
+    def set_binary(self):
+        glp = self._glp
+        for j in range(1, self.num_cols() + 1):
+            ub = glp.glp_get_col_ub(self._lp, j) if glp.glp_get_col_type(self._lp, j) in [glp.GLP_DB, glp.GLP_FX] \
+                else float("inf")
+            glp.glp_set_col_kind(self._lp, j, glp.GLP_IV)
+            self._set_bounds(j, 0, min(ub, 1))
+        self._mip = True
+
+    def set_time_limit(self, seconds):
+        self._smcp.tm_lim = int(seconds * 1000)
+        self._iocp.tm_lim = int(seconds * 1000)
+
+    def optimize(self):
+        glp = self._glp
+        start = glp.glp_get_it_cnt(self._lp)
+        if glp.glp_simplex(self._lp, self._smcp) in [glp.GLP_EBADB, glp.GLP_ESING, glp.GLP_ECOND]:
+            # a basic column was removed or the loaded basis is singular, start over from the slack basis
+            glp.glp_std_basis(self._lp)
+            glp.glp_simplex(self._lp, self._smcp)
+        # the branch and cut starts from the optimal lp relaxation
+        if self._mip and glp.glp_get_status(self._lp) == glp.GLP_OPT:
+            glp.glp_intopt(self._lp, self._iocp)
+        self._iter_count = glp.glp_get_it_cnt(self._lp) - start
+
+    def is_optimal(self):
+        return self.status() == self._glp.GLP_OPT
+
+    def has_solution(self):
+        return self.status() in [self._glp.GLP_OPT, self._glp.GLP_FEAS]
+
+    def status(self):
+        if self._mip:
+            return self._glp.glp_mip_status(self._lp)
+        return self._glp.glp_get_status(self._lp)
+
+    def _check_solution(self, optimal):
+        # glpk returns the values of whatever basis it stopped on, gurobi raises without a solution
+        if not (self.is_optimal() if optimal else self.has_solution()):
+            raise RuntimeError("No {} solution, glpk status {}".format("optimal" if optimal else "feasible",
+                                                                       self.status()))
+
+    def objval(self):
+        if self._mip:
+            # the objective of the incumbent
+            self._check_solution(False)
+            return self._glp.glp_mip_obj_val(self._lp)
+        self._check_solution(True)
+        return self._glp.glp_get_obj_val(self._lp)
+
+    def iter_count(self):
+        return self._iter_count
+
+    def values(self):
+        self._check_solution(False)
+        get = self._glp.glp_mip_col_val if self._mip else self._glp.glp_get_col_prim
+        return [get(self._lp, j) for j in range(1, self.num_cols() + 1)]
+
+    def duals(self):
+        self._check_solution(True)
+        return [self._glp.glp_get_row_dual(self._lp, i) for i in range(1, self._glp.glp_get_num_rows(self._lp) + 1)]
+
+    def reduced_costs(self):
+        return [self._glp.glp_get_col_dual(self._lp, j) for j in range(1, self.num_cols() + 1)]
+
+    def get_basis(self):
+        glp = self._glp
+        to_grb = {glp.GLP_BS: 0, glp.GLP_NL: -1, glp.GLP_NU: -2, glp.GLP_NF: -3, glp.GLP_NS: -1}
+        vbasis = [to_grb[glp.glp_get_col_stat(self._lp, j)] for j in range(1, self.num_cols() + 1)]
+        cbasis = [0 if glp.glp_get_row_stat(self._lp, i) == glp.GLP_BS else -1
+                  for i in range(1, glp.glp_get_num_rows(self._lp) + 1)]
+        return vbasis, cbasis
+
+    def set_basis(self, vbasis, cbasis):
+        glp = self._glp
+        from_grb = {0: glp.GLP_BS, -1: glp.GLP_NL, -2: glp.GLP_NU, -3: glp.GLP_NF}
+        # glpk replaces a nonbasic status not suited to the bounds of the variable by the right one
+        for j, b in enumerate(vbasis):
+            glp.glp_set_col_stat(self._lp, j + 1, from_grb[b])
+        for i, b in enumerate(cbasis):
+            # a tight row sits at its only finite bound
+            stat = glp.GLP_BS if b == 0 else glp.GLP_NU if glp.glp_get_row_type(self._lp, i + 1) == glp.GLP_UP \
+                else glp.GLP_NL
+            glp.glp_set_row_stat(self._lp, i + 1, stat)
+
+    def copy(self):
+        glp = self._glp
+        lp = glp.glp_create_prob()
+        glp.glp_copy_prob(lp, self._lp, glp.GLP_ON)
+        m = GlpkBackend(lp=lp)
+        m._smcp.meth, m._smcp.tm_lim = self._smcp.meth, self._smcp.tm_lim
+        m._iocp.tm_lim = self._iocp.tm_lim
+        m._mip = self._mip
+        return m
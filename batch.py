@@ -0,0 +1,265 @@
+"""
+Solve a batch of instances, each in its own process.
+
+    python batch.py data/ --out results.jsonl --jobs 4 --time-limit 600 --mem-limit 4096
+
+Instances are given as directories (every .tp3s file in it) or glob patterns.
+One record is appended to the output file (.jsonl or .csv) as soon as an instance finishes,
+and the instances already solved in the output file are skipped, so that a crashed batch can be resumed.
+The instances that crashed, timed out, ran out of memory or failed are solved again,
+and so are the ones stopped by the time limit before closing the gap (status limit),
+their new record is appended after the old one.
+"""
+import argparse
+import csv
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import traceback
+
+import tp3s_io
+from backend import GUROBI, GLPK
+from bpsolver import BPSolver
+from colsolver import ColSolver
+
+FIELDS = ["instance", "status", "objective", "bound", "vehicles", "time", "columns", "nodes", "error"]
+
+# seconds given to a worker to report after its time limit before it is killed
+GRACE_PERIOD = 30
+
+SOLVERS = ["bp", "colgen"]
+NODE_SELECT = {"depth": BPSolver.DEPTH_FIRST, "bound": BPSolver.BEST_BOUND,
+               "estimate": BPSolver.BEST_ESTIMATE, "dive": BPSolver.DIVING}
+
+
+def find_instances(patterns):
+    """
+    :param patterns: directories or glob patterns
+    :return: sorted instance paths
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.tp3s")
+        paths.update(glob.glob(pattern))
+    return sorted(paths)
+
+
+def read_done(out_path):
+    """
+    :param out_path: output file of a previous run
+    :return: instances already solved, with an ok status
+    """
+    if not os.path.exists(out_path):
+        return set()
+    done = set()
+    with open(out_path) as f:
+        if out_path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                if row["status"] == "ok":
+                    done.add(row["instance"])
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # line truncated by a crash
+                    continue
+                if record.get("status") == "ok":
+                    done.add(record["instance"])
+    return done
+
+
+class ResultWriter:
+    def __init__(self, out_path):
+        self._csv = out_path.endswith(".csv")
+        new_file = not os.path.exists(out_path) or os.path.getsize(out_path) == 0
+        self._f = open(out_path, "a")
+        if self._csv:
+            self._writer = csv.DictWriter(self._f, FIELDS)
+            if new_file:
+                self._writer.writeheader()
+
+    def write(self, record):
+        if self._csv:
+            self._writer.writerow(record)
+        else:
+            self._f.write(json.dumps(record) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def _limit_memory(mem_limit):
+    try:
+        import resource
+    except ImportError:
+        # no rlimit on windows
+        return
+    limit = mem_limit * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _solve(path, options):
+    """
+    Solve an instance
+    :param path: instance path
+    :param options: parsed command line options
+    :return: result record
+    """
+    inst = tp3s_io.load_inst(path)
+    record = dict((field, None) for field in FIELDS)
+    start = time.time()
+    if options.solver == "bp":
+        solver = BPSolver(inst, backend=options.backend, node_select=NODE_SELECT[options.node_select],
+                          gap_tol=options.gap_tol, time_limit=options.time_limit)
+        solver.solve()
+        if solver.inc_sol is not None:
+            record["objective"] = solver.best_inc_val
+            record["vehicles"] = len([v for v in solver.inc_sol.itervalues() if v > 0.5])
+        record["bound"] = solver.lower_bound()
+        record["columns"] = len(solver.col_pool)
+        record["nodes"] = solver.n_nodes
+        # the gap is only left open when the time limit stopped the search
+        record["status"] = "limit" if solver.gap() > options.gap_tol else "ok"
+    else:
+        solver = ColSolver(inst, backend=options.backend)
+        record["bound"] = solver.solve_col_gen()
+        record["columns"] = solver.n_cols
+        record["nodes"] = 1
+        record["status"] = "ok"
+    record["time"] = time.time() - start
+    return record
+
+
+def _recv(conn):
+    """
+    :return: record sent by the worker, None if not sent yet
+    """
+    if conn.poll():
+        try:
+            return conn.recv()
+        except EOFError:
+            pass
+    return None
+
+
+def _worker(path, options, conn):
+    """
+    Solve an instance in a worker process, send the result record through conn
+    """
+    if hasattr(signal, "SIGTERM"):
+        # let the solver clean up its own workers when killed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+    if options.mem_limit:
+        _limit_memory(options.mem_limit)
+    if options.log_dir:
+        sys.stdout = open(os.path.join(options.log_dir, os.path.basename(path) + ".log"), "w")
+        logging.basicConfig(stream=sys.stdout, level=logging.DEBUG, format="%(message)s")
+    else:
+        sys.stdout = open(os.devnull, "w")
+
+    try:
+        record = _solve(path, options)
+    except MemoryError:
+        record = {"status": "memory"}
+    except Exception:
+        record = {"status": "error", "error": traceback.format_exc()}
+    record["instance"] = path
+    conn.send(record)
+    conn.close()
+
+
+def run(paths, options):
+    """
+    Solve the instances with at most options.jobs worker processes, writing the records as they come
+    :param paths: instance paths
+    :param options: parsed command line options
+    :return:
+    """
+    writer = ResultWriter(options.out)
+    pending = list(reversed(paths))
+    running = {}
+    try:
+        while pending or running:
+            while pending and len(running) < options.jobs:
+                path = pending.pop()
+                recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=_worker, args=(path, options, send_conn))
+                process.start()
+                send_conn.close()
+                running[path] = (process, recv_conn, time.time())
+                print "started", path
+
+            for path, (process, conn, start) in running.items():
+                record = _recv(conn)
+                if record is None:
+                    elapsed = time.time() - start
+                    if not process.is_alive():
+                        # the worker may have sent its record and exited since the poll
+                        record = _recv(conn) or {"instance": path, "status": "crashed",
+                                                 "error": "exit code {}".format(process.exitcode)}
+                    elif options.time_limit is not None and elapsed > options.time_limit + GRACE_PERIOD:
+                        process.terminate()
+                        record = {"instance": path, "status": "timeout"}
+                    else:
+                        continue
+                process.join()
+                del running[path]
+
+                full_record = dict((field, None) for field in FIELDS)
+                full_record.update(record)
+                if full_record["time"] is None:
+                    full_record["time"] = time.time() - start
+                writer.write(full_record)
+                print "finished", path, full_record["status"], full_record["objective"], full_record["bound"]
+            time.sleep(0.1)
+    finally:
+        for process, _, _ in running.values():
+            process.terminate()
+        writer.close()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Solve a batch of tp3s instances")
+    parser.add_argument("instances", nargs="+", help="instance directories or glob patterns")
+    parser.add_argument("--out", default="results.jsonl", help="output file, .jsonl or .csv")
+    parser.add_argument("--solver", choices=SOLVERS, default="bp",
+                        help="branch and price, or column generation of the lp relaxation")
+    parser.add_argument("--backend", choices=[GUROBI, GLPK], default=GUROBI)
+    parser.add_argument("--node-select", choices=sorted(NODE_SELECT), default="depth")
+    parser.add_argument("--gap-tol", type=float, default=0.0)
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(), help="instances solved at once")
+    parser.add_argument("--time-limit", type=float, default=None, help="seconds per instance")
+    parser.add_argument("--mem-limit", type=int, default=None, help="megabytes per instance")
+    parser.add_argument("--log-dir", default=None, help="directory of the solver logs, discarded if not set")
+    parser.add_argument("--no-resume", action="store_true", help="solve the instances already in the output file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    paths = find_instances(options.instances)
+    if not options.no_resume:
+        done = read_done(options.out)
+        skipped = [path for path in paths if path in done]
+        paths = [path for path in paths if path not in done]
+        if skipped:
+            print "resuming, {} instances already solved".format(len(skipped))
+    if options.log_dir and not os.path.isdir(options.log_dir):
+        os.makedirs(options.log_dir)
+    print "{} instances to solve".format(len(paths))
+    run(paths, options)
+
+
+if __name__ == '__main__':
+    main()
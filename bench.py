@@ -0,0 +1,263 @@
+"""
+Benchmark of the solvers on the bundled instances, on copies of them and on generated ones.
+
+    python bench.py --out bench.json --baseline bench_baseline.json
+    python bench.py --save-baseline bench_baseline.json
+
+Every case runs in its own process, so that its peak memory is its own.
+The report is a json file with one entry per case: wall time, lp solves, pricing calls,
+columns, nodes, peak rss, objective, bound and the time of each phase.
+Against a baseline report, a case is flagged when it got slower, did more work, used more memory
+or found another objective, and the exit status is 1.
+"""
+import argparse
+import fnmatch
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import traceback
+
+import numpy as np
+
+import instgen
+import tp3s_io
+from backend import GUROBI, GLPK
+from bpsolver import BPSolver
+from colsolver import ColSolver
+from instrument import Profiler
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# instance name to (instance file, number of copies) or generator parameters
+INSTANCES = {
+    "158": ("158.tp3s", 1),
+    "157": ("157.tp3s", 1),
+    "156": ("156.tp3s", 1),
+    "158x4": ("158.tp3s", 4),
+    "156x4": ("156.tp3s", 4),
+    "gen100": {"n_tests": 100, "seed": 1},
+    "gen150": {"n_tests": 150, "seed": 1},
+}
+
+# instance name, solver
+CASES = [
+    ("158", "colgen"),
+    ("158", "fullenum"),
+    ("158", "bp"),
+    ("157", "colgen"),
+    ("157", "fullenum"),
+    ("157", "bp"),
+    ("156", "colgen"),
+    ("156", "bp"),
+    ("158x4", "colgen"),
+    ("158x4", "bp"),
+    ("156x4", "colgen"),
+    ("gen100", "colgen"),
+    ("gen100", "bp"),
+    ("gen150", "colgen"),
+]
+
+METRICS = ["time", "lp_solves", "pricings", "columns", "nodes", "peak_rss_mb"]
+
+# relative increase over the baseline flagged as a regression
+TOLERANCE = {"time": 0.2, "lp_solves": 0.1, "pricings": 0.1, "columns": 0.1, "nodes": 0.1, "peak_rss_mb": 0.2}
+# increase in seconds below which a slower time is noise
+MIN_TIME_INCREASE = 0.5
+
+
+def tile_instance(inst, copies):
+    """
+    Scale an instance up: copies of every test and vehicle,
+    a copy of a test can be rehit after a copy of another test if the original tests can
+    :param inst: instance
+    :param copies: number of copies
+    :return: scaled instance
+    """
+    if copies == 1:
+        return inst
+    offset = max(inst.tids) + 1
+    tests = []
+    vehicles = []
+    for k in range(copies):
+        tests.extend([t._replace(test_id=t.test_id + k * offset) for t in inst.tests])
+        vehicles.extend([v._replace(vehicle_id=v.vehicle_id + k * offset) for v in inst.vehicles])
+    rehit = np.tile(inst.rehit_matrix(), (copies, copies))
+    return tp3s_io.Instance(tests, vehicles, rehit)
+
+
+def load_instance(name):
+    """
+    :param name: instance name in INSTANCES
+    :return: the instance
+    """
+    spec = INSTANCES[name]
+    if isinstance(spec, dict):
+        return tp3s_io.parse_inst(instgen.generate(**spec))
+    filename, copies = spec
+    return tile_instance(tp3s_io.load_inst(os.path.join(DATA_DIR, filename)), copies)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        # no getrusage on windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on mac
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+def run_case(inst_name, solver_name, backend):
+    """
+    Run a case in this process
+    :return: metrics of the case, objective, bound and profile
+    """
+    inst = load_instance(inst_name)
+    result = {}
+    profiler = Profiler()
+    start = time.time()
+    if solver_name == "bp":
+        solver = BPSolver(inst, backend=backend, node_select=BPSolver.BEST_BOUND, profiler=profiler)
+        solver.solve()
+        result.update(objective=solver.best_inc_val, bound=solver.lower_bound(),
+                      lp_solves=solver.n_lp_solves, pricings=solver.n_pricings,
+                      columns=len(solver.col_pool), nodes=solver.n_nodes)
+    else:
+        solver = ColSolver(inst, backend=backend, profiler=profiler)
+        if solver_name == "colgen":
+            objval = solver.solve_col_gen()
+            result.update(lp_solves=solver.n_lp_solves, pricings=solver.n_pricings)
+        else:
+            objval = solver.solve_full_enum()
+            result.update(lp_solves=0, pricings=0)
+        result.update(objective=objval, bound=objval, columns=solver.n_cols, nodes=1)
+    result["time"] = time.time() - start
+    result["peak_rss_mb"] = _peak_rss_mb()
+    result["profile"] = profiler.stats()
+    return result
+
+
+def _case_worker(args, conn, quiet):
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    else:
+        logging.basicConfig(stream=sys.stdout, level=logging.DEBUG, format="%(message)s")
+    try:
+        conn.send((run_case(*args), None))
+    except Exception:
+        conn.send((None, traceback.format_exc()))
+    conn.close()
+
+
+def run_isolated(inst_name, solver_name, backend, quiet=True):
+    """
+    Run a case in its own process
+    :return: metrics of the case, objective, bound and profile
+    """
+    recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_case_worker,
+                                      args=((inst_name, solver_name, backend), send_conn, quiet))
+    process.start()
+    send_conn.close()
+    try:
+        result, error = recv_conn.recv()
+    except EOFError:
+        result, error = None, "worker exited with code {}".format(process.exitcode)
+    process.join()
+    if error:
+        raise RuntimeError(error)
+    return result
+
+
+def compare(report, baseline):
+    """
+    Compare a report with a baseline
+    :param report: benchmark report
+    :param baseline: benchmark report of reference
+    :return: list of regressions, (case, metric, baseline value, value)
+    """
+    regressions = []
+    for name, base in sorted(baseline["cases"].items()):
+        case = report["cases"].get(name)
+        if case is None:
+            continue
+        for metric in METRICS:
+            value, base_value = case.get(metric), base.get(metric)
+            if value is None or base_value is None:
+                continue
+            if value <= base_value * (1 + TOLERANCE[metric]):
+                continue
+            if metric == "time" and value - base_value < MIN_TIME_INCREASE:
+                continue
+            regressions.append((name, metric, base_value, value))
+        objective, base_objective = case.get("objective"), base.get("objective")
+        if objective is not None and base_objective is not None and abs(objective - base_objective) > 1e-6:
+            regressions.append((name, "objective", base_objective, objective))
+    return regressions
+
+
+def run(options):
+    """
+    Run the selected cases
+    :param options: parsed command line options
+    :return: benchmark report
+    """
+    report = {"backend": options.backend, "python": platform.python_version(), "platform": platform.platform(),
+              "cases": {}}
+    for inst_name, solver_name in CASES:
+        name = "{}/{}".format(inst_name, solver_name)
+        if options.cases and not any(fnmatch.fnmatch(name, pattern) for pattern in options.cases):
+            continue
+        runs = [run_isolated(inst_name, solver_name, options.backend, not options.verbose)
+                for _ in range(options.repeat)]
+        # the fastest run is the least noisy
+        result = min(runs, key=lambda r: r["time"])
+        report["cases"][name] = result
+        print "{:<16} {:>8.2f}s {:>6} lp {:>6} pricings {:>7} cols {:>5} nodes {:>8.1f}MB obj {}".format(
+            name, result["time"], result["lp_solves"], result["pricings"], result["columns"], result["nodes"],
+            result["peak_rss_mb"] or 0, result["objective"])
+    return report
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the solvers")
+    parser.add_argument("--out", default=None, help="json report")
+    parser.add_argument("--baseline", default=None, help="json report to compare with")
+    parser.add_argument("--save-baseline", default=None, help="write the report as the new baseline")
+    parser.add_argument("--backend", choices=[GUROBI, GLPK], default=GUROBI)
+    parser.add_argument("--cases", nargs="*", default=None, help="glob patterns of the cases to run, e.g. '158*'")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest is kept")
+    parser.add_argument("--verbose", action="store_true", help="show the solver logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    report = run(options)
+
+    regressions = []
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline)
+        report["regressions"] = [dict(zip(["case", "metric", "baseline", "value"], r)) for r in regressions]
+        for name, metric, base_value, value in regressions:
+            print "REGRESSION {} {}: {} -> {}".format(name, metric, base_value, value)
+        if not regressions:
+            print "no regression against", options.baseline
+
+    for path in [options.out, options.save_baseline]:
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
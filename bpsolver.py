@@ -1,54 +1,487 @@
-from Queue import PriorityQueue, LifoQueue
-from collections import defaultdict
+import heapq
+import logging
+import multiprocessing
+import time
+import traceback
 
-from gurobipy import *
+import numpy as np
+from scipy import sparse
 
-import tp3s_io
-from colsolver import ColEnumerator, Col
+from backend import create_backend, GUROBI, GREATER_EQUAL, LESS_EQUAL
+from colsolver import capacity_rows, ArtificialCols, ColEnumerator, ColPool, MasterCols, vehicle_duals
+from heuristics import default_heuristics
+from instrument import NULL_PROFILER, Profiler
+from pricing import LabelingPricer
+from stabilization import lagrangian_bound, reduced_cost, WentgesSmoother
+
+logger = logging.getLogger("tp3s")
 
 
 class BPSolver:
-    BEST_INC_VAL = float("inf")
-    INC_SOL = None
+    # node selection strategies
+    DEPTH_FIRST = 1
+    BEST_BOUND = 2
+    BEST_ESTIMATE = 3
+    DIVING = 4
+
+    def __init__(self, inst, pricer=None, backend=GUROBI, node_select=DEPTH_FIRST, dive_restart=10, gap_tol=0.0,
+                 n_workers=1, cg_gap_tol=0.0, smoothing=0.0, time_limit=None, profiler=NULL_PROFILER,
+                 col_max_age=None, col_evict_rc=1.0, heuristics=None):
+        """
+        constructor of the branch and price solver
+        :param inst: instance
+        :param pricer: pricer shared by all nodes, labeling pricer if None. It must be exact and support the
+                       branching constraints, a node is closed when it finds no negative column.
+                       With n_workers > 1 every worker process prices with its own copy
+        :param backend: lp backend of the node master problems
+        :param node_select: node selection strategy (DEPTH_FIRST, BEST_BOUND, BEST_ESTIMATE, DIVING)
+        :param dive_restart: when diving, number of dives before restarting from the best bound node
+        :param gap_tol: stop when the relative gap between incumbent and lower bound is below
+        :param n_workers: number of worker processes solving the nodes, the nodes are solved in this process if 1
+        :param cg_gap_tol: stop the column generation of a node when the relative gap between the master
+                           and its lagrangian bound is below
+        :param smoothing: weight of the stability center in the wentges smoothing of the duals, 0 for no smoothing
+        :param time_limit: stop the search after this many seconds, keeping the incumbent and the lower bound
+        :param profiler: profiler timing the phases of the search, the workers report to it too
+        :param col_max_age: evict from a node master the columns nonbasic with a reduced cost above col_evict_rc
+                            for more than this many iterations, never if None
+        :param col_evict_rc: reduced cost above which a nonbasic column ages
+        :param heuristics: primal heuristics run at the nodes, in this order, see heuristics.py.
+                           Lp rounding at every node and the ip over the master columns at the root if None
+        :return: a branch and price solver
+        """
+        if pricer is not None and not pricer.EXACT:
+            raise ValueError("The pricer of the branch and price must be exact, got %s" % type(pricer).__name__)
+        self.inst = inst
+        # pending nodes, entries are (key, seq, parent lp bound, node)
+        self._pending_nodes = []
+        self._seq = 0
+        self._node_select = node_select
+        self._dive_restart = dive_restart
+        self._dive_node = None
+        self._n_dives = 0
+        self._gap_tol = gap_tol
+        self._time_limit = time_limit
+        self._start_time = None
+        self.cg_gap_tol = cg_gap_tol
+        self.smoothing = smoothing
+        self.smoother = WentgesSmoother(inst, smoothing) if smoothing > 0 else None
+        self.col_max_age = col_max_age
+        self.col_evict_rc = col_evict_rc
+        self.heuristics = heuristics if heuristics is not None else default_heuristics()
+        # average lp bound degradation of a branching, for the best estimate
+        self._pseudo_cost = 0.0
+        self._n_pseudo_cost = 0
+        # nodes being solved by the workers, by worker
+        self._n_workers = n_workers
+        self._in_flight = {}
+        # pricing problem and columns shared by all nodes
+        self.pricer = pricer
+        self.col_pool = ColPool()
+        self.col_incidence = None
+        # master problem of the last node branched, see ParentMaster
+        self._parent_master = None
+        # lp backend of the node master problems
+        self.backend = backend
+        # incumbent value and solution, column to value
+        self.best_inc_val = float("inf")
+        self.inc_sol = None
+        # statistics of the last solve
+        self.n_nodes = 0
+        self.lp_iter_count = 0
+        self.n_lp_solves = 0
+        self.n_pricings = 0
+        self.profiler = profiler
+
+    def add_node(self, lpbound, node, fractionality=0.0):
+        """
+        Add a pending node
+        :param lpbound: lp bound of the parent
+        :param node: node to add
+        :param fractionality: sum of the distances to integrality of the parent lp solution
+        :return:
+        """
+        node.parent_bound = lpbound
+        node.fractionality = fractionality
+        self._seq += 1
+        if self._node_select == BPSolver.DEPTH_FIRST:
+            key = (-node.depth, -self._seq)
+        elif self._node_select == BPSolver.BEST_ESTIMATE:
+            key = lpbound + self._pseudo_cost * fractionality
+        else:
+            key = lpbound
+        heapq.heappush(self._pending_nodes, (key, self._seq, lpbound, node))
+
+        # dive into the first child
+        if self._node_select == BPSolver.DIVING and self._dive_node is None:
+            self._dive_node = node
+
+    def keep_parent_master(self, parent_master):
+        """
+        Keep the master problem of the node just branched for its children,
+        the one of the previous branched node is released
+        :param parent_master: ParentMaster
+        :return:
+        """
+        if self._parent_master is not None:
+            self._parent_master.release()
+        self._parent_master = parent_master
+
+    def update_incumbent(self, objval, sol):
+        """
+        Record an integer solution if it improves the incumbent
+        :param objval: objective value of the solution
+        :param sol: column to value
+        :return:
+        """
+        if objval < self.best_inc_val:
+            self.best_inc_val = objval
+            self.inc_sol = sol
 
-    def __init__(self):
-        self._pending_nodes = LifoQueue()
-        self._pending_nodes_best_bound = PriorityQueue()
+    def _is_pruned(self, lpbound):
+        return lpbound >= self.best_inc_val - 0.001
 
-    def add_node(self, lpbound, node):
-        self._pending_nodes.put(node)
-        self._pending_nodes_best_bound.put((lpbound, node))
+    def _next_node(self):
+        """
+        Select the next node to process, lazily dropping processed and pruned nodes
+        :return: next node, None if no node is pending
+        """
+        dive_node = self._dive_node
+        self._dive_node = None
+        if dive_node is not None and self._n_dives < self._dive_restart \
+                and not self._is_pruned(dive_node.parent_bound):
+            self._n_dives += 1
+            return dive_node
+
+        self._n_dives = 0
+        while self._pending_nodes:
+            _, _, lpbound, node = heapq.heappop(self._pending_nodes)
+            if node.solved or self._is_pruned(lpbound):
+                continue
+            return node
+        return None
+
+    def lower_bound(self):
+        bounds = [entry[2] for entry in self._pending_nodes
+                  if not entry[-1].solved and not self._is_pruned(entry[2])]
+        bounds.extend([node.parent_bound for node in self._in_flight.itervalues()
+                       if not self._is_pruned(node.parent_bound)])
+        if not bounds:
+            return self.best_inc_val
+        return min(bounds)
+
+    def gap(self):
+        lb = self.lower_bound()
+        if self.best_inc_val == float("inf"):
+            return float("inf")
+        return (self.best_inc_val - lb) / abs(self.best_inc_val)
+
+    def _update_pseudo_cost(self, node):
+        if node.lp_objval is None or node.parent_bound == -float("inf"):
+            return
+        self._n_pseudo_cost += 1
+        degradation = max(node.lp_objval - node.parent_bound, 0)
+        self._pseudo_cost += (degradation - self._pseudo_cost) / self._n_pseudo_cost
+
+    def _should_stop(self):
+        if self.gap() <= self._gap_tol:
+            return True
+        return self._time_limit is not None and time.time() - self._start_time > self._time_limit
+
+    def _log_progress(self):
+        logger.info("# Pending nodes %d, lower bound %s, incumbent %s, gap %s",
+                    len(self._pending_nodes), self.lower_bound(), self.best_inc_val, self.gap())
 
     def solve(self):
+        self._start_time = time.time()
+        if not self.pricer:
+            self.pricer = LabelingPricer(self.inst)
+        self.pricer.profiler = self.profiler
+        self.col_incidence = ColIncidence(self.inst, self.col_pool)
+
         # enumerate the initial columns
-        en = ColEnumerator()
-        init_col_list = en.enum(1)
+        en = ColEnumerator(self.inst)
+        for col in en.enum(1):
+            self.col_pool.add(col)
 
         # create the root node
-        root = Node(init_col_list, [], self)
-        self._pending_nodes.put(root)
-        self._pending_nodes_best_bound.put((1000, root))
+        root = Node([], self)
+        self.add_node(-float("inf"), root)
+
+        self.n_nodes = 0
+        self.lp_iter_count = 0
+        self.n_lp_solves = 0
+        self.n_pricings = 0
+        if self._n_workers > 1:
+            self._search_parallel()
+        else:
+            self._search()
 
-        iter_times = 0
-        while not (self._pending_nodes.empty() or self._pending_nodes_best_bound.empty()):
-            # if iter_times % 2 == 0:
-            print '# Pending nodes', self._pending_nodes.qsize()
-            node_to_process = self._pending_nodes.get()
-            # else:
-            #     _, node_to_process = self._pending_nodes_best_bound.get()
+        used_col = []
+        if self.inc_sol:
+            for k, v in self.inc_sol.iteritems():
+                if v > 0.001:
+                    logger.debug("%s %s", k, v)
+                    used_col.append(k)
+
+        logger.info("Final obj val %s", self.best_inc_val)
+        logger.info("Lower bound %s", self.lower_bound())
+        logger.info("Used vehicle %d", len(used_col))
+        logger.info("Nodes processed %d", self.n_nodes)
+        logger.info("Total LP iterations %d", self.lp_iter_count)
+        logger.info("LP solves %d", self.n_lp_solves)
+        logger.info("Pricing calls %d", self.n_pricings)
+
+    def _add_node_stats(self, node):
+        self.n_nodes += 1
+        self.lp_iter_count += node.lp_iter_count
+        self.n_lp_solves += node.n_lp_solves
+        self.n_pricings += node.n_pricings
+
+    def _search(self):
+        """
+        Process the pending nodes one at a time in this process
+        :return:
+        """
+        while True:
+            node_to_process = self._next_node()
+            if node_to_process is None:
+                break
 
             node_to_process.process()
+            self._add_node_stats(node_to_process)
+            self._update_pseudo_cost(node_to_process)
 
-            iter_times += 1
+            self._log_progress()
+            if self._should_stop():
+                break
 
-        used_col = []
-        for k, v in BPSolver.INC_SOL.iteritems():
-            if v > 0.001:
-                print k, v
-                used_col.append(k)
+    def _search_parallel(self):
+        """
+        Coordinate the worker processes: send the selected nodes to the idle workers,
+        merge back the columns, incumbents and children found by the workers.
+        A worker is sent the columns added to the pool since its last node along with the node,
+        so that the pool of every worker is a prefix of the pool of the coordinator.
+        :return:
+        """
+        results = multiprocessing.Queue()
+        workers = []
+        for wid in range(self._n_workers):
+            tasks = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_node_worker,
+                                              args=(wid, tasks, results, self.inst, self.pricer, self.backend,
+                                                    self.cg_gap_tol, self.smoothing, self.col_max_age,
+                                                    self.col_evict_rc, self.heuristics, self.profiler.enabled))
+            process.daemon = True
+            process.start()
+            workers.append((process, tasks))
+        n_cols_sent = [0] * self._n_workers
+        idle = range(self._n_workers)
+
+        try:
+            while True:
+                while idle:
+                    node = self._next_node()
+                    if node is None:
+                        break
+                    wid = idle.pop()
+                    node.solved = True
+                    self._in_flight[wid] = node
+                    new_cols = [self.col_pool[cid] for cid in range(n_cols_sent[wid], len(self.col_pool))]
+                    n_cols_sent[wid] = len(self.col_pool)
+                    workers[wid][1].put((new_cols, node._branch_constr_list, node._fixed[:node._n_checked],
+                                         node._n_checked, node._parent_cols, node._parent_basis, node._tail_off,
+                                         node.parent_bound, self.best_inc_val))
+                    node._parent_basis = None
+                if not self._in_flight:
+                    break
+
+                wid, result, error = results.get()
+                if error:
+                    raise RuntimeError("node worker {} failed:\n{}".format(wid, error))
+                node = self._in_flight.pop(wid)
+                idle.append(wid)
+                self._merge_result(node, result, n_cols_sent[wid])
+                self._add_node_stats(node)
+
+                self._log_progress()
+                if self._should_stop():
+                    break
+        finally:
+            # the nodes left in flight are still open
+            for node in self._in_flight.values():
+                node.solved = False
+                self.add_node(node.parent_bound, node, node.fractionality)
+            self._in_flight.clear()
+            for process, tasks in workers:
+                tasks.put(None)
+            for process, _ in workers:
+                process.join(1)
+                if process.is_alive():
+                    process.terminate()
+
+    def _merge_result(self, node, result, n_shared):
+        """
+        Merge the result of a node solved by a worker
+        :param node: node sent to the worker
+        :param result: see _solve_task
+        :param n_shared: number of pool columns the worker had
+        :return:
+        """
+        lp_objval, stats, new_cols, children, inc_val, inc_sol = result
+        node.lp_objval = lp_objval
+        node.lp_iter_count, node.n_lp_solves, node.n_pricings, profile = stats
+        self.profiler.merge(profile)
+        self._update_pseudo_cost(node)
+        # the columns found by the worker get their ids here, a column also found by another worker keeps its id
+        new_cids = [self.col_pool.add(col) for col in new_cols]
+        if inc_sol is not None:
+            self.update_incumbent(inc_val, inc_sol)
+        cid_map = np.concatenate([np.arange(n_shared), new_cids]).astype(np.int64)
+        for branch_constrs, fixed, n_checked, fractionality, parent_cols, parent_basis, tail_off in children:
+            parent_cols = MasterCols.remap_snapshot(parent_cols, cid_map)
+            child = Node(branch_constrs, self, fixed, n_checked, parent_basis=parent_basis, parent_cols=parent_cols,
+                         tail_off=tail_off)
+            self.add_node(lp_objval, child, fractionality)
+
+    def _solve_task(self, task):
+        """
+        Solve a node sent by the coordinator, in a worker
+        :param task: new pool columns, branching constraints, fixed columns of the checked columns,
+                     number of checked columns, snapshot of the parent master columns, parent basis,
+                     whether to stop on tailing off, parent lp bound, incumbent value of the coordinator
+        :return: lp bound, (lp iterations, lp solves, pricing calls, profiler stats), columns found, children,
+                 incumbent value and solution
+                 (solution is None if the incumbent was not improved)
+        """
+        (new_cols, branch_constrs, fixed, n_checked, parent_cols, parent_basis, tail_off, parent_bound,
+         best_inc_val) = task
+        for col in new_cols:
+            self.col_pool.add(col)
+        n_shared = len(self.col_pool)
+        self.best_inc_val = best_inc_val
+        self.inc_sol = None
+
+        node = Node(branch_constrs, self, fixed, n_checked, parent_basis=parent_basis, parent_cols=parent_cols,
+                    tail_off=tail_off)
+        node.parent_bound = parent_bound
+        node.process()
+
+        # the columns found here get their ids in the pool of the coordinator,
+        # forget about them in the fixed columns of the children
+        children = [(child._branch_constr_list, child._fixed[:min(child._n_checked, n_shared)],
+                     min(child._n_checked, n_shared), child.fractionality, child._parent_cols, child._parent_basis,
+                     child._tail_off)
+                    for _, _, _, child in sorted(self._pending_nodes, key=lambda entry: entry[1])]
+        self._pending_nodes = []
+        new_cols = self.col_pool.truncate(n_shared)
+        self.col_incidence.truncate(n_shared)
+        stats = (node.lp_iter_count, node.n_lp_solves, node.n_pricings, self.profiler.stats())
+        self.profiler.reset()
+        return node.lp_objval, stats, new_cols, children, self.best_inc_val, self.inc_sol
+
+
+def _node_worker(wid, tasks, results, inst, pricer, backend, cg_gap_tol, smoothing, col_max_age, col_evict_rc,
+                 heuristics, profile):
+    """
+    Worker process of a parallel branch and price, solving the nodes sent by the coordinator
+    with its own copy of the pricer of the coordinator and of the column pool
+    """
+    profiler = Profiler() if profile else NULL_PROFILER
+    solver = BPSolver(inst, pricer, backend, cg_gap_tol=cg_gap_tol, smoothing=smoothing,
+                      profiler=profiler, col_max_age=col_max_age, col_evict_rc=col_evict_rc, heuristics=heuristics)
+    solver.pricer.profiler = profiler
+    solver.col_incidence = ColIncidence(inst, solver.col_pool)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        try:
+            results.put((wid, solver._solve_task(task), None))
+        except Exception:
+            results.put((wid, None, traceback.format_exc()))
+
+
+class ColIncidence:
+    """
+    Sparse incidence of the pool columns, grown lazily with the pool.
+    cover: tests x columns, 1 if the column covers the test
+    release: columns x releases, 1 for the release of the column
+    before: tests x positions, 1 if the test is before the position in its column
+    at: positions x (tests * releases), 1 for the test at the position and the release of its column
+    """
 
-        print 'Final obj val', BPSolver.BEST_INC_VAL
-        print 'Used vehicle', len(used_col)
+    def __init__(self, inst, col_pool):
+        self._col_pool = col_pool
+        self.tids = list(inst.tids)
+        self.vreleases = list(inst.vreleases)
+        self._tidx = dict((tid, i) for i, tid in enumerate(self.tids))
+        self._ridx = dict((r, i) for i, r in enumerate(self.vreleases))
+
+        self._n_cols = 0
+        self._cover_rows, self._cover_cols = [], []
+        self._release_cols = []
+        self._before_rows, self._before_cols = [], []
+        self._at_cols = []
+        self._position_col = []
+        # first position and first before entry of every column
+        self._col_offsets = []
+        self._built = -1
+
+    def truncate(self, n_cols):
+        """
+        Drop the columns after the first n_cols, following a truncation of the pool
+        :param n_cols: number of columns to keep
+        :return:
+        """
+        if n_cols >= self._n_cols:
+            return
+        n_positions, n_before = self._col_offsets[n_cols]
+        for entries in [self._cover_rows, self._cover_cols, self._at_cols, self._position_col]:
+            del entries[n_positions:]
+        del self._before_rows[n_before:]
+        del self._before_cols[n_before:]
+        del self._release_cols[n_cols:]
+        del self._col_offsets[n_cols:]
+        self._n_cols = n_cols
+        self._built = -1
+
+    def sync(self):
+        """
+        Add the columns added to the pool since the last call
+        :return:
+        """
+        n_tests, n_releases = len(self.tids), len(self.vreleases)
+        for cid in range(self._n_cols, len(self._col_pool)):
+            col = self._col_pool[cid]
+            self._col_offsets.append((len(self._position_col), len(self._before_rows)))
+            ridx = self._ridx[col.release]
+            self._release_cols.append(ridx)
+            for k, tid in enumerate(col.seq):
+                tidx = self._tidx[tid]
+                position = len(self._position_col)
+                self._cover_rows.append(tidx)
+                self._cover_cols.append(cid)
+                self._position_col.append(cid)
+                self._at_cols.append(tidx * n_releases + ridx)
+                for prev in col.seq[:k]:
+                    self._before_rows.append(self._tidx[prev])
+                    self._before_cols.append(position)
+        self._n_cols = len(self._col_pool)
+
+        if self._built == self._n_cols:
+            return
+        n_cols, n_positions = self._n_cols, len(self._position_col)
+        self.cover = sparse.csr_matrix((np.ones(len(self._cover_rows)), (self._cover_rows, self._cover_cols)),
+                                       shape=(n_tests, n_cols))
+        self.release = sparse.csr_matrix((np.ones(n_cols), (range(n_cols), self._release_cols)),
+                                         shape=(n_cols, n_releases))
+        self.before = sparse.csr_matrix((np.ones(len(self._before_rows)), (self._before_rows, self._before_cols)),
+                                        shape=(n_tests, n_positions))
+        self.at = sparse.csr_matrix((np.ones(n_positions), (range(n_positions), self._at_cols)),
+                                    shape=(n_positions, n_tests * n_releases))
+        self.position_col = np.array(self._position_col, dtype=int)
+        self._built = self._n_cols
 
 
 class Node:
@@ -56,472 +489,544 @@ class Node:
     FRACTIONAL_TEST_PAIR = 2
     FRACTIONAL_TEST_ORDER_PAIR_ON_VEHICLE = 3
 
-    def __init__(self, col_set, branch_constr, bpsolver):
-        self._col_set = col_set[:]  # defensive copy
+    def __init__(self, branch_constr, bpsolver, fixed=None, n_checked=0, parent_master=None, parent_basis=None,
+                 parent_cols=None, tail_off=True):
         self._branch_constr_list = branch_constr[:]  # defensive copy
         self.solved = False
         self._master_solver = None
-        self._pricer = None
         self._bp_solver = bpsolver
+        self._inst = bpsolver.inst
+        self._col_pool = bpsolver.col_pool
+        # pool columns fixed to zero by the branching constraints, by pool index, false after n_checked.
+        # columns below n_checked are checked against all but the last branching constraint
+        self._fixed = fixed if fixed is not None else np.zeros(0, dtype=bool)
+        self._n_checked = n_checked
+        # master problem (a ParentMaster), final basis (int8 arrays) and master columns (a MasterCols snapshot)
+        # of the parent, to warm start this node. The basis and the columns are shared with the sibling
+        self._parent_master = parent_master
+        self._parent_basis = parent_basis
+        self._parent_cols = parent_cols
+        # pool columns of the master problem by variable index after the artificial columns,
+        # those of the parent at first
+        self._master_cols = None
+        # artificial columns of the test cover rows, the first variables of the master problem
+        self._artificial = ArtificialCols(self._inst)
+        # stop the column generation on tailing off, see BPSolver.cg_gap_tol
+        self._tail_off = tail_off
+        self.lp_iter_count = 0
+        self.n_lp_solves = 0
+        self.n_pricings = 0
+        self.depth = len(self._branch_constr_list)
+        self.parent_bound = -float("inf")
+        self.fractionality = 0.0
+        self.lp_objval = None
 
     def process(self):
         if not self.solved:
-            print "Entering node"
-            print "Branching constraint:"
-            for c in self._branch_constr_list:
-                print c.tid1, c.tid2, c.vid, c.direction
+            logger.debug("Entering node, branching constraints: %s",
+                         [(c.tid1, c.tid2, c.vid, c.direction) for c in self._branch_constr_list])
             self._solve_lp()
 
     def _build_master_prb(self):
-        m = Model("bp sub problem")
+        m = create_backend(self._bp_solver.backend, "bp sub problem")
 
         '''========================================
                         constraints
         ==========================================='''
+        self._index_rows()
 
         # test cover constraints
-        self._test_cover_constr = {}
-        for tid in tp3s_io.TEST_MAP:
-            constr = m.addConstr(0, GRB.GREATER_EQUAL, 1, name="cover test %d" % tid)
-            self._test_cover_constr[tid] = constr
+        for tid in self._inst.tids:
+            m.add_row(GREATER_EQUAL, 1, name="cover test %d" % tid)
 
-        # vehicle capacity constraints
-        self._vehicle_cap_constr = {}
-        for vrelease in tp3s_io.VEHICLE_MAP:
-            constr = m.addConstr(0, GRB.LESS_EQUAL, len(tp3s_io.VEHICLE_MAP[vrelease]),
-                                 name="vehicle cap %d" % vrelease)
-            self._vehicle_cap_constr[vrelease] = constr
+        # vehicle capacity constraints, cumulative over the release lattice
+        for vrelease in self._inst.vreleases:
+            m.add_row(LESS_EQUAL, self._inst.cum_vehicle_count[vrelease], name="vehicle cap %d" % vrelease)
 
         m.update()
 
         '''========================================
                         variables
         ==========================================='''
-        self._var = {}
-
-        # caches to speed int check
-        self._cols_contain_test = defaultdict(list)
-        self._cols_contain_pair_in_order = defaultdict(list)
-
-        for col in self._col_set:
-            v_constr = self._vehicle_cap_constr[col.release]
-            grb_col = Column()
-            grb_col.addTerms(1, v_constr)
-
-            for tid in col.seq:
-                t_constr = self._test_cover_constr[tid]
-                grb_col.addTerms(1, t_constr)
-
-            affect = self._bound_enforced_by_branch_constr(col)
-            if affect == BranchConstr.FIX_TO_ONE:
-                v = m.addVar(1, GRB.INFINITY, 50 + col.cost, GRB.CONTINUOUS, "use col" + str(col), grb_col)
-            elif affect == BranchConstr.FIX_TO_ZERO:
-                v = m.addVar(0, 0, 50 + col.cost, GRB.CONTINUOUS, "use col" + str(col), grb_col)
-            else:
-                v = m.addVar(0, GRB.INFINITY, 50 + col.cost, GRB.CONTINUOUS, "use col" + str(col), grb_col)
-
-            # else doing nothing
-            self._var[col] = v
-
-            # build cache
-            for i in range(0, len(col.seq)):
-                tid = col.seq[i]
-                self._cols_contain_test[tid].append(col)
-                for j in range(0, i):
-                    self._cols_contain_pair_in_order[(col.seq[j], col.seq[i])].append(col)
+        self._artificial.add(m, self._test_cover_constr)
+        # the columns of the parent first, in the order of its basis
+        for cid in self._master_cols.keys:
+            self._add_var(m, cid)
+        self._add_new_vars(m)
 
         m.update()
         return m
 
-    def _bound_enforced_by_branch_constr(self, col):
-        for constr in self._branch_constr_list:
-            affect = constr.satisfy(col)
-            if affect == BranchConstr.NO_IMPACT:
-                continue
-            else:
-                return affect
-
-        return BranchConstr.NO_IMPACT
+    def _index_rows(self):
+        # test cover rows first, then vehicle capacity rows
+        self._test_cover_constr = {}
+        for tid in self._inst.tids:
+            self._test_cover_constr[tid] = len(self._test_cover_constr)
+        self._vehicle_cap_constr = {}
+        for vrelease in self._inst.vreleases:
+            self._vehicle_cap_constr[vrelease] = len(self._test_cover_constr) + len(self._vehicle_cap_constr)
+        self._vehicle_cap_rows = capacity_rows(self._inst, self._vehicle_cap_constr)
 
-    def _build_pricing_prb(self):
-        m = Model("pricing")
-        # variables
-        self._use_tests = {}
-        self._use_vehicles = {}
-        self._preced = {}
-        self._tardiness = {}
-        self._start = {}
-
-        '''=================================
-                    variables
-        ================================='''
-        for tid in tp3s_io.TEST_MAP:
-            use_test = m.addVar(0, 1, 1, GRB.BINARY, "use test %d" % tid)
-            tardiness = m.addVar(0, GRB.INFINITY, 1, GRB.CONTINUOUS, "tardiness of test %d" % tid)
-            start_time = m.addVar(0, GRB.INFINITY, 0, GRB.CONTINUOUS, "start time of test %d" % tid)
-
-            self._use_tests[tid] = use_test
-            self._tardiness[tid] = tardiness
-            self._start[tid] = start_time
-
-        for vrelease in tp3s_io.VEHICLE_MAP:
-            use_vehicle = m.addVar(0, 1, 1, GRB.BINARY, "use vehicle %d" % vrelease)
-            self._use_vehicles[vrelease] = use_vehicle
-
-        for tid1 in tp3s_io.TEST_MAP:
-            for tid2 in tp3s_io.TEST_MAP:
-                if tid1 == tid2:
-                    continue
+    def _inherit_master_prb(self):
+        """
+        Copy the master problem of the parent, apply the bounds of the new branching
+        constraint and load the final basis of the parent, so that the first solve
+        is a dual simplex warm start.
+        Columns added to the pool by other nodes since are appended nonbasic.
+        The artificial columns start again from their initial cost.
+        :return: the master problem of this node
+        """
+        m = self._parent_master.take()
+        self._parent_master = None
+        self._index_rows()
+        self._artificial.set_cost(m)
 
-                preced = m.addVar(0, 1, 0, GRB.BINARY, "%d before %d" % (tid1, tid2))
-                self._preced[(tid1, tid2)] = preced
+        n_artificial = self._artificial.n_cols
+        keys = np.array(self._master_cols.keys, dtype=np.int64)
+        for j in np.flatnonzero(self._fixed[keys]).tolist():
+            m.set_bounds(n_artificial + j, 0, 0)
 
-        '''=================================
-                    constraints
-        ================================='''
-        m.objcon = 50
+        self._add_new_vars(m)
         m.update()
-        big_m = max([t.dur for t in tp3s_io.TEST_MAP.values()]) * 5
-
-        # vehicle related constraints
-        # use one vehicle
-        m.addConstr(quicksum(self._use_vehicles.values()) == 1)
-
-        # test related constraints
-        for tid in tp3s_io.TEST_MAP:
-            t = tp3s_io.TEST_MAP[tid]
-            start_time = self._start[tid]
-            tardiness = self._tardiness[tid]
-            use_test = self._use_tests[tid]
-
-            # test release
-            m.addConstr(start_time >= t.release)
-
-            # start after vehicle release
-            m.addConstr(start_time >=
-                        quicksum([self._use_vehicles[vrelease] * vrelease
-                                  for vrelease in tp3s_io.VEHICLE_MAP]))
-
-            # tardiness
-            m.addConstr(start_time + t.dur <= t.deadline + tardiness + big_m * (1 - use_test))
-
-        ordered_test_list = sorted(tp3s_io.TEST_MAP.values(), key=lambda x: x.test_id)
-        for t1 in ordered_test_list:
-            tid1 = t1.test_id
-            use_test1 = self._use_tests[tid1]
-            start_time1 = self._start[tid1]
-            for t2 in ordered_test_list:
-                tid2 = t2.test_id
-                if tid1 <= tid2:
-                    break
 
-                use_test2 = self._use_tests[tid2]
-                start_time2 = self._start[tid2]
-                preced12 = self._preced[tid1, tid2]
-                preced21 = self._preced[tid2, tid1]
-
-                m.addConstr(use_test1 + use_test2 - 1 <= preced12 + preced21)
-                m.addConstr(preced12 + preced21 <= 0.5 * (use_test1 + use_test2))
+        self._load_parent_basis(m)
+        return m
 
-                m.addConstr(start_time1 + t1.dur <=
-                            start_time2 + big_m * (1 - preced12))
-                m.addConstr(start_time2 + t2.dur <=
-                            start_time1 + big_m * (1 - preced21))
+    def _load_parent_basis(self, m):
+        """
+        Load the final basis of the parent, columns it does not know about are nonbasic
+        :param m: master problem of this node
+        :return:
+        """
+        vbasis, cbasis = self._parent_basis
+        self._parent_basis = None
+        vbasis = vbasis.tolist() + [-1] * (m.num_cols() - len(vbasis))
+        m.set_basis(vbasis, cbasis.tolist())
+        m.set_dual_simplex(True)
 
-                # rehits
-                if not tp3s_io.REHIT_MAP[tid1][tid2]:
-                    preced12.ub = 0
+    def _add_new_vars(self, m):
+        """
+        Add the variables of the pool columns neither in the master problem nor evicted from it
+        :param m: master problem
+        :return:
+        """
+        known = set(self._master_cols.keys)
+        known.update(self._master_cols.inactive)
+        for cid in range(len(self._col_pool)):
+            if cid not in known:
+                self._add_var(m, cid)
+                self._master_cols.add(cid)
+
+    def _grow_fixed(self, n_cols):
+        """
+        Make room for the first n_cols pool columns in the fixed columns, doubling the capacity
+        :param n_cols: number of columns
+        :return:
+        """
+        if len(self._fixed) < n_cols:
+            fixed = np.zeros(max(n_cols, 2 * len(self._fixed)), dtype=bool)
+            fixed[:self._n_checked] = self._fixed[:self._n_checked]
+            self._fixed = fixed
 
-                if not tp3s_io.REHIT_MAP[tid2][tid1]:
-                    preced21.ub = 0
+    def _update_fixed(self):
+        """
+        Bring the fixed columns up to date with the pool and the last branching constraint
+        :return:
+        """
+        new_constr = self._branch_constr_list[-1] if self._branch_constr_list else None
+        n_cols = len(self._col_pool)
+        self._grow_fixed(n_cols)
+        if new_constr:
+            for cid in np.flatnonzero(~self._fixed[:self._n_checked]).tolist():
+                if new_constr.satisfy(self._col_pool[cid]) == BranchConstr.FIX_TO_ZERO:
+                    self._fixed[cid] = True
+        for cid in range(self._n_checked, n_cols):
+            if self._bound_enforced_by_branch_constr(self._col_pool[cid]) == BranchConstr.FIX_TO_ZERO:
+                self._fixed[cid] = True
+        self._n_checked = n_cols
+
+    def _add_var(self, m, cid):
+        """
+        Add the variable of a pool column to the master problem
+        :param m: master problem
+        :param cid: id of the column in the pool
+        :return:
+        """
+        col = self._col_pool[cid]
+        if cid >= self._n_checked:
+            self._grow_fixed(cid + 1)
+            if self._bound_enforced_by_branch_constr(col) == BranchConstr.FIX_TO_ZERO:
+                self._fixed[cid] = True
+            self._n_checked = cid + 1
+
+        rows = self._vehicle_cap_rows[col.release][:]
+        rows.extend([self._test_cover_constr[tid] for tid in col.seq])
+        ub = 0 if self._fixed[cid] else float("inf")
+        m.add_col(50 + col.cost, 0, ub, rows, [1] * len(rows), "use col %d" % cid)
 
-        # branching constraints related constraints
+    def _bound_enforced_by_branch_constr(self, col):
         for constr in self._branch_constr_list:
-            if constr.btype == BranchConstr.TYPE_TEST_ONE_VEHICLE:
-                tid = constr.tid1
-                vid = constr.vid
-                use_test = self._use_tests[tid]
-                use_vehicle = self._use_vehicles[vid]
-                if constr.direction == BranchConstr.FIX_TO_ZERO:
-                    # forbid assign tid to vid
-                    m.addConstr(use_test <= 1 - use_vehicle)
-                elif constr.direction == BranchConstr.FIX_TO_ONE:
-                    # if the vehicle is used, then test must be included
-                    # if other vehicle is used, then the test must be excluded
-                    m.addConstr(use_test == use_vehicle)
-            elif constr.btype == BranchConstr.TYPE_TEST_PAIR_TOGETHER:
-                tid1 = constr.tid1
-                tid2 = constr.tid2
-                use_test1 = self._use_tests[tid1]
-                use_test2 = self._use_tests[tid2]
-                if constr.direction == BranchConstr.FIX_TO_ZERO:
-                    # test1 and test2 cannot appear together
-                    m.addConstr(use_test1 + use_test2 <= 1)
-                elif constr.direction == BranchConstr.FIX_TO_ONE:
-                    m.addConstr(use_test1 == use_test2)
-            elif constr.btype == BranchConstr.TYPE_TEST_PAIR_ORDER_ON_VEHICLE:
-                tid1 = constr.tid1
-                tid2 = constr.tid2
-                vid = constr.vid
-                use_vehicle = self._use_vehicles[vid]
-                preced = self._preced[tid1, tid2]
-                if constr.direction == BranchConstr.FIX_TO_ZERO:
-                    # test1 cannot before test2 on vehicle vid
-                    m.addConstr(preced <= 1 - use_vehicle)
-                elif constr.direction == BranchConstr.FIX_TO_ONE:
-                    m.addConstr(preced == use_vehicle)
-
-        m.update()
-        return m
-
-    def _price(self, test_dual, vehicle_dual):
-        # modify coeff in obj
-        for tid in tp3s_io.TEST_MAP:
-            use_test = self._use_tests[tid]
-            use_test.obj = - test_dual[tid]
-        for vrelease in tp3s_io.VEHICLE_MAP:
-            use_vehicle = self._use_vehicles[vrelease]
-            use_vehicle.obj = -vehicle_dual[vrelease]
-
-        self._pricer.update()
-        self._pricer.optimize()
-
-        col = None
-        obj_val = None
-        if self._pricer.status == GRB.OPTIMAL:
-            obj_val = self._pricer.objval
-            if obj_val < -0.001:
-                col = self._parse_col()
+            affect = constr.satisfy(col)
+            if affect == BranchConstr.NO_IMPACT:
+                continue
+            else:
+                return affect
 
-        return col, obj_val
+        return BranchConstr.NO_IMPACT
 
     def _solve_lp(self):
         # build restricted master problem
         if not self._master_solver:
-            self._master_solver = self._build_master_prb()
-            # suppress output
-            self._master_solver.params.outputflag = 0
-
-        # build the pricing problem
-        if not self._pricer:
-            self._pricer = self._build_pricing_prb()
-            # suppress output
-            self._pricer.params.outputflag = 0
+            self._update_fixed()
+            bp_solver = self._bp_solver
+            if self._parent_cols is not None:
+                self._master_cols = MasterCols.from_snapshot(self._parent_cols, bp_solver.col_max_age,
+                                                             bp_solver.col_evict_rc)
+                self._parent_cols = None
+            else:
+                self._master_cols = MasterCols(bp_solver.col_max_age, bp_solver.col_evict_rc)
+            if self._parent_master is not None and self._parent_master.model is not None:
+                self._master_solver = self._inherit_master_prb()
+            else:
+                self._parent_master = None
+                self._master_solver = self._build_master_prb()
+                if self._parent_basis:
+                    self._load_parent_basis(self._master_solver)
+
+        # apply the branching constraints on the shared pricing problem
+        pricer = self._bp_solver.pricer
+        pricer.set_branch_constrs(self._branch_constr_list)
+        smoother = self._bp_solver.smoother
+        if smoother:
+            smoother.reset()
+        profiler = self._bp_solver.profiler
 
         # column generation loop
         max_iter = 1e3
         iter_times = 0
+        # best valid lower bound of the node lp found along the way
+        lower_bound = -float("inf")
+        neg_cols = None
         while iter_times < max_iter:
             iter_times += 1
-            self._master_solver.optimize()
+            with profiler.timer("master"):
+                self._master_solver.optimize()
+            self.lp_iter_count += self._master_solver.iter_count()
+            self.n_lp_solves += 1
+            if iter_times == 1:
+                # columns are added from now on, let the solver choose the algorithm again
+                self._master_solver.set_dual_simplex(False)
 
             # get dual info
-            test_dual = {}
-            vehicle_dual = {}
-            for tid, constr in self._test_cover_constr.iteritems():
-                test_dual[tid] = constr.Pi
-            for vid, constr in self._vehicle_cap_constr.iteritems():
-                vehicle_dual[vid] = constr.Pi
-
-            neg_col, rc = self._price(test_dual, vehicle_dual)
-            if not neg_col:
-                if self._master_solver.status == GRB.OPTIMAL:
-                    print "master val: {}, rc: {}".format(self._master_solver.objval, rc)
-                else:
-                    print "master infeasible"
-                break
-            else:
-                if self._master_solver.status == GRB.OPTIMAL:
-                    print "master val: {}, rc: {}".format(self._master_solver.objval, rc)
+            with profiler.timer("duals"):
+                duals = self._master_solver.duals()
+                test_dual = {}
+                for tid, constr in self._test_cover_constr.iteritems():
+                    test_dual[tid] = duals[constr]
+                vehicle_dual = vehicle_duals(self._inst, duals, self._vehicle_cap_constr)
+                evicted = []
+                if self._master_cols.max_age is not None:
+                    n_artificial = self._artificial.n_cols
+                    evicted = self._master_cols.age_cols(self._master_solver.get_basis()[0][n_artificial:],
+                                                         self._master_solver.reduced_costs()[n_artificial:])
+
+            # the evicted columns are priced first
+            with profiler.timer("rescan"):
+                back, rc = self._rescan_inactive(test_dual, vehicle_dual)
+            if back:
+                logger.debug("%d inactive columns back, rc: %s", len(back), rc)
+                with profiler.timer("add_cols"):
+                    self._update_master(evicted, back)
+                profiler.count("reactivated columns", len(back))
+                continue
+
+            with profiler.timer("pricing"):
+                if smoother:
+                    neg_cols, rc = smoother.price(pricer, test_dual, vehicle_dual)
                 else:
-                    print "master infeasible"
-
-                grb_col = Column()
-                grb_col.addTerms(1, self._vehicle_cap_constr[neg_col.release])
-                for tid in neg_col.seq:
-                    grb_col.addTerms(1, self._test_cover_constr[tid])
-
-                # check if the newly added variable should be fix to zero or one
-                affect = self._bound_enforced_by_branch_constr(neg_col)
-                if affect == BranchConstr.FIX_TO_ONE:
-                    v = self._master_solver.addVar(1, GRB.INFINITY, 50 + neg_col.cost, GRB.CONTINUOUS,
-                                                   "use col" + str(neg_col.cid), grb_col)
-                elif affect == BranchConstr.FIX_TO_ZERO:
-                    v = self._master_solver.addVar(0, 0, 50 + neg_col.cost, GRB.CONTINUOUS,
-                                                   "use col" + str(neg_col.cid), grb_col)
+                    neg_cols, rc = pricer.price(test_dual, vehicle_dual)
+            self.n_pricings += 1
+            if neg_cols:
+                objval = self._master_solver.objval()
+                if smoother:
+                    # the reduced cost is not the most negative one at the master duals,
+                    # use the bound of the stability center
+                    lower_bound = max(lower_bound, smoother.center_bound)
                 else:
-                    v = self._master_solver.addVar(0, GRB.INFINITY, 50 + neg_col.cost, GRB.CONTINUOUS,
-                                 "use col" + str(neg_col.cid), grb_col)
-                # v = self._master_solver.addVar(0, GRB.INFINITY, 50 + neg_col.cost, GRB.CONTINUOUS,
-                #                                "use col" + str(neg_col.cid), grb_col)
-
-                # update the cache
-                for i in range(0, len(neg_col.seq)):
-                    tid = neg_col.seq[i]
-                    self._cols_contain_test[tid].append(neg_col)
-                    for j in range(0, i):
-                        self._cols_contain_pair_in_order[(neg_col.seq[j], neg_col.seq[i])].append(neg_col)
+                    lower_bound = max(lower_bound, lagrangian_bound(self._inst, test_dual, vehicle_dual, rc))
+                if lower_bound >= self._bp_solver.best_inc_val - 0.001:
+                    logger.debug("master val: %s, lagrangian bound: %s, pruned", objval, lower_bound)
+                    break
+                # the master value is not the lp value of the node while artificial columns complete the cover
+                if self._tail_off and objval - lower_bound <= self._bp_solver.cg_gap_tol * abs(objval) and \
+                        not self._artificial.used(self._master_solver):
+                    logger.debug("master val: %s, lagrangian bound: %s, tailing off", objval, lower_bound)
+                    break
 
-                self._var[neg_col] = v
-                self._master_solver.update()
+            logger.debug("master val: %s, rc: %s", self._master_solver.objval(), rc)
+            if not neg_cols:
+                if self._raise_artificial_cost():
+                    continue
+                break
 
-                self._col_set.append(neg_col)
-                print "ng col", neg_col, neg_col.release
+            with profiler.timer("add_cols"):
+                n_pool_cols = len(self._col_pool)
+                n_added = self._update_master(evicted, [self._col_pool.add(neg_col) for neg_col in neg_cols])
+            profiler.count("columns", len(self._col_pool) - n_pool_cols)
+            if n_added < len(neg_cols):
+                profiler.count("duplicate columns", len(neg_cols) - n_added)
+            if not n_added and not evicted:
+                # the columns priced are all in the master already
+                logger.debug("no new column")
+                neg_cols = None
+                if self._raise_artificial_cost():
+                    continue
+                break
 
+        pricer.clear_branch_constrs()
         self.solved = True
+        logger.debug("node lp iterations: %d, column generation iterations: %d", self.lp_iter_count, iter_times)
+        if smoother:
+            logger.debug("smoothed pricings: %d, mispricings: %d, exact pricings: %d",
+                         smoother.n_smoothed, smoother.n_mispricings, smoother.n_exact)
 
         # check the objective function value is > best integer solution value
-        # if yes, no need to branch further
-        lp_objval = self._master_solver.objval
-        if lp_objval > BPSolver.BEST_INC_VAL:
+        # if yes, no need to branch further.
+        # the master value is only a bound of the node if the column generation converged,
+        # otherwise take the best lagrangian bound, or the bound of the parent if none was computed
+        if not neg_cols:
+            lp_objval = self._master_solver.objval()
+        else:
+            lp_objval = max(lower_bound, self.parent_bound)
+        self.lp_objval = lp_objval
+        if lp_objval >= self._bp_solver.best_inc_val - 0.001:
             return
-
-        # solve the ip version
-        int_model = self._master_solver.copy()
-        all_vars = int_model.getVars()
-        for v in all_vars:
-            v.vtype = GRB.BINARY
-        int_model.update()
-        int_model.optimize()
-        ip_objval = int_model.objval
-        print 'Int obj val', ip_objval
-        if ip_objval < BPSolver.BEST_INC_VAL:
-            BPSolver.BEST_INC_VAL = ip_objval
-            # fetch the columns
-
-        if abs(ip_objval - lp_objval) < 0.001:
-            print "OK"
+        if not neg_cols and self._artificial.used(self._master_solver):
+            # at their maximum cost, see _raise_artificial_cost: the tests have no cover in this subtree
+            logger.debug("node infeasible")
             return
 
+        # look for an incumbent closing the node
+        for heuristic in self._bp_solver.heuristics:
+            if not heuristic.runs_at(self.depth):
+                continue
+            with profiler.timer(heuristic.name):
+                res = heuristic.run(self)
+            if res is not None and res[0] < self._bp_solver.best_inc_val:
+                profiler.count(heuristic.name + " incumbents")
+                self._bp_solver.update_incumbent(*res)
+            if lp_objval >= self._bp_solver.best_inc_val - 0.001:
+                return
+
         # integrality check
-        int_res = self._int_check()
+        with profiler.timer("int_check"):
+            int_res = self._int_check()
 
         # branch and create subproblems
         if int_res is not None:
-            node1, node2 = self._branch(int_res)
-            self._bp_solver.add_node(lp_objval, node1)
-            self._bp_solver.add_node(lp_objval, node2)
+            with profiler.timer("branch"):
+                node1, node2 = self._branch(int_res)
+            values = np.array(self._col_values(self._master_solver))
+            fractionality = np.minimum(values - np.floor(values), np.ceil(values) - values).sum()
+            self._bp_solver.add_node(lp_objval, node1, fractionality)
+            self._bp_solver.add_node(lp_objval, node2, fractionality)
         else:
-            # all integer, update the upper bound
-            if self._master_solver.objval < BPSolver.BEST_INC_VAL:
-                # record the incumbent
-                used_col = self._get_used_cols()
-                BPSolver.INC_SOL = used_col
-                BPSolver.BEST_INC_VAL = self._master_solver.objval
-
-    def _get_used_cols(self):
+            # all integer, update the upper bound unless artificial columns complete the cover
+            if not self._artificial.used(self._master_solver):
+                self._bp_solver.update_incumbent(self._master_solver.objval(),
+                                                 self._get_used_cols(self._master_solver))
+            if neg_cols and lp_objval < self._bp_solver.best_inc_val - 0.001:
+                # the column generation stopped early, the subtree may still hold cheaper columns:
+                # keep the node open and finish its column generation later
+                self._bp_solver.add_node(lp_objval, self._resume())
+
+    def _rescan_inactive(self, test_dual, vehicle_dual):
+        """
+        Price the columns evicted from the master problem
+        :param test_dual: dual value of each test cover constraint
+        :param vehicle_dual: dual value of a vehicle of each release
+        :return: ids of the inactive columns not fixed with a negative reduced cost, most negative first,
+                 and the most negative reduced cost
+        """
+        inactive = np.array(self._master_cols.inactive, dtype=np.int64)
+        cids = inactive[~self._fixed[inactive]].tolist()
+        r_costs = [(reduced_cost(self._col_pool[cid], test_dual, vehicle_dual), cid) for cid in cids]
+        r_costs = sorted([(r_cost, cid) for r_cost, cid in r_costs if r_cost < -0.001])
+        if not r_costs:
+            return [], None
+        return [cid for _, cid in r_costs], r_costs[0][0]
+
+    def _update_master(self, evicted, cids):
+        """
+        Remove the evicted variables from the master problem and add the columns not in it yet,
+        the inactive ones among them are active again
+        :param evicted: variable indices
+        :param cids: pool column ids
+        :return: number of variables added
+        """
+        m = self._master_solver
+        if evicted:
+            m.remove_cols([self._artificial.n_cols + j for j in evicted])
+            self._master_cols.evict(evicted)
+            self._bp_solver.profiler.count("evicted columns", len(evicted))
+        known = set(self._master_cols.keys)
+        added = []
+        for cid in cids:
+            if cid not in known:
+                known.add(cid)
+                added.append(cid)
+        self._master_cols.reactivate(added)
+        for cid in added:
+            self._add_var(m, cid)
+            self._master_cols.add(cid)
+        m.update()
+        return len(added)
+
+    def _raise_artificial_cost(self):
+        """
+        The column generation converged: if its solution uses artificial columns and does not close the node,
+        raise their cost to push them out of the solution
+        :return: whether the cost was raised
+        """
+        m = self._master_solver
+        return (self._artificial.used(m) and m.objval() < self._bp_solver.best_inc_val - 0.001 and
+                self._artificial.raise_cost(m))
+
+    def _col_values(self, m):
+        """
+        :param m: master problem of this node or a copy of it, solved
+        :return: values of the variables of the master columns
+        """
+        return m.values()[self._artificial.n_cols:]
+
+    def _copy_master(self):
+        """
+        :return: copy of the master problem without the artificial columns, variable j is master column j
+        """
+        m = self._master_solver.copy()
+        m.remove_cols(range(self._artificial.n_cols))
+        m.update()
+        return m
+
+    def _get_used_cols(self, m):
         used_col = {}
-        for k, v in self._var.iteritems():
-            used_col[k] = v.x
+        for cid, val in zip(self._master_cols.keys, self._col_values(m)):
+            used_col[self._col_pool[cid]] = val
         return used_col
 
     def _int_check(self):
-        res = self._int_check_tests_together()
+        incidence = self._bp_solver.col_incidence
+        incidence.sync()
+        # weight every column by its value in a single call, the columns out of the master are at 0
+        values = np.zeros(len(self._col_pool))
+        values[self._master_cols.keys] = self._col_values(self._master_solver)
+        x = sparse.diags(values)
+
+        res = self._int_check_tests_together(incidence, x)
         if res:
             return Node.FRACTIONAL_TEST_PAIR, res[0], res[1], None
 
-        res = self._int_check_test_on_vehicle()
+        res = self._int_check_test_on_vehicle(incidence, x)
         if res:
             return Node.FRACTIONAL_TEST_ON_VEHICLE, res[0], None, res[1]
-        res = self._int_check_tests_pair_order_on_vehicle()
+        res = self._int_check_tests_pair_order_on_vehicle(incidence, x)
         if res:
             return Node.FRACTIONAL_TEST_ORDER_PAIR_ON_VEHICLE, res[0], res[1], res[2]
 
         return None
 
-    def _int_check_test_on_vehicle(self):
+    @staticmethod
+    def _closest_to_half(flow):
+        """
+        Find the entry of a sparse flow matrix closest to half
+        :param flow: sparse matrix
+        :return: distance to half, (row, col) of the entry
+        """
+        flow = flow.tocoo()
+        if flow.nnz == 0:
+            return float("inf"), None
+        dist = np.abs(flow.data - 0.5)
+        k = dist.argmin()
+        return dist[k], (flow.row[k], flow.col[k])
+
+    def _int_check_test_on_vehicle(self, incidence, x):
         """
         Check a test is not assigned to multiple vehicles
+        :param incidence: column incidence of the pool
+        :param x: diagonal matrix of the column values
         :return:
         """
-        tid_vid_pair = None
-        dist_to_half = float("inf")
-        for tid in tp3s_io.TEST_MAP:
-            for vrelease in tp3s_io.VEHICLE_MAP:
-                col_contain_test_on_this_vehicle = filter(lambda c: c.release == vrelease,
-                                                          self._cols_contain_test[tid])
-                lambda_val = sum([self._var[col].x
-                                  for col in col_contain_test_on_this_vehicle])
-
-                # find the closed to half
-                if abs(lambda_val - 0.5) < dist_to_half:
-                    dist_to_half = abs(lambda_val - 0.5)
-                    tid_vid_pair = tid, vrelease
+        # tests x releases
+        flow = incidence.cover.dot(x).dot(incidence.release)
+        dist_to_half, entry = self._closest_to_half(flow)
+
         # check the distance
-        print "min dist to half", dist_to_half
+        logger.debug("min dist to half %s", dist_to_half)
         if dist_to_half > 0.4888:
             return None
         else:
-            return tid_vid_pair
+            return incidence.tids[entry[0]], incidence.vreleases[entry[1]]
 
-    def _int_check_tests_together(self):
+    def _int_check_tests_together(self, incidence, x):
         """
         Check a pair of tests are together
+        :param incidence: column incidence of the pool
+        :param x: diagonal matrix of the column values
         :return:
         """
-        dist_to_half = float("inf")
-        test_pair = None
-        ordered_test_list = sorted(tp3s_io.TEST_MAP.keys())
-        for tid1 in ordered_test_list:
-            for tid2 in ordered_test_list:
-                if tid2 >= tid1:
-                    break
-                col_contain_both_tests = self._cols_contain_pair_in_order[tid1, tid2][:]
-                col_contain_both_tests.extend(self._cols_contain_pair_in_order[tid2, tid1][:])
-                lambda_val = sum([self._var[col].x for col in col_contain_both_tests])
-
-                if abs(lambda_val - 0.5) < dist_to_half:
-                    dist_to_half = abs(lambda_val - 0.5)
-                    test_pair = tid1, tid2
-
-        # for c in self._col_set:
-        #     if 1880 in c.seq or 1854 in c.seq:
-        #
-        #         if self._var[c].x > 0:
-        #             print c, c.release, self._var[c].x
+        # tests x tests, keep tid1 > tid2
+        flow = sparse.tril(incidence.cover.dot(x).dot(incidence.cover.T), k=-1)
+        dist_to_half, entry = self._closest_to_half(flow)
+
         # check the distance
-        print "min dist to half", dist_to_half
+        logger.debug("min dist to half %s", dist_to_half)
 
         if dist_to_half > 0.4888:
             return None
         else:
-            return test_pair
+            return incidence.tids[entry[0]], incidence.tids[entry[1]]
 
-    def _int_check_tests_pair_order_on_vehicle(self):
+    def _int_check_tests_pair_order_on_vehicle(self, incidence, x):
         """
         Check a pair of tests arranged in certain order
+        :param incidence: column incidence of the pool
+        :param x: diagonal matrix of the column values
         :return:
         """
-        dist_to_half = float("inf")
-        test_pair = None
-        ordered_test_list = sorted(tp3s_io.TEST_MAP.keys())
-        for tid1 in ordered_test_list:
-            for tid2 in ordered_test_list:
-                if tid2 >= tid1:
-                    break
-                col_statisfy_order_t1_t2 = self._cols_contain_pair_in_order[tid1, tid2]
-                col_statisfy_order_t2_t1 = self._cols_contain_pair_in_order[tid2, tid1]
-                for vrelease in tp3s_io.VEHICLE_MAP:
-                    lambda_val_t1_t2 = sum([self._var[col].x for col in col_statisfy_order_t1_t2
-                                            if col.release == vrelease])
-                    lambda_val_t2_t1 = sum([self._var[col].x for col in col_statisfy_order_t2_t1
-                                            if col.release == vrelease])
-
-                    if abs(lambda_val_t1_t2 - 0.5) < dist_to_half:
-                        dist_to_half = abs(lambda_val_t1_t2 - 0.5)
-                        test_pair = tid1, tid2, vrelease
-
-                    if abs(lambda_val_t2_t1 - 0.5) < dist_to_half:
-                        dist_to_half = abs(lambda_val_t2_t1 - 0.5)
-                        test_pair = tid2, tid1, vrelease
+        # tests x (tests * releases), flow of test1 before test2 on a release
+        x_at_position = sparse.diags(x.diagonal()[incidence.position_col])
+        flow = incidence.before.dot(x_at_position).dot(incidence.at)
+        dist_to_half, entry = self._closest_to_half(flow)
 
-
-        print "min dist to half", dist_to_half
+        logger.debug("min dist to half %s", dist_to_half)
 
         if dist_to_half > 0.4888:
             return None
         else:
-            return test_pair
+            tidx2, ridx = divmod(entry[1], len(incidence.vreleases))
+            return incidence.tids[entry[0]], incidence.tids[tidx2], incidence.vreleases[ridx]
+
+    def _warm_start(self, n_children):
+        """
+        The children share the basis and the columns of this node, and copy its master problem
+        if it is still kept by the solver when they are processed
+        :param n_children: number of children
+        :return: master problem, basis and snapshot of the master columns for the children
+        """
+        vbasis, cbasis = self._master_solver.get_basis()
+        basis = np.array(vbasis, dtype=np.int8), np.array(cbasis, dtype=np.int8)
+        parent_master = ParentMaster(self._master_solver, n_children)
+        self._bp_solver.keep_parent_master(parent_master)
+        return parent_master, basis, self._master_cols.snapshot()
+
+    def _resume(self):
+        """
+        :return: open node with the branching constraints of this node, warm started from it,
+                 whose column generation does not stop on tailing off
+        """
+        parent_master, basis, cols = self._warm_start(1)
+        return Node(self._branch_constr_list, self._bp_solver, self._fixed, self._n_checked, parent_master, basis,
+                    cols, tail_off=False)
 
     def _branch(self, int_res):
         """
@@ -547,7 +1052,7 @@ class Node:
             constr2 = BranchConstr(int_res[1], int_res[2], int_res[-1], BranchConstr.TYPE_TEST_PAIR_ORDER_ON_VEHICLE,
                                    BranchConstr.FIX_TO_ZERO)
         else:
-            print "Integrality result btype error"
+            logger.error("Integrality result btype error")
             constr1 = None
             constr2 = None
 
@@ -557,27 +1062,37 @@ class Node:
         constr_list2 = self._branch_constr_list[:]
         constr_list1.append(constr1)
         constr_list2.append(constr2)
-        node1 = Node(self._col_set, constr_list1, self._bp_solver)
-        node2 = Node(self._col_set, constr_list2, self._bp_solver)
+        parent_master, basis, cols = self._warm_start(2)
+        node1 = Node(constr_list1, self._bp_solver, self._fixed.copy(), self._n_checked, parent_master, basis, cols)
+        node2 = Node(constr_list2, self._bp_solver, self._fixed, self._n_checked, parent_master, basis, cols)
 
         return node1, node2
 
-    def _parse_col(self):
-        tests_used = []
-        for tid in tp3s_io.TEST_MAP:
-            use_test = self._use_tests[tid]
-            if use_test.x > 0.5:
-                tests_used.append(tid)
-
-        tests_used_sorted = sorted(tests_used, key=lambda tid: self._start[tid].x)
-        vehicle_used = 0
-        for vrelease in tp3s_io.VEHICLE_MAP:
-            use_vehicle = self._use_vehicles[vrelease]
-            if use_vehicle.x > 0.5:
-                vehicle_used = vrelease
-                break
-        col = Col(tests_used_sorted, vehicle_used)
-        return col
+
+class ParentMaster:
+    """
+    Master problem of a branched node, copied by its children to warm start them.
+    It is released once both children took their copy, or when the solver branches another node:
+    the pending nodes do not keep the lp models alive, the children of a released parent
+    build their master problem again and load the parent basis.
+    """
+
+    def __init__(self, model, n_children):
+        self.model = model
+        self._n_children = n_children
+
+    def take(self):
+        """
+        :return: a copy of the master problem for a child
+        """
+        m = self.model.copy()
+        self._n_children -= 1
+        if self._n_children == 0:
+            self.release()
+        return m
+
+    def release(self):
+        self.model = None
 
 
 class BranchConstr:
@@ -618,45 +1133,36 @@ class BranchConstr:
         :param col:
         :return: true if satisfied, false if not satisfied
         """
+        pos1 = col.position(self.tid1)
+        pos2 = col.position(self.tid2) if self.tid2 is not None else -1
         if self.direction == BranchConstr.FIX_TO_ZERO:
             # if a column satisfies the criteria (contains relevant tests, vehicles), it will be fixed to zero
             if self.btype == BranchConstr.TYPE_TEST_ONE_VEHICLE:
-                if self.tid1 in col.seq and col.vid == self.vid:
+                if pos1 >= 0 and col.release == self.vid:
                     return BranchConstr.FIX_TO_ZERO
             elif self.btype == BranchConstr.TYPE_TEST_PAIR_TOGETHER:
-                if self.tid1 in col.seq \
-                        and self.tid2 in col.seq:
+                if pos1 >= 0 and pos2 >= 0:
                     return BranchConstr.FIX_TO_ZERO
             elif self.btype == BranchConstr.TYPE_TEST_PAIR_ORDER_ON_VEHICLE:
-                if self.tid1 in col.seq \
-                        and self.tid2 in col.seq \
-                        and col.seq.index(self.tid1) < col.seq.index(self.tid2) \
-                        and col.vid == self.vid:
+                if 0 <= pos1 < pos2 and col.release == self.vid:
                     return BranchConstr.FIX_TO_ZERO
             return BranchConstr.NO_IMPACT
         elif self.direction == BranchConstr.FIX_TO_ONE:
             # if a column satisfies partially the criteria (contains relevant tests, vehicles), it will be fixed to zero
             if self.btype == BranchConstr.TYPE_TEST_ONE_VEHICLE:
-                if self.tid1 in col.seq \
-                        and col.vid != self.vid:  # contains the test, but assign the test to other vehicles
+                if pos1 >= 0 and col.release != self.vid:  # contains the test, but assign the test to other vehicles
                     return BranchConstr.FIX_TO_ZERO
             elif self.btype == BranchConstr.TYPE_TEST_PAIR_TOGETHER:
-                if self.tid1 in col.seq and self.tid2 not in col.seq:
+                if (pos1 >= 0) != (pos2 >= 0):
                     # if contains exactly one of two tests
                     return BranchConstr.FIX_TO_ZERO
-                if self.tid2 in col.seq and self.tid1 not in col.seq:
-                    return BranchConstr.FIX_TO_ZERO
             elif self.btype == BranchConstr.TYPE_TEST_PAIR_ORDER_ON_VEHICLE:
-                if self.tid1 in col.seq and self.tid2 not in col.seq:
+                if (pos1 >= 0) != (pos2 >= 0):
                     # if contains exactly one of two tests
                     return BranchConstr.FIX_TO_ZERO
-                if self.tid2 in col.seq and self.tid1 not in col.seq:
+                if pos1 > pos2 >= 0:  # t1 after t2
                     return BranchConstr.FIX_TO_ZERO
-                if self.tid1 in col.seq \
-                        and self.tid2 in col.seq:
-                    if col.seq.index(self.tid1) > col.seq.index(self.tid2):  # t1 after t2
-                        return BranchConstr.FIX_TO_ZERO
             return BranchConstr.NO_IMPACT
         else:
-            print "Unknown branching constraint btype"
+            logger.error("Unknown branching constraint btype")
             return None
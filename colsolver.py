@@ -1,144 +1,253 @@
-from uuid import uuid1
-
-from gurobipy import *
-
-import tp3s_io
+import logging
+
+import numpy as np
+
+from backend import create_backend, GUROBI, GREATER_EQUAL, LESS_EQUAL
+from instrument import NULL_PROFILER
+
+logger = logging.getLogger("tp3s")
+
+
+def capacity_rows(inst, vehicle_cap_constr):
+    """
+    The capacity rows are cumulative: the row of release r bounds the columns of the releases up to r
+    by the vehicles released up to r, so that a vehicle can run the columns of the later releases.
+    :param inst: instance
+    :param vehicle_cap_constr: release to capacity row
+    :return: release to the rows of the columns of the release, its row and the rows of the later releases
+    """
+    rows = {}
+    later = []
+    for vrelease in reversed(inst.vreleases):
+        later.append(vehicle_cap_constr[vrelease])
+        rows[vrelease] = later[:]
+    return rows
+
+
+def vehicle_duals(inst, duals, vehicle_cap_constr):
+    """
+    :param inst: instance
+    :param duals: duals of the master rows
+    :param vehicle_cap_constr: release to capacity row
+    :return: release to the dual value of a vehicle of the release,
+             the sum of the duals of the capacity rows of the release and of the later releases
+    """
+    vehicle_dual = {}
+    total = 0.0
+    for vrelease in reversed(inst.vreleases):
+        total += duals[vehicle_cap_constr[vrelease]]
+        vehicle_dual[vrelease] = total
+    return vehicle_dual
 
 
 class ColSolver:
-    def __init__(self):
-        pass
-
-    def _build_full_enum_model(self, startlvl=100):
-        # enumerate all columns
-        enumerator = ColEnumerator()
-        all_cols = enumerator.enum(maxlvl=startlvl)
-
-        m = Model("full enum model")
+    def __init__(self, inst, backend=GUROBI, profiler=NULL_PROFILER):
+        self._inst = inst
+        self._backend = backend
+        self.profiler = profiler
+        # statistics of the last column generation
+        self.n_lp_solves = 0
+        self.n_pricings = 0
+        # columns in the master problem or evicted from it, and those of them the master started with
+        self.n_cols = 0
+        self.n_seed_cols = 0
+
+    def _build_full_enum_model(self, startlvl=100, binary=True, artificial=None):
+        # columns up to startlvl, streamed into the model, after the artificial columns if given
+        enumerator = ColEnumerator(self._inst)
+
+        m = create_backend(self._backend, "full enum model")
         # build constraints first
         # cover tests
         self.test_cover_constr = {}
-        for tid in tp3s_io.TEST_MAP.keys():
-            constr = m.addConstr(0, GRB.GREATER_EQUAL, 1, name="cover test %d" % tid)
+        for tid in self._inst.tids:
+            constr = m.add_row(GREATER_EQUAL, 1, name="cover test %d" % tid)
             self.test_cover_constr[tid] = constr
 
-        # vehicle capacity constr
+        # vehicle capacity constr, cumulative over the release lattice
         self.vehicle_cap_constr = {}
-        for vrelease in tp3s_io.VEHICLE_MAP.keys():
-            constr = m.addConstr(0, GRB.LESS_EQUAL, len(tp3s_io.VEHICLE_MAP[vrelease]),
-                                 name="vehicle cap %d" % vrelease)
+        for vrelease in self._inst.vreleases:
+            constr = m.add_row(LESS_EQUAL, self._inst.cum_vehicle_count[vrelease],
+                               name="vehicle cap %d" % vrelease)
             self.vehicle_cap_constr[vrelease] = constr
+        self._vehicle_cap_rows = capacity_rows(self._inst, self.vehicle_cap_constr)
 
         m.update()
 
+        if artificial:
+            artificial.add(m, self.test_cover_constr)
         self.var = {}
         # add variables
-        for col in all_cols:
-            v_constr = self.vehicle_cap_constr[col.release]
-            grb_col = Column()
-            grb_col.addTerms(1, v_constr)
-
-            for tid in col.seq:
-                t_constr = self.test_cover_constr[tid]
-                grb_col.addTerms(1, t_constr)
+        for col in enumerator.iter_cols(maxlvl=startlvl):
+            self.var[col] = self._add_col(m, col, 1 if binary else float("inf"))
 
-            v = m.addVar(0, 1, 50 + col.cost, GRB.BINARY, "use col" + str(col), grb_col)
-            self.var[col] = v
+        self.n_cols = len(self.var)
 
+        if binary:
+            m.set_binary()
         m.update()
         return m
 
-    def _parse_sol(self):
+    def _add_col(self, m, col, ub):
+        rows = self._vehicle_cap_rows[col.release][:]
+        rows.extend([self.test_cover_constr[tid] for tid in col.seq])
+        return m.add_col(50 + col.cost, 0, ub, rows, [1] * len(rows), "use col" + str(col))
+
+    def _parse_sol(self, m):
         vehicle_usage = 0
         used_col = []
+        values = m.values()
         for c, v in self.var.iteritems():
-            if v.X > 0.5:
+            if values[v] > 0.5:
                 used_col.append(c)
                 vehicle_usage += 1
-        print "Total vehicles: ", vehicle_usage
+        logger.info("Total vehicles: %d", vehicle_usage)
         return used_col
 
     def solve_full_enum(self):
+        """
+        Solve the ip over all the columns
+        :return: optimal value, None if not solved to optimality
+        """
         m = self._build_full_enum_model()
         m.optimize()
 
-        if m.status == GRB.OPTIMAL:
-            _ = self._parse_sol()
+        if m.is_optimal():
+            _ = self._parse_sol(m)
+            return m.objval()
         else:
-            print 'model status abnormal', m.status
-
-    def solve_col_gen(self):
-        m = self._build_full_enum_model(startlvl=0)
-        m.params.outputflag = 0
-        for v in self.var.values():
-            v.VType = GRB.CONTINUOUS
-            v.UB = GRB.INFINITY
-        m.update()
+            logger.warning("model status abnormal %s", m.status())
+
+    def solve_col_gen(self, smoothing=0.0, col_max_age=None, col_evict_rc=1.0):
+        """
+        Solve the lp relaxation by column generation
+        :param smoothing: weight of the stability center in the wentges smoothing of the duals, 0 for no smoothing
+        :param col_max_age: evict the columns nonbasic with a reduced cost above col_evict_rc for more than
+                            this many iterations, never if None
+        :param col_evict_rc: reduced cost above which a nonbasic column ages
+        :return: value of the lp relaxation, None if the tests have no cover
+        """
+        # there may be too few vehicles for the singletons, artificial columns keep the master feasible
+        artificial = ArtificialCols(self._inst)
+        m = self._build_full_enum_model(startlvl=0, binary=False, artificial=artificial)
+        n_artificial = artificial.n_cols
+        self.n_lp_solves = 0
+        self.n_pricings = 0
+        cols = MasterCols(col_max_age, col_evict_rc)
+        for col in sorted(self.var, key=self.var.get):
+            cols.add(col)
+        self.n_seed_cols = len(cols.keys)
 
         max_iter = 1e5
         iter_times = 0
 
-        # all_col_list = ColEnumerator().enum()
-        seed_col_list = ColEnumerator().enum(maxlvl=0)
+        from pricing import LabelingPricer
+        from stabilization import reduced_cost, WentgesSmoother
 
-        # from pricing import HeuristicPricer
-        from pricing import MIPPricer
-
-        # pricer2 = EnumPricer(all_col_list)
-
-        pricer = MIPPricer()
-        # pricer = HeuristicPricer(self.__tests__, self.__vehicles__, self.__rehits__)
+        pricer = LabelingPricer(self._inst)
+        pricer.profiler = self.profiler
+        smoother = WentgesSmoother(self._inst, smoothing) if smoothing > 0 else None
+        profiler = self.profiler
         while iter_times < max_iter:
-            m.optimize()
+            with profiler.timer("master"):
+                m.optimize()
+            self.n_lp_solves += 1
             # get dual info
-            test_dual = {}
-            vehicle_dual = {}
-            for tid, constr in self.test_cover_constr.iteritems():
-                test_dual[tid] = constr.Pi
-            for vrelease, constr in self.vehicle_cap_constr.iteritems():
-                vehicle_dual[vrelease] = constr.Pi
-            neg_rc_col, rc = pricer.price(test_dual, vehicle_dual)
-            # neg_rc_col, rc = pricer.price2(test_dual, vehicle_dual, seed_col_list)
-
-            if neg_rc_col is None:
-                if m.status == GRB.OPTIMAL:
-                    print "master val:{}, most neg rc: {}".format(m.ObjVal, "positive")
-                else:
-                    print m.status
+            with profiler.timer("duals"):
+                duals = m.duals()
+                test_dual = {}
+                for tid, constr in self.test_cover_constr.iteritems():
+                    test_dual[tid] = duals[constr]
+                vehicle_dual = vehicle_duals(self._inst, duals, self.vehicle_cap_constr)
+                evicted = []
+                if cols.max_age is not None:
+                    evicted = cols.age_cols(m.get_basis()[0][n_artificial:], m.reduced_costs()[n_artificial:])
+
+            # the evicted columns are priced first
+            with profiler.timer("rescan"):
+                back = [(reduced_cost(col, test_dual, vehicle_dual), col) for col in cols.inactive]
+                back = sorted([(r_cost, col) for r_cost, col in back if r_cost < -0.001], key=lambda x: x[0])
+            if back:
+                neg_rc_cols, rc = [col for _, col in back], back[0][0]
+                cols.reactivate(neg_rc_cols)
+                profiler.count("reactivated columns", len(neg_rc_cols))
+            else:
+                with profiler.timer("pricing"):
+                    if smoother:
+                        neg_rc_cols, rc = smoother.price(pricer, test_dual, vehicle_dual)
+                    else:
+                        neg_rc_cols, rc = pricer.price(test_dual, vehicle_dual)
+                self.n_pricings += 1
+
+            if neg_rc_cols is None:
+                logger.debug("master val:%s, most neg rc: positive", m.objval())
+                # converged, push the artificial columns out of the solution
+                if artificial.used(m) and artificial.raise_cost(m):
+                    continue
                 break
             else:
-                # add variable
-                if m.status == GRB.OPTIMAL:
-                    print "master val:{}, most neg rc: {}".format(m.ObjVal, rc)
-                else:
-                    print m.status
-
-                grb_col = Column()
-                grb_col.addTerms(1, self.vehicle_cap_constr[neg_rc_col.release])
-                for tid in neg_rc_col.seq:
-                    grb_col.addTerms(1, self.test_cover_constr[tid])
-                v = m.addVar(0, GRB.INFINITY, 50 + neg_rc_col.cost, GRB.CONTINUOUS,
-                             "use col" + str(neg_rc_col.cid), grb_col)
-                self.var[neg_rc_col] = v
-                m.update()
-
-                seed_col_list.append(neg_rc_col)
-
-
-class Col:
-    def __init__(self, seq, release):
-        self.seq = []
-        self.seq.extend(seq)
-        # self.vid = vid
+                # add variables
+                logger.debug("master val:%s, most neg rc: %s, %d cols", m.objval(), rc, len(neg_rc_cols))
+
+                with profiler.timer("add_cols"):
+                    if evicted:
+                        m.remove_cols([n_artificial + j for j in evicted])
+                        cols.evict(evicted)
+                        self.var = dict((col, n_artificial + j) for j, col in enumerate(cols.keys))
+                        profiler.count("evicted columns", len(evicted))
+                    n_added = 0
+                    for neg_rc_col in neg_rc_cols:
+                        if neg_rc_col in self.var:
+                            # already in the master, a duplicate found at numerically zero reduced cost
+                            profiler.count("duplicate columns")
+                            continue
+                        self.var[neg_rc_col] = self._add_col(m, neg_rc_col, float("inf"))
+                        cols.add(neg_rc_col)
+                        n_added += 1
+                    m.update()
+                profiler.count("columns", n_added)
+                if not n_added and not evicted:
+                    logger.debug("no new column")
+                    if artificial.used(m) and artificial.raise_cost(m):
+                        continue
+                    break
+
+        self.n_cols = len(cols.keys) + len(cols.inactive)
+        if artificial.used(m):
+            logger.warning("no cover of the tests by the vehicles")
+            return None
+        return m.objval()
+
+
+class Col(object):
+    """
+    Column: a sequence of tests on a vehicle of the given release.
+    Immutable, identified by (release, seq), so that the same column found twice compares and hashes equal.
+    seq: test ids in the order of the vehicle
+    mask: bitmask of the test indices of the instance on the sequence
+    cost: total tardiness of the sequence
+    """
+    __slots__ = ("seq", "release", "cost", "mask", "_positions", "_hash")
+
+    def __init__(self, inst, seq, release, cost=None):
+        """
+        :param inst: instance
+        :param seq: test ids in the order of the vehicle
+        :param release: release of the vehicle
+        :param cost: tardiness of the sequence if already known, computed otherwise
+        """
+        self.seq = tuple(seq)
         self.release = release
-        self.cost = self._compute_col_cost()
-        self.cid = uuid1()
+        self.mask = inst.seq_mask(self.seq)
+        self.cost = cost if cost is not None else self._compute_col_cost(inst)
+        self._positions = None
+        self._hash = hash((self.release, self.seq))
 
-    def _compute_col_cost(self):
+    def _compute_col_cost(self, inst):
         totalcost = 0
         start = self.release
         for tid in self.seq:
-            test = tp3s_io.TEST_MAP[tid]
+            test = inst.test(tid)
             if start < test.release:
                 start = test.release
             start += test.dur
@@ -147,59 +256,334 @@ class Col:
                 totalcost += cost
         return totalcost
 
-    def comp_with(self, tid):
-        if tid in self.seq:
-            return False
+    def position(self, tid):
+        """
+        :param tid: test id
+        :return: position of the test in the sequence, -1 if not on it
+        """
+        if self._positions is None:
+            self._positions = dict((t, k) for k, t in enumerate(self.seq))
+        return self._positions.get(tid, -1)
 
-        for t in self.seq:
-            if not tp3s_io.REHIT_MAP[t][tid]:
-                return False
+    def covers(self, tid):
+        return self.position(tid) >= 0
 
-        return True
+    def comp_with(self, inst, tid):
+        return inst.comp_with(self.mask, tid)
+
+    def __eq__(self, other):
+        if not isinstance(other, Col):
+            return NotImplemented
+        return self._hash == other._hash and self.release == other.release and self.seq == other.seq
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return self._hash
+
+    def __getstate__(self):
+        return self.seq, self.release, self.cost, self.mask
+
+    def __setstate__(self, state):
+        self.seq, self.release, self.cost, self.mask = state
+        self._positions = None
+        self._hash = hash((self.release, self.seq))
 
     def __repr__(self):
-        return str(self.seq)
+        return str(list(self.seq))
 
 
-class ColEnumerator:
+class ColPool:
+    """
+    Columns shared by all the nodes of a search tree.
+    A column is identified by its index in the pool, the pool only grows and holds every column once.
+    """
 
     def __init__(self):
-        pass
+        self._cols = []
+        # column to index
+        self._index = {}
+
+    def add(self, col):
+        """
+        Add a column if it is not in the pool yet
+        :param col: column
+        :return: index of the column, of the one already in the pool if a duplicate
+        """
+        cid = self._index.get(col)
+        if cid is None:
+            cid = len(self._cols)
+            self._cols.append(col)
+            self._index[col] = cid
+        return cid
+
+    def truncate(self, n_cols):
+        """
+        Drop the columns added after the first n_cols
+        :param n_cols: number of columns to keep
+        :return: the dropped columns
+        """
+        dropped = self._cols[n_cols:]
+        del self._cols[n_cols:]
+        for col in dropped:
+            del self._index[col]
+        return dropped
+
+    def __getitem__(self, cid):
+        return self._cols[cid]
+
+    def __len__(self):
+        return len(self._cols)
+
+
+class MasterCols:
+    """
+    Columns of a restricted master problem, by variable index, and the columns evicted from it.
+    A column gets one iteration older at every solve where it is nonbasic with a reduced cost above min_rc,
+    it is young again otherwise, and it is evicted once older than max_age (never if max_age is None).
+    The evicted columns are inactive: out of the master problem, but rescanned before pricing
+    and brought back if their reduced cost is negative.
+    Columns are given by their key, the pool index in the branch and price.
+    """
+
+    def __init__(self, max_age=None, min_rc=1.0):
+        self.max_age = max_age
+        self.min_rc = min_rc
+        # variable index to key
+        self.keys = []
+        self.age = []
+        self.inactive = []
+
+    def add(self, key):
+        """
+        Add a column after the last variable
+        :param key: column key
+        :return: variable index of the column
+        """
+        self.keys.append(key)
+        self.age.append(0)
+        return len(self.keys) - 1
+
+    def age_cols(self, vbasis, r_costs):
+        """
+        Age the columns after a solve
+        :param vbasis: basis status of the variables, 0 for basic
+        :param r_costs: reduced cost of the variables
+        :return: indices of the variables to evict
+        """
+        if self.max_age is None:
+            return []
+        idle = (np.array(vbasis) != 0) & (np.array(r_costs) > self.min_rc)
+        age = (np.array(self.age, dtype=int) + 1) * idle
+        self.age = age.tolist()
+        return np.flatnonzero(age > self.max_age).tolist()
+
+    def evict(self, indices):
+        """
+        Remove variables, the ones after them move down, their columns become inactive
+        :param indices: variable indices
+        :return:
+        """
+        evicted = set(indices)
+        self.inactive.extend([self.keys[j] for j in sorted(evicted)])
+        self.keys = [key for j, key in enumerate(self.keys) if j not in evicted]
+        self.age = [age for j, age in enumerate(self.age) if j not in evicted]
+
+    def reactivate(self, keys):
+        """
+        Take inactive columns out of the inactive list, they are added back to the master by the caller
+        :param keys: keys of inactive columns
+        :return:
+        """
+        back = set(keys)
+        self.inactive = [key for key in self.inactive if key not in back]
+
+    def snapshot(self):
+        """
+        Compact read-only copy of integer keyed columns, e.g. shared by the pending children of a node
+        :return: keys, ages and inactive keys arrays
+        """
+        return (np.array(self.keys, dtype=np.int64), np.array(self.age, dtype=np.int32),
+                np.array(self.inactive, dtype=np.int64))
+
+    @staticmethod
+    def from_snapshot(snapshot, max_age=None, min_rc=1.0):
+        cols = MasterCols(max_age, min_rc)
+        keys, age, inactive = snapshot
+        cols.keys = keys.tolist()
+        cols.age = age.tolist()
+        cols.inactive = inactive.tolist()
+        return cols
 
     @staticmethod
-    def _enum_col(collist):
-        result = []
-        for c in collist:
-            for tid in tp3s_io.TEST_MAP.keys():
-                if c.comp_with(tid):
-                    s = []
-                    s.extend(c.seq)
-                    s.append(tid)
-                    new_col = Col(s, c.release)
-                    result.append(new_col)
-        return result
-
-    def enum(self, maxlvl=100):
-        # initial set
-        result = []
-        curr_lvl = []
-        for tid in tp3s_io.TEST_MAP.keys():
-            for vrelease in tp3s_io.VEHICLE_MAP.keys():
-                new_col = Col([tid], vrelease)
-                curr_lvl.append(new_col)
-
-        print "{} initial columns".format(len(curr_lvl))
-        result.extend(curr_lvl)
+    def remap_snapshot(snapshot, key_map):
+        """
+        Replace the keys of a snapshot, e.g. by the pool indices of the columns in another pool
+        :param snapshot: see snapshot()
+        :param key_map: array, old key to new key
+        :return: the remapped snapshot
+        """
+        keys, age, inactive = snapshot
+        return key_map[keys], age, key_map[inactive]
+
+
+class ArtificialCols:
+    """
+    Penalised artificial slack columns of the test cover rows, the first variables of a master problem.
+    The master problem is feasible whatever its columns, and its duals price the columns missing for a cover.
+    While the solution uses an artificial column, the master value is a lower bound of the lp, not its value.
+    Their cost is raised tenfold every time the column generation converges on such a solution, up to max_cost:
+    a master problem still using one then has no cover.
+    """
+
+    def __init__(self, inst, cost=1e4, max_cost=1e8):
+        self._inst = inst
+        self.n_cols = inst.n_tests
+        self.cost = cost
+        self.max_cost = max_cost
+
+    def add(self, m, test_cover_constr):
+        """
+        Add the artificial columns, before the other variables
+        :param m: master problem
+        :param test_cover_constr: test id to cover row
+        :return:
+        """
+        for tid in self._inst.tids:
+            m.add_col(self.cost, 0, float("inf"), [test_cover_constr[tid]], [1], "artificial %d" % tid)
+
+    def set_cost(self, m):
+        """
+        Set the cost of the artificial columns of a master problem to the current one
+        :param m: master problem
+        :return:
+        """
+        for j in range(self.n_cols):
+            m.set_obj(j, self.cost)
+        m.update()
+
+    def used(self, m):
+        """
+        :param m: master problem solved
+        :return: whether its solution uses an artificial column
+        """
+        return sum(m.values()[:self.n_cols]) > 1e-6
+
+    def raise_cost(self, m):
+        """
+        Raise the cost tenfold
+        :param m: master problem
+        :return: False if the cost is at its maximum already
+        """
+        if self.cost >= self.max_cost:
+            return False
+        self.cost *= 10
+        self.set_cost(m)
+        logger.debug("artificial columns in the solution, cost raised to %s", self.cost)
+        return True
+
+
+class ColEnumerator:
+    """
+    Enumerates the columns level by level, level k holding the columns of k + 1 tests.
+    A column is extended with the tests that can be rehit after all of its tests,
+    its completion time and cost are updated with each test added.
+    A column starting with a test only gets the releases of inst.first_releases,
+    the earlier releases give the same column on a vehicle that can run it anyway.
+
+    With dominance, among the columns of a level with the same release and the same tests,
+    only those not dominated on (completion time, cost) are extended and only the cheapest is yielded.
+    The others cover the same tests at a higher cost and none of their extensions is cheaper,
+    so the enumeration model keeps its optimum. A branch and price does not: a branching constraint
+    on the order of two tests can forbid the cheapest order and allow a dominated one,
+    its pricers need the enumeration without dominance.
+    Only two levels are held in memory at a time.
+    """
+
+    def __init__(self, inst):
+        self._inst = inst
+        self._release = inst.release.tolist()
+        self._deadline = inst.deadline.tolist()
+        self._dur = inst.dur.tolist()
+
+    def iter_cols(self, maxlvl=100, dominance=True):
+        """
+        Yield the columns of up to maxlvl + 1 tests
+        :param maxlvl: last level
+        :param dominance: skip the dominated columns
+        :return: generator of columns
+        """
+        inst = self._inst
+        # (release, tests mask) to [tests allowed next, [(completion time, cost, test indices)]]
+        level = {}
+        order = []
+        for i in range(inst.n_tests):
+            for vrelease in inst.first_releases[i]:
+                finish = max(vrelease, self._release[i]) + self._dur[i]
+                level[(vrelease, 1 << i)] = [inst.succ_masks[i], [(finish, max(finish - self._deadline[i], 0), (i,))]]
+                order.append((vrelease, 1 << i))
+
         lvl = 0
-        while lvl < maxlvl:
-            lvl += 1
-            nxt_lvl = self._enum_col(curr_lvl)
-            print "lvl: {}, {} columns".format(lvl, len(nxt_lvl))
-            if len(nxt_lvl) == 0:
+        total = 0
+        while level:
+            n_cols = 0
+            # the first level in the order of the tests
+            for key in order if lvl == 0 else level:
+                vrelease = key[0]
+                states = level[key][1]
+                if dominance:
+                    states = states[-1:]
+                for _, cost, seq in states:
+                    n_cols += 1
+                    yield Col(inst, [inst.tids[i] for i in seq], vrelease, cost)
+            logger.debug("lvl: %d, %d columns", lvl, n_cols)
+            total += n_cols
+            if lvl >= maxlvl:
                 break
-            result.extend(nxt_lvl)
-            curr_lvl = []
-            curr_lvl.extend(nxt_lvl)
+            level = self._extend(level, dominance)
+            lvl += 1
+        logger.debug("Total columns: %d", total)
+
+    def _extend(self, level, dominance):
+        nxt_lvl = {}
+        for (vrelease, mask), (allowed, states) in level.iteritems():
+            rest = allowed
+            while rest:
+                bit = rest & -rest
+                rest ^= bit
+                j = bit.bit_length() - 1
+                release, deadline, dur = self._release[j], self._deadline[j], self._dur[j]
+                entry = nxt_lvl.get((vrelease, mask | bit))
+                if entry is None:
+                    entry = [allowed & self._inst.succ_masks[j], []]
+                    nxt_lvl[(vrelease, mask | bit)] = entry
+                for completion, cost, seq in states:
+                    finish = max(completion, release) + dur
+                    entry[1].append((finish, cost + max(finish - deadline, 0), seq + (j,)))
+        if dominance:
+            for entry in nxt_lvl.itervalues():
+                entry[1] = self._pareto(entry[1])
+        return nxt_lvl
 
-        print "Total columns: {}".format(len(result))
-        return result
+    @staticmethod
+    def _pareto(states):
+        """
+        :param states: (completion time, cost, test indices)
+        :return: the states not dominated, by increasing completion time and decreasing cost
+        """
+        states.sort()
+        kept = []
+        for state in states:
+            if not kept or state[1] < kept[-1][1]:
+                kept.append(state)
+        return kept
+
+    def enum(self, maxlvl=100, dominance=False):
+        """
+        :param maxlvl: last level
+        :param dominance: skip the dominated columns
+        :return: list of the columns of up to maxlvl + 1 tests
+        """
+        return list(self.iter_cols(maxlvl, dominance))
@@ -0,0 +1,207 @@
+"""
+Primal heuristics of the branch and price, run at a node once its lp is solved to find incumbents.
+
+    heuristics = [LPRounding(), Diving(freq=5, time_limit=10), RestrictedMasterIP(freq=10, time_limit=5)]
+    solver = BPSolver(inst, heuristics=heuristics)
+
+A heuristic runs at the nodes whose depth is a multiple of its frequency (only at the root if 0)
+and returns an integer solution, (objective value, column to value), or None.
+The heuristics of a node run in the order given until the incumbent closes the node.
+"""
+import logging
+import time
+
+import numpy as np
+
+from colsolver import vehicle_duals
+
+logger = logging.getLogger("tp3s")
+
+
+def default_heuristics():
+    """
+    :return: lp rounding at every node, the ip over the master columns for at most 10 seconds at the root
+    """
+    return [LPRounding(), RestrictedMasterIP(freq=0, time_limit=10)]
+
+
+class PrimalHeuristic:
+    # phase of the heuristic in the profile
+    name = "heuristic"
+
+    def __init__(self, freq=1, time_limit=None):
+        """
+        :param freq: run at the nodes of depth multiple of freq, only at the root if 0
+        :param time_limit: seconds per run, no limit if None
+        """
+        self.freq = freq
+        self.time_limit = time_limit
+
+    def runs_at(self, depth):
+        if self.freq == 0:
+            return depth == 0
+        return depth % self.freq == 0
+
+    def run(self, node):
+        """
+        :param node: node with its master lp solved
+        :return: objective value and solution, column to value, None if no solution found
+        """
+        raise NotImplementedError
+
+
+class RestrictedMasterIP(PrimalHeuristic):
+    """
+    Solve the master problem of the node with binary variables,
+    over the max_cols columns of smallest reduced cost if max_cols is given.
+    """
+    name = "node_ip"
+
+    def __init__(self, freq=1, time_limit=None, max_cols=None):
+        PrimalHeuristic.__init__(self, freq, time_limit)
+        self.max_cols = max_cols
+
+    def run(self, node):
+        master = node._master_solver
+        cids = node._master_cols.keys
+        int_model = node._copy_master()
+        if self.max_cols is not None and len(cids) > self.max_cols:
+            r_costs = master.reduced_costs()[node._artificial.n_cols:]
+            keep = np.sort(np.argsort(r_costs, kind="mergesort")[:self.max_cols])
+            dropped = np.ones(len(cids), dtype=bool)
+            dropped[keep] = False
+            int_model.remove_cols(np.flatnonzero(dropped).tolist())
+            cids = [cids[j] for j in keep]
+        int_model.set_binary()
+        if self.time_limit is not None:
+            int_model.set_time_limit(self.time_limit)
+        int_model.optimize()
+        if not int_model.has_solution():
+            return None
+        logger.debug("Int obj val %s", int_model.objval())
+        pool = node._col_pool
+        return int_model.objval(), dict((pool[cid], val) for cid, val in zip(cids, int_model.values()))
+
+
+class LPRounding(PrimalHeuristic):
+    """
+    Take the master columns by decreasing lp value while they cover a test not covered yet,
+    then cover the remaining tests greedily with the master columns of least cost per test newly covered.
+    Vehicle capacities are respected, the columns fixed by branching are allowed: any cover is an incumbent.
+    """
+    name = "rounding"
+
+    def run(self, node):
+        inst = node._inst
+        pool = node._col_pool
+        cols = [pool[cid] for cid in node._master_cols.keys]
+        values = np.array(node._col_values(node._master_solver))
+        uncovered = set(inst.tids)
+        # vehicles released up to each release left, and whether a column of the release still fits
+        spare = dict(inst.cum_vehicle_count)
+        fits = dict((r, spare[r] > 0) for r in inst.vreleases)
+        chosen = []
+
+        def take(col):
+            chosen.append(col)
+            uncovered.difference_update(col.seq)
+            # the column takes a vehicle released up to its release, counted in the later releases
+            left = float("inf")
+            for r in reversed(inst.vreleases):
+                if r >= col.release:
+                    spare[r] -= 1
+                left = min(left, spare[r])
+                fits[r] = left > 0
+
+        for j in np.argsort(-values, kind="mergesort"):
+            if values[j] < 0.001 or not uncovered:
+                break
+            col = cols[j]
+            if fits[col.release] and uncovered.intersection(col.seq):
+                take(col)
+
+        while uncovered:
+            best, best_ratio = None, float("inf")
+            for col in cols:
+                if not fits[col.release]:
+                    continue
+                n_new = len(uncovered.intersection(col.seq))
+                if n_new and (50.0 + col.cost) / n_new < best_ratio:
+                    best, best_ratio = col, (50.0 + col.cost) / n_new
+            if best is None:
+                return None
+            take(best)
+
+        return sum([50 + col.cost for col in chosen]), dict((col, 1.0) for col in chosen)
+
+
+class Diving(PrimalHeuristic):
+    """
+    Fix the fractional column of largest value to 1 and solve the lp again by column generation,
+    on a copy of the master problem of the node, until the lp solution is integer.
+    The columns generated along the dive are added to the pool.
+    """
+    name = "diving"
+
+    def __init__(self, freq=1, time_limit=None, max_depth=None, max_cg_iter=100):
+        """
+        :param max_depth: give up after fixing this many columns, no limit if None
+        :param max_cg_iter: column generation iterations after each fixing
+        """
+        PrimalHeuristic.__init__(self, freq, time_limit)
+        self.max_depth = max_depth
+        self.max_cg_iter = max_cg_iter
+
+    def run(self, node):
+        start = time.time()
+        pool = node._col_pool
+        pricer = node._bp_solver.pricer
+        if node._artificial.used(node._master_solver):
+            # the master columns do not cover the tests
+            return None
+        master = node._copy_master()
+        cids = node._master_cols.keys[:]
+        known = set(cids)
+        values = node._col_values(node._master_solver)
+        objval = node._master_solver.objval()
+        fixed_one = set()
+
+        pricer.set_branch_constrs(node._branch_constr_list)
+        try:
+            depth = 0
+            while True:
+                frac = [(val, j) for j, val in enumerate(values) if j not in fixed_one and 0.001 < val < 0.999]
+                if not frac:
+                    logger.debug("diving depth %d, obj val %s", depth, objval)
+                    return objval, dict((pool[cid], val) for cid, val in zip(cids, values))
+                if self.max_depth is not None and depth >= self.max_depth:
+                    return None
+                depth += 1
+                _, j = max(frac)
+                master.set_bounds(j, 1, float("inf"))
+                fixed_one.add(j)
+
+                for k in range(self.max_cg_iter):
+                    master.optimize()
+                    if not master.is_optimal():
+                        return None
+                    if self.time_limit is not None and time.time() - start > self.time_limit:
+                        return None
+                    if k == self.max_cg_iter - 1:
+                        break
+                    duals = master.duals()
+                    test_dual = dict((tid, duals[row]) for tid, row in node._test_cover_constr.iteritems())
+                    vehicle_dual = vehicle_duals(node._inst, duals, node._vehicle_cap_constr)
+                    neg_cols, _ = pricer.price(test_dual, vehicle_dual)
+                    new_cids = [cid for cid in [pool.add(col) for col in neg_cols or []] if cid not in known]
+                    if not new_cids:
+                        break
+                    for cid in new_cids:
+                        node._add_var(master, cid)
+                        cids.append(cid)
+                        known.add(cid)
+                    master.update()
+                values = master.values()
+                objval = master.objval()
+        finally:
+            pricer.clear_branch_constrs()
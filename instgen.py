@@ -0,0 +1,110 @@
+"""
+Seeded generator of synthetic instances, in the json schema of the .tp3s files.
+
+    python instgen.py 500 out/500.tp3s --vehicles 400 --clusters 4 --clustering 0.8 --tightness 0.3 --rehit 0.1
+
+The same parameters and seed always give the same file.
+Defaults follow the bundled instances: most tests released at a few common times,
+durations of 18 to 40, windows from a little tighter to about twice the duration,
+about one test in ten can be rehit after another.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+
+def generate(n_tests, n_vehicles=None, seed=0, horizon=100, n_clusters=3, clustering=0.8, tightness=0.3,
+             rehit_density=0.1, dur_range=(18, 40), vehicle_spread=60, vehicle_step=5, inst_id=None):
+    """
+    Generate an instance
+    :param n_tests: number of tests
+    :param n_vehicles: number of vehicles, 4/5 of the number of tests if None
+    :param seed: random seed
+    :param horizon: the tests are released in [0, horizon]
+    :param n_clusters: number of common release times, the first one is 0
+    :param clustering: probability that a test is released at a common release time rather than uniformly
+    :param tightness: in [0, 1], slack of the window (deadline - release - duration) is drawn uniformly in
+                      [-tightness, 2 * (1 - tightness)] times the duration, negative slack forces tardiness
+    :param rehit_density: probability that a test can be rehit after another
+    :param dur_range: range of the test durations
+    :param vehicle_spread: the vehicles are released in [0, vehicle_spread]
+    :param vehicle_step: the vehicle releases are multiples of vehicle_step
+    :param inst_id: instance id written in the file
+    :return: instance as a json object
+    """
+    if n_vehicles is None:
+        n_vehicles = max(1, n_tests * 4 // 5)
+    rand = np.random.RandomState(seed)
+
+    # releases
+    centers = np.concatenate([[0], rand.randint(1, horizon + 1, size=max(n_clusters - 1, 0))])
+    clustered = rand.rand(n_tests) < clustering
+    release = np.where(clustered,
+                       centers[rand.randint(0, len(centers), size=n_tests)],
+                       rand.randint(0, horizon + 1, size=n_tests))
+
+    # windows
+    dur = rand.randint(dur_range[0], dur_range[1] + 1, size=n_tests)
+    slack = np.round(rand.uniform(-tightness, 2 * (1 - tightness), size=n_tests) * dur).astype(int)
+    deadline = release + dur + slack
+
+    # rehits, never a test after itself
+    rehit = rand.rand(n_tests, n_tests) < rehit_density
+    np.fill_diagonal(rehit, False)
+
+    vehicle_release = rand.randint(0, vehicle_spread // vehicle_step + 1, size=n_vehicles) * vehicle_step
+
+    # test ids from 1, vehicle ids after the test ids
+    tids = range(1, n_tests + 1)
+    tests = [{"test_id": tid, "release": int(r), "deadline": int(d), "dur": int(p)}
+             for tid, r, d, p in zip(tids, release, deadline, dur)]
+    vehicles = [{"vehicle_id": n_tests + 1 + i, "release": int(r)} for i, r in enumerate(vehicle_release)]
+    rehits = dict((str(tid1), dict((str(tid2), bool(rehit[i, k])) for k, tid2 in enumerate(tids)))
+                  for i, tid1 in enumerate(tids))
+    return {"inst_id": inst_id if inst_id is not None else seed, "tests": tests, "vehicles": vehicles,
+            "rehit": rehits}
+
+
+def write_inst(j, filepath):
+    """
+    Write an instance as a .tp3s file
+    :param j: instance as a json object
+    :param filepath: path of the file
+    :return:
+    """
+    dirname = os.path.dirname(filepath)
+    if dirname and not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    with open(filepath, "w") as f:
+        json.dump(j, f, sort_keys=True, separators=(",", ":"))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Generate a synthetic tp3s instance")
+    parser.add_argument("tests", type=int, help="number of tests")
+    parser.add_argument("out", help="path of the .tp3s file")
+    parser.add_argument("--vehicles", type=int, default=None, help="number of vehicles, 4/5 of the tests if not set")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--horizon", type=int, default=100, help="latest test release")
+    parser.add_argument("--clusters", type=int, default=3, help="number of common release times")
+    parser.add_argument("--clustering", type=float, default=0.8,
+                        help="share of the tests released at a common release time")
+    parser.add_argument("--tightness", type=float, default=0.3, help="time window tightness, in [0, 1]")
+    parser.add_argument("--rehit", type=float, default=0.1, help="rehit density")
+    parser.add_argument("--vehicle-spread", type=int, default=60, help="latest vehicle release")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(sys.argv[1:] if argv is None else argv)
+    j = generate(options.tests, options.vehicles, options.seed, options.horizon, options.clusters,
+                 options.clustering, options.tightness, options.rehit, vehicle_spread=options.vehicle_spread)
+    write_inst(j, options.out)
+    print "{} tests, {} vehicles written to {}".format(len(j["tests"]), len(j["vehicles"]), options.out)
+
+
+if __name__ == '__main__':
+    main()
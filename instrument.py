@@ -0,0 +1,229 @@
+"""
+Instrumentation of the solvers: time and number of calls of each phase, counters,
+sent to pluggable sinks.
+
+    profiler = Profiler([LoggingSink(), JsonSink("profile.json"), CProfileSink(["pricing"])])
+    solver = BPSolver(inst, profiler=profiler)
+    solver.solve()
+    profiler.close()
+
+The solvers use NULL_PROFILER when not given one, its timers do nothing.
+Their progress goes to the "tp3s" logger: every iteration at debug level, every node and the totals at info level,
+nothing unless logging is configured.
+Phases of the column generation and the branch and price:
+master (restricted master lp solve), duals (dual extraction), rescan (pricing of the evicted columns),
+pricing, add_cols (column insertion and eviction),
+node_ip, rounding, diving (primal heuristics, see heuristics.py), int_check (integrality check), branch (branching).
+"""
+import json
+import logging
+import time
+
+logging.getLogger("tp3s").addHandler(logging.NullHandler())
+
+
+class Profiler:
+    """
+    Accumulates the time and the number of calls of each phase and the counters,
+    and notifies the sinks of every phase timed.
+    """
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks) if sinks else []
+        self.enabled = True
+        self.reset()
+
+    def reset(self):
+        # phase to [number of calls, total seconds]
+        self.phases = {}
+        self.counters = {}
+
+    def timer(self, phase):
+        """
+        :param phase: phase name
+        :return: context manager timing the phase
+        """
+        return _Timer(self, phase)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def _start(self, phase):
+        for sink in self.sinks:
+            sink.start(phase)
+
+    def _stop(self, phase, elapsed):
+        stat = self.phases.get(phase)
+        if stat is None:
+            self.phases[phase] = [1, elapsed]
+        else:
+            stat[0] += 1
+            stat[1] += elapsed
+        for sink in self.sinks:
+            sink.stop(phase, elapsed)
+
+    def stats(self):
+        """
+        :return: {"phases": {phase: {"calls", "time"}}, "counters": {name: value}}
+        """
+        return {"phases": dict((phase, {"calls": calls, "time": total})
+                               for phase, (calls, total) in self.phases.iteritems()),
+                "counters": dict(self.counters)}
+
+    def merge(self, stats):
+        """
+        Add the stats of another profiler, e.g. of a worker process
+        :param stats: see stats()
+        :return:
+        """
+        for phase, stat in stats["phases"].iteritems():
+            mine = self.phases.setdefault(phase, [0, 0.0])
+            mine[0] += stat["calls"]
+            mine[1] += stat["time"]
+        for name, n in stats["counters"].iteritems():
+            self.count(name, n)
+
+    def close(self):
+        """
+        Send the totals to the sinks
+        :return:
+        """
+        stats = self.stats()
+        for sink in self.sinks:
+            sink.close(stats)
+
+
+class _Timer:
+    def __init__(self, profiler, phase):
+        self._profiler = profiler
+        self._phase = phase
+
+    def __enter__(self):
+        self._profiler._start(self._phase)
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._profiler._stop(self._phase, time.time() - self._start)
+        return False
+
+
+class NullProfiler:
+    """
+    Disabled profiler, every call is a no-op
+    """
+    enabled = False
+
+    def timer(self, phase):
+        return _NULL_TIMER
+
+    def count(self, name, n=1):
+        pass
+
+    def stats(self):
+        return {"phases": {}, "counters": {}}
+
+    def merge(self, stats):
+        pass
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+NULL_PROFILER = NullProfiler()
+
+
+class Sink:
+    """
+    Receives the phases as they are timed, and the totals when the profiler is closed
+    """
+
+    def start(self, phase):
+        pass
+
+    def stop(self, phase, elapsed):
+        pass
+
+    def close(self, stats):
+        pass
+
+
+class LoggingSink(Sink):
+    """
+    Logs every phase at debug level and the totals at info level
+    """
+
+    def __init__(self, logger=None):
+        self._logger = logger if logger else logging.getLogger("tp3s")
+
+    def stop(self, phase, elapsed):
+        self._logger.debug("%s: %.6fs", phase, elapsed)
+
+    def close(self, stats):
+        for phase, stat in sorted(stats["phases"].iteritems(), key=lambda item: -item[1]["time"]):
+            self._logger.info("%-10s %8d calls %10.3fs", phase, stat["calls"], stat["time"])
+        for name, n in sorted(stats["counters"].iteritems()):
+            self._logger.info("%-20s %d", name, n)
+
+
+class JsonSink(Sink):
+    """
+    Writes the totals to a json file
+    """
+
+    def __init__(self, path):
+        self._path = path
+
+    def close(self, stats):
+        with open(self._path, "w") as f:
+            json.dump(stats, f, indent=2, sort_keys=True)
+
+
+class CProfileSink(Sink):
+    """
+    Runs cProfile during the given phases, all of them if None.
+    The profile is dumped to path if given (for pstats or snakeviz), otherwise the top functions are printed.
+    """
+
+    def __init__(self, phases=None, path=None, n_top=30):
+        import cProfile
+        self._phases = set(phases) if phases is not None else None
+        self._path = path
+        self._n_top = n_top
+        self._profile = cProfile.Profile()
+        # nested phases must not enable the profile twice
+        self._depth = 0
+
+    def _profiled(self, phase):
+        return self._phases is None or phase in self._phases
+
+    def start(self, phase):
+        if self._profiled(phase):
+            if self._depth == 0:
+                self._profile.enable()
+            self._depth += 1
+
+    def stop(self, phase, elapsed):
+        if self._profiled(phase):
+            self._depth -= 1
+            if self._depth == 0:
+                self._profile.disable()
+
+    def close(self, stats):
+        import pstats
+        if self._path:
+            self._profile.dump_stats(self._path)
+        else:
+            pstats.Stats(self._profile).sort_stats("cumulative").print_stats(self._n_top)
@@ -1,11 +1,15 @@
+import logging
+import sys
+
 import tp3s_io
 from colsolver import ColSolver
 
 
 def main():
-    filepath = r"C:\Users\yuhui\Desktop\TP3S\instance\157.tp3s"
-    tests, vehicles, rehits = tp3s_io.read_inst(filepath)
-    solver = ColSolver(tests, vehicles, rehits)
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s")
+    filepath = sys.argv[1] if len(sys.argv) > 1 else r"C:\Users\yuhui\Desktop\TP3S\instance\157.tp3s"
+    inst = tp3s_io.load_inst(filepath)
+    solver = ColSolver(inst)
 
     solver.solve_col_gen()
 
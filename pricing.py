@@ -1,50 +1,213 @@
-import multiprocessing
+import bisect
+import heapq
+import random
 from collections import defaultdict
 
-from gurobipy import *
+try:
+    from gurobipy import *
+except ImportError:
+    # only the MIP pricer needs gurobi
+    pass
 import numpy as np
+from scipy import sparse
 
-import tp3s_io
 from colsolver import Col
+from instrument import NULL_PROFILER
 
 
 class EnumPricer:
-    def __init__(self, all_col_list):
+    """
+    Exact pricer over a pre-enumerated list of columns.
+    The columns are stored as a sparse columns x tests incidence matrix (csr) with a cost vector
+    and a release index vector, the reduced costs of all the columns are one matrix-vector product.
+    The columns violating the branching constraints of the node get an infinite reduced cost.
+    It is exact over all the columns only if given all of them, ColEnumerator.enum(dominance=False):
+    the dominance pruning keeps one order of each set of tests, a branching on the order
+    of two tests can forbid it while allowing a pruned one.
+    """
+    # the most negative reduced cost returned is the minimum over all the columns
+    EXACT = True
+
+    def __init__(self, all_col_list, max_cols=10):
+        """
+        :param all_col_list: columns to price, the enumeration without dominance, see the class doc
+        :param max_cols: maximum number of columns returned
+        """
         self.__col_list__ = all_col_list
+        self._max_cols = max_cols
+        self.__build_matrix__()
+        self._positions = None
+        self._infeasible = None
+
+    def __build_matrix__(self):
+        cols = self.__col_list__
+        self._tids = sorted(set(tid for c in cols for tid in c.seq))
+        self._idx = dict((tid, i) for i, tid in enumerate(self._tids))
+        self._releases = sorted(set(c.release for c in cols))
+        release_idx = dict((r, i) for i, r in enumerate(self._releases))
+
+        indptr = np.zeros(len(cols) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(c.seq) for c in cols])
+        indices = np.fromiter((self._idx[tid] for c in cols for tid in c.seq), dtype=np.int32, count=indptr[-1])
+        self._cover = sparse.csr_matrix((np.ones(len(indices)), indices, indptr), shape=(len(cols), len(self._tids)))
+        self._cost = np.array([50 + c.cost for c in cols], dtype=float)
+        self._release_idx = np.array([release_idx[c.release] for c in cols], dtype=np.int32)
+
+    def __positions__(self):
+        # tests x columns, 1 + position of the test in the column, built on the first branching
+        if self._positions is None:
+            cover = self._cover
+            position = np.arange(len(cover.indices)) - np.repeat(cover.indptr[:-1], np.diff(cover.indptr))
+            self._positions = sparse.csr_matrix((position + 1, cover.indices, cover.indptr),
+                                                shape=cover.shape).T.tocsr()
+        return self._positions
+
+    def set_branch_constrs(self, branch_constr_list):
+        """
+        Mark the columns violating the branching constraints of a node
+        :param branch_constr_list: branching constraints of the node
+        :return:
+        """
+        from bpsolver import BranchConstr
+
+        if not branch_constr_list:
+            self._infeasible = None
+            return
+        positions = self.__positions__()
+        infeasible = np.zeros(len(self.__col_list__), dtype=bool)
+        for constr in branch_constr_list:
+            pos1 = positions[self._idx[constr.tid1]].toarray().ravel()
+            has1 = pos1 > 0
+            if constr.btype == BranchConstr.TYPE_TEST_ONE_VEHICLE:
+                on_vehicle = self._release_idx == self._releases.index(constr.vid) \
+                    if constr.vid in self._releases else np.zeros(len(pos1), dtype=bool)
+                if constr.direction == BranchConstr.FIX_TO_ZERO:
+                    infeasible |= has1 & on_vehicle
+                else:
+                    infeasible |= has1 & ~on_vehicle
+                continue
+
+            pos2 = positions[self._idx[constr.tid2]].toarray().ravel()
+            has2 = pos2 > 0
+            if constr.btype == BranchConstr.TYPE_TEST_PAIR_TOGETHER:
+                if constr.direction == BranchConstr.FIX_TO_ZERO:
+                    infeasible |= has1 & has2
+                else:
+                    infeasible |= has1 != has2
+            elif constr.btype == BranchConstr.TYPE_TEST_PAIR_ORDER_ON_VEHICLE:
+                if constr.direction == BranchConstr.FIX_TO_ZERO:
+                    on_vehicle = self._release_idx == self._releases.index(constr.vid) \
+                        if constr.vid in self._releases else np.zeros(len(pos1), dtype=bool)
+                    infeasible |= has1 & has2 & (pos1 < pos2) & on_vehicle
+                else:
+                    infeasible |= (has1 != has2) | (has1 & has2 & (pos1 > pos2))
+        self._infeasible = infeasible
+
+    def clear_branch_constrs(self):
+        self.set_branch_constrs([])
 
     def price(self, test_dual, vehicle_dual):
-        r_cost = np.array([self.__reduced_cost__(c, test_dual, vehicle_dual)
-                           for c in self.__col_list__])
-        min_r_cost = r_cost.min()
-        min_r_idx = r_cost.argmin()
+        """
+        Compute the reduced costs of all the columns at the given duals
+        :param test_dual: dual value of each test cover constraint
+        :param vehicle_dual: dual value of a vehicle of each release
+        :return: list of negative reduced cost columns (most negative first) or None, most negative reduced cost
+        """
+        duals = np.array([test_dual[tid] for tid in self._tids])
+        release_duals = np.array([vehicle_dual[r] for r in self._releases])
+        r_cost = self._cost - self._cover.dot(duals) - release_duals[self._release_idx]
+        if self._infeasible is not None:
+            r_cost[self._infeasible] = np.inf
+
+        if len(r_cost) > self._max_cols:
+            best_idx = np.argpartition(r_cost, self._max_cols)[:self._max_cols]
+        else:
+            best_idx = np.arange(len(r_cost))
+        best_idx = best_idx[np.argsort(r_cost[best_idx])]
+        min_r_cost = r_cost[best_idx[0]]
         if min_r_cost < -0.001:
-            return self.__col_list__[min_r_idx], min_r_cost
+            return [self.__col_list__[i] for i in best_idx if r_cost[i] < -0.001], min_r_cost
         else:
-            return None, None
-
-    def __reduced_cost__(self, col, test_dual, vehicle_dual):
-        cost = 50 + col.cost
-        for tid in col.seq:
-            cost -= test_dual[tid]
-        cost -= vehicle_dual[col.vid]
-        return cost
+            return None, min_r_cost
 
 
 class MIPPricer:
-    def __init__(self):
+    EXACT = True
+
+    def __init__(self, inst, max_cols=10):
+        self._inst = inst
         self.__solver__ = None
+        self._max_cols = max_cols
+        self._branch_rows = []
 
-    def price(self, test_dual, vehicle_dual):
+    def __get_solver__(self):
         if not self.__solver__:
             self.__solver__ = self.__build_solver()
             self.__solver__.params.outputflag = 0
+            # keep several solutions to return a batch of columns
+            self.__solver__.params.poolsolutions = self._max_cols
+        return self.__solver__
+
+    def set_branch_constrs(self, branch_constr_list):
+        """
+        Add the branching constraints of a node as removable rows of the pricing model
+        :param branch_constr_list: branching constraints of the node
+        :return:
+        """
+        from bpsolver import BranchConstr
+
+        self.clear_branch_constrs()
+        m = self.__get_solver__()
+        for constr in branch_constr_list:
+            if constr.btype == BranchConstr.TYPE_TEST_ONE_VEHICLE:
+                use_test = self._use_test[constr.tid1]
+                use_vehicle = self._use_vehicle[constr.vid]
+                if constr.direction == BranchConstr.FIX_TO_ZERO:
+                    # forbid assign tid to vid
+                    self._branch_rows.append(m.addConstr(use_test <= 1 - use_vehicle))
+                elif constr.direction == BranchConstr.FIX_TO_ONE:
+                    # if the vehicle is used, then test must be included
+                    # if other vehicle is used, then the test must be excluded
+                    self._branch_rows.append(m.addConstr(use_test == use_vehicle))
+            elif constr.btype == BranchConstr.TYPE_TEST_PAIR_TOGETHER:
+                use_test1 = self._use_test[constr.tid1]
+                use_test2 = self._use_test[constr.tid2]
+                if constr.direction == BranchConstr.FIX_TO_ZERO:
+                    # test1 and test2 cannot appear together
+                    self._branch_rows.append(m.addConstr(use_test1 + use_test2 <= 1))
+                elif constr.direction == BranchConstr.FIX_TO_ONE:
+                    self._branch_rows.append(m.addConstr(use_test1 == use_test2))
+            elif constr.btype == BranchConstr.TYPE_TEST_PAIR_ORDER_ON_VEHICLE:
+                use_vehicle = self._use_vehicle[constr.vid]
+                preced = self._preced_test.get((constr.tid1, constr.tid2))
+                if preced is None:
+                    # test2 is never rehit after test1
+                    if constr.direction == BranchConstr.FIX_TO_ONE:
+                        self._branch_rows.append(m.addConstr(use_vehicle <= 0))
+                elif constr.direction == BranchConstr.FIX_TO_ZERO:
+                    # test1 cannot before test2 on vehicle vid
+                    self._branch_rows.append(m.addConstr(preced <= 1 - use_vehicle))
+                elif constr.direction == BranchConstr.FIX_TO_ONE:
+                    self._branch_rows.append(m.addConstr(preced == use_vehicle))
+        m.update()
+
+    def clear_branch_constrs(self):
+        if not self._branch_rows:
+            return
+        for row in self._branch_rows:
+            self.__solver__.remove(row)
+        self._branch_rows = []
+        self.__solver__.update()
+
+    def price(self, test_dual, vehicle_dual):
+        self.__get_solver__()
 
         # modify coeff in obj
-        for tid in tp3s_io.TEST_MAP.keys():
+        for tid in self._inst.tids:
             use_test = self._use_test[tid]
             use_test.obj = -test_dual[tid]
 
-        for vrelease in tp3s_io.VEHICLE_MAP.keys():
+        for vrelease in self._inst.vreleases:
             use_vehicle = self._use_vehicle[vrelease]
             use_vehicle.obj = -vehicle_dual[vrelease]
 
@@ -55,8 +218,8 @@ class MIPPricer:
             # check if negative
             objval = self.__solver__.objval
             if objval < -0.001:
-                col = self._parse_col()
-                return col, objval
+                cols = self._parse_cols()
+                return cols, objval
             else:
                 return None, objval
 
@@ -64,6 +227,7 @@ class MIPPricer:
 
     def __build_solver(self):
         m = Model("mip pricing")
+        inst = self._inst
         # variables
         self._use_test = {}
         self._use_vehicle = {}
@@ -71,216 +235,459 @@ class MIPPricer:
         self._tardiness = {}
         self._test_start = {}
 
-        for tid in tp3s_io.TEST_MAP.keys():
+        for i, tid in enumerate(inst.tids):
             use_test = m.addVar(0, 1, 1, GRB.BINARY, "use test %d" % tid)
             self._use_test[tid] = use_test
             tardiness = m.addVar(0, GRB.INFINITY, 1, GRB.CONTINUOUS, "tardiness of test %d" % tid)
             self._tardiness[tid] = tardiness
-            start_time = m.addVar(0, GRB.INFINITY, 0, GRB.CONTINUOUS, "start time of test %d" % tid)
+            # the start of an unused test stays in the window too, the big-Ms below rely on it
+            start_time = m.addVar(int(inst.earliest_start[i]), int(inst.latest_start[i]), 0, GRB.CONTINUOUS,
+                                  "start time of test %d" % tid)
             self._test_start[tid] = start_time
 
-        for vrelease in tp3s_io.VEHICLE_MAP.keys():
+        for vrelease in inst.vreleases:
             use_vehicle = m.addVar(0, 1, 1, GRB.BINARY, "use vehicle %d" % vrelease)
             self._use_vehicle[vrelease] = use_vehicle
 
-        for tid1 in tp3s_io.TEST_MAP:
-            for tid2 in tp3s_io.TEST_MAP:
-                if tid1 == tid2:
-                    continue
-
-                preced = m.addVar(0, 1, 0, GRB.BINARY, "%d before %d" % (tid1, tid2))
-                self._preced_test[(tid1, tid2)] = preced
+        # order variables only on the arcs of the rehit graph
+        for tid1 in inst.tids:
+            for tid2 in inst.tids:
+                if tid1 != tid2 and inst.can_rehit(tid1, tid2):
+                    preced = m.addVar(0, 1, 0, GRB.BINARY, "%d before %d" % (tid1, tid2))
+                    self._preced_test[(tid1, tid2)] = preced
 
         m.objcon = 50
 
         m.update()
 
-        M = max([t.dur for t in tp3s_io.TEST_MAP.values()]) * 5
-
         # constraints
         # vehicle related constraints
         # use one vehicle
         m.addConstr(quicksum(self._use_vehicle.values()) == 1)
 
         # test related constraints
-        for tid in tp3s_io.TEST_MAP:
-            start_time = self._test_start[tid]
-            tardiness = self._tardiness[tid]
-            use_test = self._use_test[tid]
+        for i, t in enumerate(inst.tests):
+            start_time = self._test_start[t.test_id]
+            tardiness = self._tardiness[t.test_id]
+            use_test = self._use_test[t.test_id]
+
+            # start after the test release and the vehicle release, exactly one vehicle is used:
+            # only the releases after the test release delay the start
+            m.addConstr(start_time >= t.release +
+                        quicksum([self._use_vehicle[vrelease] * (vrelease - t.release)
+                                  for vrelease in inst.vreleases if vrelease > t.release]))
+
+            # tardiness, an unused test ends at the latest its latest start plus its duration
+            late = int(inst.latest_start[i]) + t.dur - t.deadline
+            if late > 0:
+                m.addConstr(start_time + t.dur <= t.deadline + tardiness + late * (1 - use_test))
+            else:
+                m.addConstr(start_time + t.dur <= t.deadline + tardiness)
 
-            t = tp3s_io.TEST_MAP[tid]
-            # test release
-            m.addConstr(start_time >= t.release)
+        # constraints related to pair of tests
+        for i1, t1 in enumerate(inst.tests):
+            use_test1 = self._use_test[t1.test_id]
+            for i2 in range(i1):
+                t2 = inst.tests[i2]
+                use_test2 = self._use_test[t2.test_id]
+                arcs = [(i, j, self._preced_test[inst.tids[i], inst.tids[j]]) for i, j in [(i1, i2), (i2, i1)]
+                        if (inst.tids[i], inst.tids[j]) in self._preced_test]
+                if not arcs:
+                    # never on the same column
+                    m.addConstr(use_test1 + use_test2 <= 1)
+                    continue
 
-            # start after vehicle release
-            m.addConstr(start_time >=
-                        quicksum([self._use_vehicle[vrelease] * vrelease
-                                  for vrelease in tp3s_io.VEHICLE_MAP]))
+                m.addConstr(use_test1 + use_test2 - 1 <= quicksum([preced for _, _, preced in arcs]))
+                m.addConstr(quicksum([preced for _, _, preced in arcs]) <= 0.5 * (use_test1 + use_test2))
 
-            # tardiness
-            m.addConstr(start_time + t.dur <= t.deadline + tardiness + M * (1 - use_test))
-
-        # constraints related to pair of tests
-        test_list_sorted = sorted(tp3s_io.TEST_MAP.values(), key=lambda x: x.test_id)
-        for t1 in test_list_sorted:
-            tid1 = t1.test_id
-            use_test1 = self._use_test[tid1]
-            start_time1 = self._test_start[tid1]
-            for t2 in test_list_sorted:
-                tid2 = t2.test_id
-                if tid1 <= tid2:
-                    break
-
-                use_test2 = self._use_test[tid2]
-                start_time2 = self._test_start[tid2]
-                preced12 = self._preced_test[tid1, tid2]
-                preced21 = self._preced_test[tid2, tid1]
-
-                m.addConstr(use_test1 + use_test2 - 1 <= preced12 + preced21)
-                m.addConstr(preced12 + preced21 <= 0.5 * (use_test1 + use_test2))
-
-                m.addConstr(start_time1 + t1.dur <=
-                            start_time2 + M * (1 - preced12))
-                m.addConstr(start_time2 + t2.dur <=
-                            start_time1 + M * (1 - preced21))
-
-                # rehits
-                if not tp3s_io.REHIT_MAP[tid1][tid2]:
-                    preced12.ub = 0
-
-                if not tp3s_io.REHIT_MAP[tid2][tid1]:
-                    preced21.ub = 0
+                for i, j, preced in arcs:
+                    # i ends before j starts, the big-M covers the time windows of both
+                    big_m = int(inst.latest_start[i] + inst.dur[i] - inst.earliest_start[j])
+                    if big_m > 0:
+                        m.addConstr(self._test_start[inst.tids[i]] + int(inst.dur[i]) <=
+                                    self._test_start[inst.tids[j]] + big_m * (1 - preced))
 
         m.update()
 
         return m
 
+    def _parse_cols(self):
+        """
+        Parse the negative reduced cost solutions in the solution pool into columns
+        :return: distinct columns, most negative first
+        """
+        cols = []
+        seen = set()
+        for i in range(self.__solver__.solcount):
+            self.__solver__.params.solutionnumber = i
+            if self.__solver__.poolobjval >= -0.001:
+                break
+            col = self._parse_col()
+            key = (col.release, tuple(col.seq))
+            if col.seq and key not in seen:
+                seen.add(key)
+                cols.append(col)
+        return cols
+
     def _parse_col(self):
         tests_used = []
-        for tid in tp3s_io.TEST_MAP:
+        for tid in self._inst.tids:
             use_test = self._use_test[tid]
-            if use_test.x > 0.5:
+            if use_test.xn > 0.5:
                 tests_used.append(tid)
 
-        tests_used_sorted = sorted(tests_used, key=lambda t: self._test_start[t].x)
+        tests_used_sorted = sorted(tests_used, key=lambda t: self._test_start[t].xn)
         vehicle_used = 0
-        for vrelease in tp3s_io.VEHICLE_MAP:
+        for vrelease in self._inst.vreleases:
             use_vehicle = self._use_vehicle[vrelease]
-            if use_vehicle.x > 0.5:
+            if use_vehicle.xn > 0.5:
                 vehicle_used = vrelease
                 break
-        col = Col(tests_used_sorted, vehicle_used)
+        col = Col(self._inst, tests_used_sorted, vehicle_used)
         return col
 
 
+class LabelingPricer:
+    """
+    Exact pricer solving the elementary shortest path problem with time windows
+    by labeling. Tests are the nodes, ordered by release, the path cost is the
+    tardiness minus the test duals, and an arc t1 -> t2 is feasible if t2 can be
+    rehit after every test already on the path.
+
+    A label is (completion time, reduced cost, allowed tests, visited tests, release, seq).
+    Label l1 dominates l2 if it ends with the same test, finishes earlier, is cheaper and can still be extended
+    with every test l2 can be extended with.
+
+    A test is only appended to a path up to its latest useful start at the duals, its deadline plus its dual
+    minus its duration: started later, its tardiness exceeds its dual and the path without it is cheaper,
+    the tests after it end no later. The first test of a path and the tests of the branching constraints
+    are always allowed.
+    """
+    EXACT = True
+    # counts the labels created and dominated
+    profiler = NULL_PROFILER
+
+    def __init__(self, inst, branch_constr_list=None, max_cols=10):
+        self._inst = inst
+        self._max_cols = max_cols
+        self.__build_cache__()
+        self.set_branch_constrs(branch_constr_list if branch_constr_list else [])
+
+    def __build_cache__(self):
+        # dense index of tests ordered by release
+        self._tests = sorted(self._inst.tests, key=lambda t: (t.release, t.test_id))
+        self._idx = dict((t.test_id, i) for i, t in enumerate(self._tests))
+        self._releases = list(self._inst.vreleases)
+        # first[r]: tests a path of release r can start with, see Instance.first_releases
+        self._first = dict((r, 0) for r in self._releases)
+        for t in self._tests:
+            for r in self._inst.first_releases[self._inst.idx[t.test_id]]:
+                self._first[r] |= 1 << self._idx[t.test_id]
+
+        # compat[i]: tests that can be rehit after test i
+        self._base_compat = []
+        for t1 in self._tests:
+            mask = 0
+            for j, t2 in enumerate(self._tests):
+                if self._inst.can_rehit(t1.test_id, t2.test_id):
+                    mask |= 1 << j
+            self._base_compat.append(mask)
+        self._all_tests = (1 << len(self._tests)) - 1
+
+    def set_branch_constrs(self, branch_constr_list):
+        """
+        Translate the branching constraints of a node into masks on top of the rehit compatibility.
+        Only the releases touched by a branching constraint get their own copy of the masks.
+        :param branch_constr_list: branching constraints of the node
+        :return:
+        """
+        from bpsolver import BranchConstr
+
+        self._branch_constr_list = branch_constr_list[:]
+        self._compat = dict((r, self._base_compat) for r in self._releases)
+        self._init_allowed = dict((r, self._all_tests) for r in self._releases)
+        self._together = []  # pairs of tests to be used both or none
+        self._branch_tests = 0  # tests whose presence affects feasibility of the path
+        for constr in self._branch_constr_list:
+            i1 = self._idx[constr.tid1]
+            i2 = self._idx[constr.tid2] if constr.tid2 is not None else None
+            if constr.btype == BranchConstr.TYPE_TEST_ONE_VEHICLE:
+                for r in self._releases:
+                    if (r == constr.vid) == (constr.direction == BranchConstr.FIX_TO_ZERO):
+                        self._init_allowed[r] &= ~(1 << i1)
+            elif constr.btype == BranchConstr.TYPE_TEST_PAIR_TOGETHER:
+                if constr.direction == BranchConstr.FIX_TO_ZERO:
+                    for r in self._releases:
+                        self.__forbid__(r, i1, i2)
+                        self.__forbid__(r, i2, i1)
+                else:
+                    self._together.append((i1, i2))
+                    self._branch_tests |= (1 << i1) | (1 << i2)
+            elif constr.btype == BranchConstr.TYPE_TEST_PAIR_ORDER_ON_VEHICLE:
+                if constr.direction == BranchConstr.FIX_TO_ZERO:
+                    # test1 cannot before test2 on vehicle vid
+                    if constr.vid in self._compat:
+                        self.__forbid__(constr.vid, i1, i2)
+                else:
+                    # both or none, and test2 never before test1
+                    for r in self._releases:
+                        self.__forbid__(r, i2, i1)
+                    self._together.append((i1, i2))
+                    self._branch_tests |= (1 << i1) | (1 << i2)
+
+    def clear_branch_constrs(self):
+        self.set_branch_constrs([])
+
+    def __forbid__(self, vrelease, i1, i2):
+        # forbid test i2 after test i1 on the vehicle release, copy on write
+        if self._compat[vrelease] is self._base_compat:
+            self._compat[vrelease] = self._base_compat[:]
+        self._compat[vrelease][i1] &= ~(1 << i2)
+
+    def price(self, test_dual, vehicle_dual):
+        """
+        Run the labeling algorithm at the given duals
+        :param test_dual: dual value of each test cover constraint
+        :param vehicle_dual: dual value of a vehicle of each release
+        :return: list of negative reduced cost columns (most negative first) or None, most negative reduced cost
+        """
+        duals = [test_dual[t.test_id] for t in self._tests]
+        branched = len(self._branch_constr_list) > 0
+        useless_after = self.__useless_after__(duals)
+
+        # non-dominated labels, bucketed by the state that must match for dominance
+        buckets = defaultdict(list)
+        heap = []
+        for r in self._releases:
+            # the allowed tests of the empty path are the first tests of the release
+            label = (r, 50 - vehicle_dual[r], self._init_allowed[r] & self._first[r], 0, r, ())
+            heapq.heappush(heap, label)
+
+        neg_labels = []
+        min_rc = None
+        n_labels = len(heap)
+        n_dominated = 0
+        while heap:
+            label = heapq.heappop(heap)
+            time, rc, allowed, visited, r, seq = label
+
+            # dominance is only checked among the labels ending with the same test: their allowed tests
+            # are rehit compatible with it, so they are the ones likely to dominate, and a bucket stays small
+            last = seq[-1] if seq else None
+            key = (last, r, visited & self._branch_tests) if branched else last
+            if self.__is_dominated__(label, buckets[key]):
+                n_dominated += 1
+                continue
+            buckets[key].append(label)
+
+            if seq and self.__is_complete__(visited):
+                if min_rc is None or rc < min_rc:
+                    min_rc = rc
+                if rc < -0.001:
+                    neg_labels.append(label)
+
+            compat = self._compat[r]
+            # tests allowed after the next one
+            after = allowed if seq else self._init_allowed[r]
+            j = 0
+            while allowed >> j:
+                if (allowed >> j) & 1:
+                    t = self._tests[j]
+                    finish = max(time, t.release) + t.dur
+                    new_rc = rc + max(finish - t.deadline, 0) - duals[j]
+                    new_label = (finish, new_rc, after & compat[j] & ~(1 << j) & ~useless_after(finish),
+                                 visited | (1 << j), r, seq + (j,))
+                    heapq.heappush(heap, new_label)
+                    n_labels += 1
+                j += 1
+
+        self.profiler.count("labels", n_labels)
+        self.profiler.count("dominated labels", n_dominated)
+        if not neg_labels:
+            return None, min_rc
+
+        neg_labels.sort(key=lambda l: l[1])
+        cols = [Col(self._inst, [self._tests[j].test_id for j in l[-1]], l[-2]) for l in neg_labels[:self._max_cols]]
+        return cols, neg_labels[0][1]
+
+    def __useless_after__(self, duals):
+        """
+        :param duals: test duals by index
+        :return: function of a completion time to the mask of the tests not worth appending after it
+        """
+        # tests by latest useful start, and the masks of the first ones in that order
+        latest = sorted((t.deadline + duals[j] - t.dur, j) for j, t in enumerate(self._tests)
+                        if not (self._branch_tests >> j) & 1)
+        starts = [start for start, _ in latest]
+        masks = [0]
+        never = 0
+        for start, j in latest:
+            masks.append(masks[-1] | (1 << j))
+            if start < self._tests[j].release - 1e-6:
+                never |= 1 << j
+
+        def useless_after(time):
+            return never | masks[bisect.bisect_left(starts, time - 1e-6)]
+
+        return useless_after
+
+    def __is_complete__(self, visited):
+        for i1, i2 in self._together:
+            if ((visited >> i1) & 1) != ((visited >> i2) & 1):
+                return False
+        return True
+
+    @staticmethod
+    def __is_dominated__(label, bucket):
+        time, rc, allowed = label[:3]
+        for other in bucket:
+            if other[0] <= time and other[1] <= rc + 1e-9 and allowed & ~other[2] == 0:
+                return True
+        return False
+
+
 class HeuristicPricer:
-    def __init__(self, tests, vehicles, rehits):
-        self.__tests__ = tests
-        self.__vehicles__ = vehicles
-        self.__rehits__ = rehits
+    """
+    Greedy pricer: on every vehicle release, a sequence is built by adding one test at a time.
+    The tests are bucketed by release, at each step the buckets are scanned by increasing release
+    and a test with a negative reduced cost increment is taken from the first bucket that has one.
+    The sequence carries its completion time, cost and the mask of the tests that can still be added.
+
+    Greedy mode (grasp = 0) takes the most negative increment of the bucket.
+    GRASP mode (grasp > 0) draws the test among the negative increments within grasp * |best| of the best one,
+    and builds n_starts sequences per release, for many different columns per call.
+    """
+    EXACT = False
+
+    def __init__(self, inst, max_cols=10, grasp=0.0, n_starts=1, seed=0):
+        """
+        :param inst: instance
+        :param max_cols: maximum number of columns returned by a call
+        :param grasp: width of the restricted candidate list relative to the best increment, 0 for the pure greedy
+        :param n_starts: sequences built per release in GRASP mode
+        :param seed: random seed of the GRASP mode
+        """
+        self._inst = inst
+        self._max_cols = max_cols
+        self._grasp = grasp
+        self._n_starts = n_starts if grasp > 0 else 1
+        self._rand = random.Random(seed)
         self.__build_cache__()
         self._exact_pricer = None
 
     def __build_cache__(self):
-        self.__test_map__ = {}
-        self.__vehicle_map__ = {}
-        for t in self.__tests__:
-            self.__test_map__[t.test_id] = t
-        for v in self.__vehicles__:
-            self.__vehicle_map__[v.vehicle_id] = v
-
-    def __select_best__(self, vid, seq, test_duals):
-        curr_time = self.__vehicle_map__[vid].release
-        for tid in seq:
-            t = self.__test_map__[tid]
-            if curr_time < t.release:
-                curr_time = t.release
-            curr_time += t.dur
-
-        # partition the tests according to release time
-
-        release_test_group = defaultdict(list)
-        for t in self.__test_map__.values():
-            release_test_group[t.release].append(t.test_id)
-
-        for r in sorted(release_test_group.keys()):
-            test_id_list = release_test_group[r]
-
-            # compute the reduced cost increment for evey tests
-            # test_id_list = sorted(self.__test_map__.keys(), key=lambda tid: self.__test_map__[tid].release)
-            incr = [(tid, curr_time + max(self.__test_map__[tid].dur -
-                                          self.__test_map__[tid].deadline, 0) - test_duals[tid])
-                    for tid in test_id_list if self.__is_seq_comp_with_test__(seq, tid)]
-            if len(incr) == 0:
+        inst = self._inst
+        self._release = inst.release.tolist()
+        self._deadline = inst.deadline.tolist()
+        self._dur = inst.dur.tolist()
+        # masks of the test indices released at each release, by increasing release
+        buckets = defaultdict(int)
+        for i, r in enumerate(self._release):
+            buckets[r] |= 1 << i
+        self._buckets = [buckets[r] for r in sorted(buckets)]
+        self._all_tests = (1 << inst.n_tests) - 1
+
+    def __select_best__(self, curr_time, allowed, duals):
+        """
+        :param curr_time: completion time of the sequence
+        :param allowed: mask of the tests that can be added
+        :param duals: test duals by test index
+        :return: index of the test to add, None if no test has a negative reduced cost increment
+        """
+        for bucket in self._buckets:
+            cand = bucket & allowed
+            incr = []
+            while cand:
+                bit = cand & -cand
+                cand ^= bit
+                j = bit.bit_length() - 1
+                finish = max(curr_time, self._release[j]) + self._dur[j]
+                rc_incr = max(finish - self._deadline[j], 0) - duals[j]
+                if rc_incr < 0:
+                    incr.append((rc_incr, j))
+            if not incr:
                 continue
-            rc_incr = np.array(map(lambda x: x[-1], incr))
-            # need to conquer the initiative to select later released tests
-            min_rc_incr, min_idx = rc_incr.min(), rc_incr.argmin()
-            if min_rc_incr < 0:
-                return incr[min_idx][0]
+            best_incr, best = min(incr)
+            if self._grasp <= 0:
+                return best
+            # restricted candidate list
+            threshold = best_incr * (1 - self._grasp)
+            return self._rand.choice([j for rc_incr, j in incr if rc_incr <= threshold])
         return None
 
     def price(self, test_dual, vehicle_dual):
-        best_seq_on_each_vehicle = [(vid, self.__price_one_vehicle__(vid, test_dual, vehicle_dual))
-                                    for vid in self.__vehicle_map__.keys()]
-        # generate reduced cost
-        best_col_on_each_vehicle = [Col(seq, vid) for vid, seq in best_seq_on_each_vehicle]
-        reduced_cost = [self.__reduced_cost__(col, test_dual, vehicle_dual) for col in best_col_on_each_vehicle]
-        reduced_cost = np.array(reduced_cost)
-        if reduced_cost.min() < 0:
-            return best_col_on_each_vehicle[reduced_cost.argmin()], reduced_cost.min()
-        return None, reduced_cost.min()
-
-
-
+        duals = [test_dual[tid] for tid in self._inst.tids]
+        # restart the greedy on every vehicle release
+        cols = [self.__extend_seq__(vrelease, [], duals)
+                for vrelease in self._inst.vreleases for _ in range(self._n_starts)]
+        return self.__select_neg_cols__([col for col in cols if col.seq], test_dual, vehicle_dual)
 
     def price2(self, test_dual, vehicle_dual, seed_col_set):
-        seq_set = [(col.vid, col.seq, test_dual) for col in seed_col_set]
-        pool = multiprocessing.Pool(multiprocessing.cpu_count())
-        # longest_seq = pool.map(HeuristicPricer._extend_seq_wrapper, seq_set)
-        longest_seq = [(s[0], self.__extend_seq__(s[0], s[1], test_dual)) for s in seq_set]
-
-        best_col = [Col(s[1], s[0]) for s in longest_seq]
-        rc = [self.__reduced_cost__(col, test_dual, vehicle_dual) for col in best_col]
-        rc = np.array(rc)
-        if rc.min() < -0.001:
-            return best_col[rc.argmin()], rc.min()
+        duals = [test_dual[tid] for tid in self._inst.tids]
+        best_col = [self.__extend_seq__(col.release, col.seq, duals) for col in seed_col_set]
+        neg_cols, rc = self.__select_neg_cols__(best_col, test_dual, vehicle_dual)
+        if neg_cols:
+            return neg_cols, rc
 
         # mip pricer
         if not self._exact_pricer:
-            self._exact_pricer = MIPPricer(self.__tests__, self.__vehicles__, self.__rehits__)
-        neg_col, rc = self._exact_pricer.price(test_dual, vehicle_dual)
-        return neg_col, rc
-
-    def __extend_seq__(self, vid, seq, test_dual):
-        result = seq[:]
-        while True:
-            tid = self.__select_best__(vid, result, test_dual)
-            if not tid:
+            self._exact_pricer = MIPPricer(self._inst, self._max_cols)
+        return self._exact_pricer.price(test_dual, vehicle_dual)
+
+    def __select_neg_cols__(self, cols, test_dual, vehicle_dual):
+        """
+        Select the distinct columns with the most negative reduced costs
+        :return: list of columns (most negative first) or None, most negative reduced cost
+        """
+        if not cols:
+            return None, None
+        reduced_cost = np.array([self.__reduced_cost__(col, test_dual, vehicle_dual) for col in cols])
+        neg_cols = []
+        seen = set()
+        for i in reduced_cost.argsort():
+            key = (cols[i].release, tuple(cols[i].seq))
+            if reduced_cost[i] >= -0.001 or len(neg_cols) >= self._max_cols:
                 break
-            result.append(tid)
-        return result
+            if key not in seen:
+                seen.add(key)
+                neg_cols.append(cols[i])
+        if neg_cols:
+            return neg_cols, reduced_cost.min()
+        return None, reduced_cost.min()
 
-    def __price_one_vehicle__(self, vid, test_dual, vehicle_dual):
-        seq = []
+    def __extend_seq__(self, vrelease, seq, duals):
+        """
+        Extend a sequence greedily
+        :param vrelease: release of the vehicle
+        :param seq: test ids of the sequence to extend
+        :param duals: test duals by test index
+        :return: column of the extended sequence
+        """
+        inst = self._inst
+        curr_time = vrelease
+        cost = 0
+        allowed = self._all_tests
+        result = []
+        for tid in seq:
+            j = inst.idx[tid]
+            curr_time = max(curr_time, self._release[j]) + self._dur[j]
+            cost += max(curr_time - self._deadline[j], 0)
+            allowed &= inst.succ_masks[j]
+            result.append(tid)
         while True:
-            tid = self.__select_best__(vid, seq, test_dual)
-            if not tid:
+            # an empty sequence starts with a first test of the release, see Instance.first_releases
+            j = self.__select_best__(curr_time, allowed if result else allowed & inst.first_masks[vrelease], duals)
+            if j is None:
                 break
-            seq.append(tid)
-        return seq
-
-    def __is_seq_comp_with_test__(self, seq, test):
-        if test in seq:
-            return False
-        for tid in seq:
-            if not self.__rehits__[tid][test]:
-                return False
-        return True
+            curr_time = max(curr_time, self._release[j]) + self._dur[j]
+            cost += max(curr_time - self._deadline[j], 0)
+            allowed &= inst.succ_masks[j]
+            result.append(inst.tids[j])
+        return Col(inst, result, vrelease, cost)
 
     def __reduced_cost__(self, col, test_dual, vehicle_dual):
         cost = 50 + col.cost
         for tid in col.seq:
             cost -= test_dual[tid]
-        cost -= vehicle_dual[col.vid]
+        cost -= vehicle_dual[col.release]
         return cost
@@ -0,0 +1,101 @@
+"""
+Dual stabilization of the column generation.
+Duals are given as in the pricers: test id to dual of the cover constraint,
+vehicle release to dual value of a vehicle of the release (see colsolver.vehicle_duals).
+"""
+import logging
+
+logger = logging.getLogger("tp3s")
+
+
+def lagrangian_bound(inst, test_dual, vehicle_dual, rc):
+    """
+    Lower bound of the master lp at any duals of the right sign (test duals >= 0, vehicle duals <= 0)
+    from the most negative reduced cost at these duals.
+    Lagrangian: at most one column per vehicle, dual objective + n_vehicles * rc.
+    Farley: every column costs at least 50, so scaling the duals by 1 - rc / 50 makes them feasible,
+    dual objective / (1 - rc / 50).
+    :param inst: instance
+    :param test_dual: dual value of each test cover constraint
+    :param vehicle_dual: dual value of a vehicle of each release
+    :param rc: most negative reduced cost over all the columns, None if none is negative
+    :return: the best of both bounds
+    """
+    dual_objval = sum(test_dual.values())
+    for vrelease, n_vehicles in inst.vehicle_count.iteritems():
+        dual_objval += vehicle_dual[vrelease] * n_vehicles
+    rc = min(rc, 0) if rc is not None else 0
+    return max(dual_objval + inst.n_vehicles * rc, dual_objval / (1 - rc / 50.0))
+
+
+def reduced_cost(col, test_dual, vehicle_dual):
+    return 50 + col.cost - sum([test_dual[tid] for tid in col.seq]) - vehicle_dual[col.release]
+
+
+class WentgesSmoother:
+    """
+    Wentges smoothing: price at a convex combination of the stability center and the master duals,
+    alpha * center + (1 - alpha) * duals. The center is the priced duals with the best lagrangian bound so far.
+    The columns found are kept if they have a negative reduced cost at the master duals,
+    otherwise it is a mispricing and the master duals are priced instead.
+    """
+
+    def __init__(self, inst, alpha=0.5):
+        self._inst = inst
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the stability center, when moving to another master problem
+        :return:
+        """
+        self._center = None
+        self.center_bound = -float("inf")
+        # telemetry: pricings at smoothed duals that found columns, mispricings, pricings at the master duals
+        self.n_smoothed = 0
+        self.n_mispricings = 0
+        self.n_exact = 0
+
+    def price(self, pricer, test_dual, vehicle_dual):
+        """
+        Price at the smoothed duals, fall back to the master duals on a mispricing
+        :param pricer: pricer
+        :param test_dual: master dual value of each test cover constraint
+        :param vehicle_dual: master dual value of a vehicle of each release
+        :return: list of columns with negative reduced cost at the master duals or None,
+                 most negative reduced cost at the master duals among them
+        """
+        if self._center is not None and self.alpha > 0:
+            center_test, center_vehicle = self._center
+            smooth_test = dict((tid, self.alpha * center_test[tid] + (1 - self.alpha) * dual)
+                               for tid, dual in test_dual.iteritems())
+            smooth_vehicle = dict((vrelease, self.alpha * center_vehicle[vrelease] + (1 - self.alpha) * dual)
+                                  for vrelease, dual in vehicle_dual.iteritems())
+            cols, rc = pricer.price(smooth_test, smooth_vehicle)
+            self._update_center(pricer, smooth_test, smooth_vehicle, rc)
+
+            r_costs = [(reduced_cost(col, test_dual, vehicle_dual), col) for col in cols or []]
+            r_costs = [(r_cost, col) for r_cost, col in r_costs if r_cost < -0.001]
+            if r_costs:
+                r_costs.sort(key=lambda x: x[0])
+                self.n_smoothed += 1
+                logger.debug("smoothed pricing, %d cols, center bound %s", len(r_costs), self.center_bound)
+                return [col for _, col in r_costs], r_costs[0][0]
+            self.n_mispricings += 1
+            logger.debug("mispricing, center bound %s", self.center_bound)
+
+        self.n_exact += 1
+        cols, rc = pricer.price(test_dual, vehicle_dual)
+        self._update_center(pricer, test_dual, vehicle_dual, rc)
+        return cols, rc
+
+    def _update_center(self, pricer, test_dual, vehicle_dual, rc):
+        if not pricer.EXACT:
+            # no bound without the exact reduced cost, follow the duals
+            self._center = (test_dual, vehicle_dual)
+            return
+        bound = lagrangian_bound(self._inst, test_dual, vehicle_dual, rc)
+        if bound > self.center_bound:
+            self._center = (test_dual, vehicle_dual)
+            self.center_bound = bound
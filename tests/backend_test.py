@@ -0,0 +1,68 @@
+import unittest
+
+from backend import create_backend, GUROBI, GLPK, GREATER_EQUAL, LESS_EQUAL
+
+
+class BackendTestCase(unittest.TestCase):
+    def _small_lp(self, backend):
+        m = create_backend(backend)
+        r0 = m.add_row(GREATER_EQUAL, 1)
+        r1 = m.add_row(GREATER_EQUAL, 1)
+        r2 = m.add_row(LESS_EQUAL, 2)
+        m.update()
+        m.add_col(3, 0, float("inf"), [r0, r2], [1, 1])
+        m.add_col(3, 0, float("inf"), [r1, r2], [1, 1])
+        m.add_col(5, 0, float("inf"), [r0, r1, r2], [1, 1, 1])
+        m.update()
+        return m
+
+    def _check_backend(self, backend):
+        m = self._small_lp(backend)
+        m.optimize()
+        self.assertTrue(m.is_optimal())
+        self.assertAlmostEqual(m.objval(), 5)
+        self.assertAlmostEqual(sum(m.duals()[:2]), 5)
+
+        # fix the cheapest column to zero and warm start from the basis
+        vbasis, cbasis = m.get_basis()
+        child = m.copy()
+        child.set_bounds(2, 0, 0)
+        child.set_basis(vbasis, cbasis)
+        child.set_dual_simplex(True)
+        child.optimize()
+        self.assertAlmostEqual(child.objval(), 6)
+        child.set_obj(0, 1)
+        child.update()
+        child.optimize()
+        self.assertAlmostEqual(child.objval(), 4)
+        self.assertAlmostEqual(m.objval(), 5)
+
+        # the basic column has a zero reduced cost, remove the others
+        self.assertAlmostEqual(m.reduced_costs()[2], 0)
+        m.remove_cols([0, 1])
+        m.update()
+        self.assertEqual(m.num_cols(), 1)
+        self.assertEqual(m.add_col(1, 0, float("inf"), [0, 1, 2], [1, 1, 1]), 1)
+        m.update()
+        m.optimize()
+        self.assertAlmostEqual(m.objval(), 1)
+        self.assertAlmostEqual(m.values()[1], 1)
+
+        # no numbers from an infeasible lp
+        m.set_bounds(0, 0, 0)
+        m.set_bounds(1, 0, 0)
+        m.optimize()
+        self.assertFalse(m.is_optimal())
+        self.assertRaises(Exception, m.objval)
+        self.assertRaises(Exception, m.values)
+        self.assertRaises(Exception, m.duals)
+
+    def testgurobi(self):
+        self._check_backend(GUROBI)
+
+    def testglpk(self):
+        self._check_backend(GLPK)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import instgen
+from batch import find_instances, read_done, ResultWriter, FIELDS, parse_args, _solve
+
+datadir = r"../data"
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testfindinstances(self):
+        paths = find_instances([datadir])
+        self.assertIn(os.path.join(datadir, "158.tp3s"), paths)
+        self.assertEqual(find_instances([datadir, os.path.join(datadir, "158*.tp3s")]), paths)
+
+    def testresume(self):
+        for ext in [".jsonl", ".csv"]:
+            out_path = os.path.join(self.tmpdir, "results" + ext)
+            self.assertEqual(read_done(out_path), set())
+            writer = ResultWriter(out_path)
+            record = dict((field, None) for field in FIELDS)
+            record.update(instance="156.tp3s", status="ok", objective=3305.0)
+            writer.write(record)
+            writer.close()
+            # a second run appends without repeating the header
+            writer = ResultWriter(out_path)
+            record.update(instance="157.tp3s", status="timeout")
+            writer.write(record)
+            writer.close()
+            # the instances that did not finish are solved again
+            self.assertEqual(read_done(out_path), {"156.tp3s"})
+            writer = ResultWriter(out_path)
+            record.update(instance="157.tp3s", status="ok")
+            writer.write(record)
+            writer.close()
+            self.assertEqual(read_done(out_path), {"156.tp3s", "157.tp3s"})
+
+        # a line cut by a crash is not an instance done
+        with open(out_path.replace(".csv", ".jsonl"), "a") as f:
+            f.write(json.dumps({"instance": "158.tp3s", "status": "ok"})[:10])
+        self.assertEqual(read_done(out_path.replace(".csv", ".jsonl")), {"156.tp3s", "157.tp3s"})
+
+    def testtimelimit(self):
+        # the root of this instance leaves a gap, a search stopped there is solved again on resume
+        path = os.path.join(self.tmpdir, "30.tp3s")
+        instgen.write_inst(instgen.generate(30, seed=0), path)
+        self.assertEqual(_solve(path, parse_args([path, "--backend", "glpk"]))["status"], "ok")
+        record = _solve(path, parse_args([path, "--backend", "glpk", "--time-limit", "0"]))
+        self.assertEqual(record["status"], "limit")
+        self.assertGreater(record["objective"], record["bound"])
+
+
+if __name__ == '__main__':
+    unittest.main()
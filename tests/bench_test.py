@@ -0,0 +1,36 @@
+import unittest
+
+import tp3s_io
+from bench import tile_instance, compare
+
+filepath = r"../data/158.tp3s"
+
+
+class BenchTestCase(unittest.TestCase):
+    def testtileinstance(self):
+        inst = tp3s_io.load_inst(filepath)
+        tiled = tile_instance(inst, 3)
+        self.assertEqual(tiled.n_tests, 3 * inst.n_tests)
+        self.assertEqual(tiled.n_vehicles, 3 * inst.n_vehicles)
+        self.assertEqual(len(set(tiled.tids)), tiled.n_tests)
+        offset = max(inst.tids) + 1
+        for tid1 in inst.tids[:10]:
+            for tid2 in inst.tids[:10]:
+                if tid1 != tid2:
+                    self.assertEqual(tiled.can_rehit(tid1, tid2 + 2 * offset), inst.can_rehit(tid1, tid2))
+        self.assertIs(tile_instance(inst, 1), inst)
+
+    def testcompare(self):
+        baseline = {"cases": {"a": {"time": 10.0, "nodes": 100, "objective": 5.0},
+                              "b": {"time": 0.1, "nodes": 1, "objective": 1.0}}}
+        report = {"cases": {"a": {"time": 11.0, "nodes": 150, "objective": 5.0},
+                            "b": {"time": 0.3, "nodes": 1, "objective": 2.0}}}
+        regressions = compare(report, baseline)
+        # slower within the tolerance, or by less than the noise
+        self.assertEqual(sorted((name, metric) for name, metric, _, _ in regressions),
+                         [("a", "nodes"), ("b", "objective")])
+        self.assertEqual(compare(baseline, baseline), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,127 @@
 import unittest
 
+import instgen
 import tp3s_io
-from bpsolver import BPSolver
+from backend import GLPK
+from bpsolver import BPSolver, ColIncidence
+from colsolver import ColEnumerator, ColPool
+from heuristics import LPRounding
+from pricing import EnumPricer, HeuristicPricer
 
-filepath = r"..\data\158.tp3s"
+filepath = r"../data/158.tp3s"
 
 
 class BPSolverTestCase(unittest.TestCase):
     def test_bpsolver_initialization(self):
-        tests, vehicles, rehits = tp3s_io.read_inst(filepath)
-        print rehits
+        inst = tp3s_io.load_inst(filepath)
 
-        solver = BPSolver()
+        solver = BPSolver(inst)
         solver.solve()
 
+    def test_inexact_pricer(self):
+        inst = tp3s_io.load_inst(filepath)
+        with self.assertRaises(ValueError):
+            BPSolver(inst, HeuristicPricer(inst))
+
+    def test_col_incidence(self):
+        inst = tp3s_io.load_inst(filepath)
+        pool = ColPool()
+        for col in ColEnumerator(inst).enum(2):
+            pool.add(col)
+        incidence = ColIncidence(inst, pool)
+        incidence.sync()
+
+        self.assertEqual(incidence.cover.shape[1], len(pool))
+        n_tests = incidence.cover.sum(axis=0).A1
+        for cid in range(len(pool)):
+            self.assertEqual(n_tests[cid], len(pool[cid].seq))
+        n_pairs = sum([len(pool[cid].seq) * (len(pool[cid].seq) - 1) / 2 for cid in range(len(pool))])
+        self.assertEqual(incidence.before.nnz, n_pairs)
+
+    def test_node_selection(self):
+        class PendingNode:
+            def __init__(self, depth):
+                self.depth = depth
+                self.solved = False
+
+        nodes = [PendingNode(1), PendingNode(2), PendingNode(2)]
+
+        inst = tp3s_io.load_inst(filepath)
+        solver = BPSolver(inst, node_select=BPSolver.BEST_BOUND)
+        solver.best_inc_val = 10
+        solver.add_node(8, nodes[0])
+        solver.add_node(12, nodes[1])  # pruned by the incumbent
+        solver.add_node(5, nodes[2])
+        self.assertEqual(solver.lower_bound(), 5)
+        self.assertIs(solver._next_node(), nodes[2])
+        self.assertIs(solver._next_node(), nodes[0])
+        self.assertIsNone(solver._next_node())
+
+        solver = BPSolver(inst, node_select=BPSolver.DEPTH_FIRST)
+        for lpbound, node in zip([8, 7, 5], nodes):
+            solver.add_node(lpbound, node)
+        self.assertIs(solver._next_node(), nodes[2])
+        self.assertIs(solver._next_node(), nodes[1])
+
+    def test_parallel_search(self):
+        inst = tp3s_io.load_inst(filepath)
+        serial = BPSolver(inst, node_select=BPSolver.BEST_BOUND)
+        serial.solve()
+        parallel = BPSolver(inst, node_select=BPSolver.BEST_BOUND, n_workers=2)
+        parallel.solve()
+        self.assertAlmostEqual(parallel.best_inc_val, serial.best_inc_val)
+
+    def test_column_eviction(self):
+        # branches a few times
+        inst = tp3s_io.parse_inst(instgen.generate(30, seed=2))
+        serial = BPSolver(inst, node_select=BPSolver.BEST_BOUND)
+        serial.solve()
+        evicting = BPSolver(inst, node_select=BPSolver.BEST_BOUND, col_max_age=1, col_evict_rc=0.0)
+        evicting.solve()
+        self.assertAlmostEqual(evicting.best_inc_val, serial.best_inc_val)
+        pool = evicting.col_pool
+        self.assertEqual(len(set([pool[cid] for cid in range(len(pool))])), len(pool))
+
+    def test_glpk_backend(self):
+        inst = tp3s_io.parse_inst(instgen.generate(30, seed=2))
+        solver = BPSolver(inst, backend=GLPK, node_select=BPSolver.BEST_BOUND)
+        solver.solve()
+        self.assertIsNotNone(solver.inc_sol)
+        self.assertAlmostEqual(solver.gap(), 0)
+
+    def test_parallel_custom_pricer(self):
+        inst = tp3s_io.parse_inst(instgen.generate(30, seed=2))
+        cols = ColEnumerator(inst).enum()
+        serial = BPSolver(inst, EnumPricer(cols), backend=GLPK, node_select=BPSolver.BEST_BOUND)
+        serial.solve()
+        parallel = BPSolver(inst, EnumPricer(cols), backend=GLPK, node_select=BPSolver.BEST_BOUND, n_workers=2)
+        parallel.solve()
+        self.assertAlmostEqual(parallel.best_inc_val, serial.best_inc_val)
+        self.assertAlmostEqual(parallel.gap(), 0)
+
+    def test_tailing_off(self):
+        # an integral master stopped on tailing off is not optimal for its node
+        inst = tp3s_io.parse_inst(instgen.generate(30, seed=1))
+        exact = BPSolver(inst, backend=GLPK, node_select=BPSolver.BEST_BOUND, heuristics=[LPRounding()])
+        exact.solve()
+        early = BPSolver(inst, backend=GLPK, node_select=BPSolver.BEST_BOUND, heuristics=[LPRounding()],
+                         cg_gap_tol=0.3)
+        early.solve()
+        self.assertAlmostEqual(early.best_inc_val, exact.best_inc_val)
+        self.assertAlmostEqual(early.gap(), 0)
+
+    def test_few_vehicles(self):
+        # the root master needs more than the pairs to cover the tests
+        inst = tp3s_io.parse_inst(instgen.generate(14, n_vehicles=4, seed=1, rehit_density=0.5))
+        solver = BPSolver(inst, backend=GLPK, node_select=BPSolver.BEST_BOUND)
+        solver.solve()
+        self.assertAlmostEqual(solver.best_inc_val, 439)
+        self.assertAlmostEqual(solver.gap(), 0)
+        covered = set()
+        for col, val in solver.inc_sol.iteritems():
+            if val > 0.5:
+                covered.update(col.seq)
+        self.assertEqual(covered, set(inst.tids))
 
 
 if __name__ == '__main__':
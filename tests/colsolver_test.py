@@ -1,6 +1,9 @@
 import unittest
+
+import instgen
 import tp3s_io
-from colsolver import ColSolver, ColEnumerator
+from backend import GLPK
+from colsolver import ColSolver, ColEnumerator, ColPool, Col, MasterCols
 
 filepath = r"../data/158 - Copy.tp3s"
 
@@ -8,31 +11,107 @@ filepath = r"../data/158 - Copy.tp3s"
 class ColSolverTestCase(unittest.TestCase):
     def testcache(self):
         tests, vehicles, rehits = tp3s_io.read_inst(filepath)
+        inst = tp3s_io.load_inst(filepath)
 
-        self.assertSequenceEqual(sorted(tp3s_io.TEST_MAP.keys()),
+        self.assertSequenceEqual(inst.tids,
                                  sorted([t.test_id for t in tests]))
 
     def testcachevehicle(self):
         tests, vehicles, rehits = tp3s_io.read_inst(filepath)
+        inst = tp3s_io.load_inst(filepath)
 
-        self.assertSequenceEqual(sorted(tp3s_io.VEHICLE_MAP.keys()),
+        self.assertSequenceEqual(inst.vreleases,
                                  sorted(set([v.release for v in vehicles])))
 
     def testenumerator(self):
-        tests, vehicles, rehits = tp3s_io.read_inst(filepath)
-        enumerator = ColEnumerator()
+        inst = tp3s_io.load_inst(filepath)
+        enumerator = ColEnumerator(inst)
         collist = enumerator.enum()
-        seq = collist[-1]
-        print seq, seq.cost
+        self.assertEqual(len(collist), 457)
+        self.assertEqual(len(set(collist)), len(collist))
+        for col in collist:
+            for tid1, tid2 in zip(col.seq, col.seq[1:]):
+                self.assertTrue(inst.can_rehit(tid1, tid2))
+        # one order per set of tests on every release
+        self.assertEqual(len(enumerator.enum(dominance=True)), 293)
+
+    def testenumeratordominance(self):
+        inst = tp3s_io.load_inst(filepath)
+        all_cols = ColEnumerator(inst).enum()
+        cols = list(ColEnumerator(inst).iter_cols(dominance=True))
+        # the cheapest sequence of every set of tests on every release
+        cheapest = {}
+        for c in all_cols:
+            key = (c.release, frozenset(c.seq))
+            cheapest[key] = min(cheapest.get(key, float("inf")), c.cost)
+        self.assertEqual(len(cols), len(cheapest))
+        for c in cols:
+            self.assertEqual(c.cost, cheapest[(c.release, frozenset(c.seq))])
+            self.assertEqual(c.cost, Col(inst, c.seq, c.release).cost)
+
+    def testcolidentity(self):
+        inst = tp3s_io.load_inst(filepath)
+        tid1, tid2 = [(t1, t2) for t1 in inst.tids for t2 in inst.tids if inst.can_rehit(t1, t2)][0]
+        col = Col(inst, [tid1, tid2], inst.vreleases[0])
+        same = Col(inst, (tid1, tid2), inst.vreleases[0])
+        self.assertEqual(col, same)
+        self.assertEqual(len(set([col, same])), 1)
+        self.assertNotEqual(col, Col(inst, [tid2, tid1], inst.vreleases[0]))
+        self.assertEqual(col.seq, (tid1, tid2))
+        self.assertEqual(col.mask, inst.seq_mask([tid1, tid2]))
+        self.assertEqual(col.position(tid2), 1)
+        self.assertTrue(col.covers(tid1))
+        self.assertFalse(col.covers(inst.tids[-1] + 1))
+
+    def testcolpool(self):
+        inst = tp3s_io.load_inst(filepath)
+        collist = ColEnumerator(inst).enum(maxlvl=0)
+        pool = ColPool()
+        cids = [pool.add(c) for c in collist]
+        self.assertSequenceEqual(cids, range(len(collist)))
+        self.assertEqual(len(pool), len(collist))
+        self.assertIs(pool[cids[-1]], collist[-1])
+
+        # a duplicate gets the id of the column in the pool
+        first = collist[0]
+        self.assertEqual(pool.add(Col(inst, first.seq, first.release)), 0)
+        self.assertEqual(len(pool), len(collist))
+        self.assertSequenceEqual(pool.truncate(1), collist[1:])
+        self.assertEqual(pool.add(collist[-1]), 1)
+
+    def testmastercols(self):
+        cols = MasterCols(max_age=1, min_rc=1.0)
+        for key in "abcd":
+            cols.add(key)
+        # a and b nonbasic with a large reduced cost, c with a small one, d basic
+        self.assertEqual(cols.age_cols([-1, -1, -1, 0], [5, 5, 0.5, 0]), [])
+        self.assertEqual(cols.age_cols([-1, 0, -1, 0], [5, 0, 0.5, 0]), [0])
+        cols.evict([0])
+        self.assertEqual(cols.keys, ["b", "c", "d"])
+        self.assertEqual(cols.age, [0, 0, 0])
+        self.assertEqual(cols.inactive, ["a"])
+        cols.reactivate(["a"])
+        self.assertEqual(cols.inactive, [])
+        self.assertEqual(MasterCols().age_cols([-1], [5]), [])
 
     def testgrbsolver(self):
-        tp3s_io.read_inst(filepath)
-        solver = ColSolver()
+        inst = tp3s_io.load_inst(filepath)
+        solver = ColSolver(inst)
 
         solver.solve_full_enum()
 
     def testgrbsolvercolgen(self):
-        tp3s_io.read_inst(filepath)
-        solver = ColSolver()
+        inst = tp3s_io.load_inst(filepath)
+        solver = ColSolver(inst)
 
         solver.solve_col_gen()
+
+    def testcolgenfewvehicles(self):
+        # the singletons and the pairs need more vehicles than there are
+        for seed, lp_val in [(0, 368), (1, 435.5), (2, 523)]:
+            inst = tp3s_io.parse_inst(instgen.generate(14, n_vehicles=4, seed=seed, rehit_density=0.5))
+            self.assertAlmostEqual(ColSolver(inst, backend=GLPK).solve_col_gen(), lp_val)
+        # no cover at all
+        inst = tp3s_io.parse_inst(instgen.generate(10, n_vehicles=1, rehit_density=0.9))
+        self.assertIsNone(ColSolver(inst, backend=GLPK).solve_col_gen())
+
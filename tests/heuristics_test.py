@@ -0,0 +1,33 @@
+import unittest
+
+import instgen
+import tp3s_io
+from bpsolver import BPSolver
+from heuristics import Diving, LPRounding, PrimalHeuristic, RestrictedMasterIP
+
+
+class HeuristicsTestCase(unittest.TestCase):
+    def testfrequency(self):
+        self.assertEqual([d for d in range(7) if PrimalHeuristic(freq=3).runs_at(d)], [0, 3, 6])
+        self.assertEqual([d for d in range(7) if PrimalHeuristic(freq=0).runs_at(d)], [0])
+
+    def testheuristics(self):
+        # branches a few times
+        inst = tp3s_io.parse_inst(instgen.generate(30, seed=2))
+        reference = BPSolver(inst, node_select=BPSolver.BEST_BOUND)
+        reference.solve()
+        for heuristics in [[LPRounding()], [Diving(freq=2)], [RestrictedMasterIP(time_limit=5, max_cols=50)],
+                           [LPRounding(), Diving(freq=0), RestrictedMasterIP(freq=0)], []]:
+            solver = BPSolver(inst, node_select=BPSolver.BEST_BOUND, heuristics=heuristics)
+            solver.solve()
+            self.assertAlmostEqual(solver.best_inc_val, reference.best_inc_val)
+            # the incumbent covers every test within the vehicle capacities
+            used = [col for col, val in solver.inc_sol.iteritems() if val > 0.5]
+            self.assertEqual(set(tid for col in used for tid in col.seq), set(inst.tids))
+            for vrelease, n_vehicles in inst.cum_vehicle_count.iteritems():
+                self.assertLessEqual(len([col for col in used if col.release <= vrelease]), n_vehicles)
+            self.assertAlmostEqual(sum([50 + col.cost for col in used]), solver.best_inc_val)
+
+
+if __name__ == '__main__':
+    unittest.main()
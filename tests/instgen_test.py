@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import tp3s_io
+from instgen import generate, write_inst
+
+
+class InstGenTestCase(unittest.TestCase):
+    def testseed(self):
+        self.assertEqual(generate(30, seed=4), generate(30, seed=4))
+        self.assertNotEqual(generate(30, seed=4), generate(30, seed=5))
+
+    def testschema(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            j = generate(40, 25, seed=2)
+            filepath = os.path.join(tmpdir, "gen", "40.tp3s")
+            write_inst(j, filepath)
+            tests, vehicles, rehits = tp3s_io.read_inst(filepath)
+            inst = tp3s_io.load_inst(filepath)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(len(tests), 40)
+        self.assertEqual(len(vehicles), 25)
+        for d in rehits.values():
+            self.assertEqual(len(d), 40)
+        for tid1 in inst.tids:
+            self.assertFalse(inst.can_rehit(tid1, tid1))
+            for tid2 in inst.tids:
+                self.assertEqual(inst.can_rehit(tid1, tid2), rehits[tid1][tid2])
+
+    def testparameters(self):
+        inst = tp3s_io.parse_inst(generate(300, seed=1, n_clusters=4, clustering=1.0, tightness=1.0,
+                                           rehit_density=0.2))
+        self.assertLessEqual(len(set(inst.release)), 4)
+        self.assertIn(0, inst.release)
+        # fully tight windows are never longer than the duration
+        self.assertTrue(np.all(inst.deadline - inst.release <= inst.dur))
+        density = inst.rehit_matrix().sum() / float(inst.n_tests * (inst.n_tests - 1))
+        self.assertAlmostEqual(density, 0.2, delta=0.02)
+
+        inst = tp3s_io.parse_inst(generate(300, seed=1, clustering=0.0, tightness=0.0, rehit_density=0.0))
+        self.assertGreater(len(set(inst.release)), 50)
+        self.assertTrue(np.all(inst.deadline - inst.release >= inst.dur))
+        self.assertFalse(inst.rehit_matrix().any())
+
+
+if __name__ == '__main__':
+    unittest.main()
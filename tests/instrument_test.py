@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import tp3s_io
+from bpsolver import BPSolver
+from colsolver import ColSolver
+from instrument import Profiler, NULL_PROFILER, Sink, JsonSink, CProfileSink
+
+filepath = r"../data/158.tp3s"
+
+
+class RecordingSink(Sink):
+    def __init__(self):
+        self.events = []
+        self.totals = None
+
+    def start(self, phase):
+        self.events.append(("start", phase))
+
+    def stop(self, phase, elapsed):
+        self.events.append(("stop", phase))
+
+    def close(self, stats):
+        self.totals = stats
+
+
+class InstrumentTestCase(unittest.TestCase):
+    def testprofiler(self):
+        sink = RecordingSink()
+        profiler = Profiler([sink])
+        for _ in range(3):
+            with profiler.timer("pricing"):
+                with profiler.timer("master"):
+                    pass
+        profiler.count("columns", 5)
+        profiler.count("columns")
+        profiler.close()
+        self.assertEqual(sink.events[:4], [("start", "pricing"), ("start", "master"),
+                                           ("stop", "master"), ("stop", "pricing")])
+        self.assertEqual(sink.totals["phases"]["pricing"]["calls"], 3)
+        self.assertEqual(sink.totals["counters"], {"columns": 6})
+
+        other = Profiler()
+        other.merge(profiler.stats())
+        other.merge(profiler.stats())
+        self.assertEqual(other.stats()["phases"]["master"]["calls"], 6)
+        self.assertEqual(other.stats()["counters"]["columns"], 12)
+
+    def testnullprofiler(self):
+        with NULL_PROFILER.timer("master"):
+            NULL_PROFILER.count("columns")
+        self.assertEqual(NULL_PROFILER.stats(), {"phases": {}, "counters": {}})
+
+    def testsinks(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(tmpdir, "profile.json")
+            prof_path = os.path.join(tmpdir, "pricing.prof")
+            profiler = Profiler([JsonSink(json_path), CProfileSink(["pricing"], prof_path)])
+            solver = ColSolver(tp3s_io.load_inst(filepath), profiler=profiler)
+            solver.solve_col_gen()
+            profiler.close()
+            with open(json_path) as f:
+                stats = json.load(f)
+            self.assertTrue(os.path.exists(prof_path))
+        finally:
+            shutil.rmtree(tmpdir)
+        for phase in ["master", "duals", "pricing", "add_cols"]:
+            self.assertIn(phase, stats["phases"])
+        self.assertEqual(stats["phases"]["pricing"]["calls"], solver.n_pricings)
+        self.assertEqual(stats["counters"]["columns"], solver.n_cols - solver.n_seed_cols)
+
+    def testparallelprofile(self):
+        inst = tp3s_io.load_inst(filepath)
+        profiler = Profiler()
+        solver = BPSolver(inst, n_workers=2, profiler=profiler)
+        solver.solve()
+        self.assertEqual(profiler.stats()["phases"]["pricing"]["calls"], solver.n_pricings)
+        self.assertGreater(profiler.stats()["counters"]["labels"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
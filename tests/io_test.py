@@ -1,7 +1,10 @@
+import os
+import shutil
+import tempfile
 import unittest
 import tp3s_io
 
-filepath = r"..\data\157.tp3s"
+filepath = r"../data/157.tp3s"
 
 class IOTestCase(unittest.TestCase):
     def testio(self):
@@ -15,6 +18,62 @@ class IOTestCase(unittest.TestCase):
         self.assertEqual(sorted([t.test_id for t in tests]),
                          sorted(rehits.keys()))
 
+    def testinstance(self):
+        tests, vehicles, rehits = tp3s_io.read_inst(filepath)
+        inst = tp3s_io.load_inst(filepath)
+        self.assertEqual(inst.n_tests, len(tests))
+        self.assertEqual(inst.n_vehicles, len(vehicles))
+        for t in tests:
+            self.assertEqual(inst.test(t.test_id), t)
+            i = inst.idx[t.test_id]
+            self.assertEqual((inst.release[i], inst.deadline[i], inst.dur[i]), (t.release, t.deadline, t.dur))
+        for tid1 in inst.tids:
+            for tid2 in inst.tids:
+                if tid1 != tid2:
+                    self.assertEqual(inst.can_rehit(tid1, tid2), rehits[tid1][tid2])
+        self.assertFalse(inst.release.flags.writeable)
+
+    def testreleaselattice(self):
+        tests = [tp3s_io.TestRequest(1, 0, 30, 20), tp3s_io.TestRequest(2, 12, 40, 20),
+                 tp3s_io.TestRequest(3, 50, 80, 20)]
+        vehicles = [tp3s_io.Vehicle(4, 5), tp3s_io.Vehicle(5, 10), tp3s_io.Vehicle(6, 10), tp3s_io.Vehicle(7, 60)]
+        inst = tp3s_io.Instance(tests, vehicles, [[False] * 3] * 3)
+        self.assertEqual(inst.cum_vehicle_count, {5: 1, 10: 3, 60: 4})
+        # test 1 is released before every vehicle, a vehicle released at 5 or 10 starts test 2 or 3 at its release
+        self.assertEqual(inst.first_releases, ((5, 10, 60), (10, 60), (10, 60)))
+        self.assertEqual(inst.first_masks, {5: 0b001, 10: 0b111, 60: 0b111})
+
+    def testtimewindows(self):
+        tests = [tp3s_io.TestRequest(1, 0, 30, 20), tp3s_io.TestRequest(2, 12, 40, 20),
+                 tp3s_io.TestRequest(3, 50, 80, 20)]
+        vehicles = [tp3s_io.Vehicle(4, 0), tp3s_io.Vehicle(5, 10)]
+        # 2 and 3 after 1, 3 after 2
+        rehit = [[False, True, True], [False, False, True], [False, False, False]]
+        inst = tp3s_io.Instance(tests, vehicles, rehit)
+        self.assertEqual(inst.earliest_start.tolist(), [0, 12, 50])
+        # the latest starts are those of the column 1, 2, 3 on the vehicle released at 10
+        self.assertEqual(inst.latest_start.tolist(), [10, 30, 50])
+
+    def testcache(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "inst.tp3s")
+            shutil.copy(filepath, path)
+            inst = tp3s_io.load_inst(path)
+            self.assertTrue(os.path.exists(path + ".npz"))
+            cached = tp3s_io.load_inst(path)
+            self.assertEqual(cached.tests, inst.tests)
+            self.assertEqual(cached.vehicles, inst.vehicles)
+            self.assertEqual(cached.succ_masks, inst.succ_masks)
+
+            # the cache of another content is not used
+            with open(path, "a") as f:
+                f.write(" ")
+            self.assertIsNone(tp3s_io._read_cache(path + ".npz", tp3s_io._file_hash(path)))
+            self.assertEqual(tp3s_io.load_inst(path, use_cache=False).tests, inst.tests)
+        finally:
+            shutil.rmtree(tmpdir)
+
     def testDictUni(self):
         tests, vehicles, rehits = tp3s_io.read_inst(filepath)
         num_r = len(rehits.keys())
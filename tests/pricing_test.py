@@ -0,0 +1,102 @@
+import unittest
+
+import tp3s_io
+from colsolver import ColEnumerator, Col
+from bpsolver import BranchConstr
+from pricing import LabelingPricer, EnumPricer, HeuristicPricer
+
+filepath = r"../data/158.tp3s"
+
+
+class PricingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.inst = tp3s_io.load_inst(filepath)
+        self.all_cols = ColEnumerator(self.inst).enum()
+        self.test_dual = dict((tid, 30.0 + tid % 7) for tid in self.inst.tids)
+        self.vehicle_dual = dict((vrelease, -1.0) for vrelease in self.inst.vreleases)
+
+    def _reduced_cost(self, col):
+        return 50 + col.cost - sum([self.test_dual[tid] for tid in col.seq]) - self.vehicle_dual[col.release]
+
+    def testlabelingpricer(self):
+        best_rc = min([self._reduced_cost(c) for c in self.all_cols])
+
+        cols, rc = LabelingPricer(self.inst).price(self.test_dual, self.vehicle_dual)
+        self.assertAlmostEqual(rc, best_rc)
+        self.assertAlmostEqual(self._reduced_cost(cols[0]), best_rc)
+        for col in cols:
+            self.assertLess(self._reduced_cost(col), -0.001)
+
+    def testlabelingpricerbranchconstrs(self):
+        tid1, tid2 = self.inst.tids[:2]
+        constrs = [BranchConstr(tid1, tid2, None, BranchConstr.TYPE_TEST_PAIR_TOGETHER, BranchConstr.FIX_TO_ONE)]
+        feasible_cols = [c for c in self.all_cols
+                         if all([b.satisfy(c) != BranchConstr.FIX_TO_ZERO for b in constrs])]
+        best_rc = min([self._reduced_cost(c) for c in feasible_cols])
+
+        pricer = LabelingPricer(self.inst)
+        _, root_rc = pricer.price(self.test_dual, self.vehicle_dual)
+        pricer.set_branch_constrs(constrs)
+        _, rc = pricer.price(self.test_dual, self.vehicle_dual)
+        self.assertAlmostEqual(rc, best_rc)
+        pricer.clear_branch_constrs()
+        _, rc = pricer.price(self.test_dual, self.vehicle_dual)
+        self.assertAlmostEqual(rc, root_rc)
+
+    def testenumpricerbranchconstrs(self):
+        tid1, tid2 = [(t1, t2) for t1 in self.inst.tids for t2 in self.inst.tids if self.inst.can_rehit(t1, t2)][0]
+        vid = self.inst.vreleases[0]
+        pricer = EnumPricer(self.all_cols)
+        _, root_rc = pricer.price(self.test_dual, self.vehicle_dual)
+        for btype in [BranchConstr.TYPE_TEST_ONE_VEHICLE, BranchConstr.TYPE_TEST_PAIR_TOGETHER,
+                      BranchConstr.TYPE_TEST_PAIR_ORDER_ON_VEHICLE]:
+            for direction in [BranchConstr.FIX_TO_ZERO, BranchConstr.FIX_TO_ONE]:
+                constrs = [BranchConstr(tid1, tid2, vid, btype, direction)]
+                feasible_cols = [c for c in self.all_cols
+                                 if all([b.satisfy(c) != BranchConstr.FIX_TO_ZERO for b in constrs])]
+                best_rc = min([self._reduced_cost(c) for c in feasible_cols])
+
+                pricer.set_branch_constrs(constrs)
+                cols, rc = pricer.price(self.test_dual, self.vehicle_dual)
+                self.assertAlmostEqual(rc, best_rc)
+                for col in cols or []:
+                    self.assertIn(col, feasible_cols)
+        pricer.clear_branch_constrs()
+        _, rc = pricer.price(self.test_dual, self.vehicle_dual)
+        self.assertAlmostEqual(rc, root_rc)
+
+    def testenumpricerbatch(self):
+        cols, rc = EnumPricer(self.all_cols, max_cols=5).price(self.test_dual, self.vehicle_dual)
+        self.assertLessEqual(len(cols), 5)
+        self.assertEqual(len(set([(c.release, tuple(c.seq)) for c in cols])), len(cols))
+        r_costs = [self._reduced_cost(c) for c in cols]
+        self.assertEqual(r_costs, sorted(r_costs))
+        self.assertAlmostEqual(r_costs[0], rc)
+
+    def testheuristicpricerbatch(self):
+        cols, rc = HeuristicPricer(self.inst, max_cols=3).price(self.test_dual, self.vehicle_dual)
+        if cols is not None:
+            self.assertLessEqual(len(cols), 3)
+            for col in cols:
+                self.assertLess(self._reduced_cost(col), -0.001)
+                self.assertEqual(col.cost, Col(self.inst, col.seq, col.release).cost)
+
+    def testheuristicpricergrasp(self):
+        greedy_cols, _ = HeuristicPricer(self.inst, max_cols=100).price(self.test_dual, self.vehicle_dual)
+        pricer = HeuristicPricer(self.inst, max_cols=100, grasp=0.5, n_starts=200, seed=1)
+        cols, rc = pricer.price(self.test_dual, self.vehicle_dual)
+        self.assertGreater(len(cols), len(greedy_cols or []))
+        for col in cols:
+            self.assertLess(self._reduced_cost(col), -0.001)
+            self.assertEqual(col.cost, Col(self.inst, col.seq, col.release).cost)
+            for i, tid in enumerate(col.seq):
+                for tid2 in col.seq[i + 1:]:
+                    self.assertTrue(self.inst.can_rehit(tid, tid2))
+        # same seed, same columns
+        cols2, _ = HeuristicPricer(self.inst, max_cols=100, grasp=0.5, n_starts=200, seed=1).price(
+            self.test_dual, self.vehicle_dual)
+        self.assertEqual([(c.release, c.seq) for c in cols], [(c.release, c.seq) for c in cols2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import tp3s_io
+from colsolver import ColSolver
+from pricing import LabelingPricer
+from stabilization import lagrangian_bound, reduced_cost, WentgesSmoother
+
+filepath = r"../data/158.tp3s"
+
+
+class StabilizationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.inst = tp3s_io.load_inst(filepath)
+        self.full_lp = ColSolver(self.inst)._build_full_enum_model(binary=False)
+        self.full_lp.optimize()
+
+    def _duals(self, scale):
+        test_dual = dict((tid, scale * (30 + tid % 7)) for tid in self.inst.tids)
+        vehicle_dual = dict((vrelease, -scale) for vrelease in self.inst.vreleases)
+        return test_dual, vehicle_dual
+
+    def testlagrangianbound(self):
+        pricer = LabelingPricer(self.inst)
+        # any duals of the right sign give a lower bound
+        for scale in [0.0, 0.5, 1.0, 2.0]:
+            test_dual, vehicle_dual = self._duals(scale)
+            _, rc = pricer.price(test_dual, vehicle_dual)
+            self.assertLessEqual(lagrangian_bound(self.inst, test_dual, vehicle_dual, rc),
+                                 self.full_lp.objval() + 1e-6)
+
+    def testwentgessmoother(self):
+        pricer = LabelingPricer(self.inst)
+        smoother = WentgesSmoother(self.inst, 0.5)
+        for scale in [1.0, 2.0, 0.5]:
+            test_dual, vehicle_dual = self._duals(scale)
+            cols, rc = smoother.price(pricer, test_dual, vehicle_dual)
+            for col in cols:
+                self.assertLess(reduced_cost(col, test_dual, vehicle_dual), -0.001)
+            self.assertLessEqual(smoother.center_bound, self.full_lp.objval() + 1e-6)
+        self.assertEqual(smoother.n_smoothed + smoother.n_exact, 3)
+
+        smoother.reset()
+        self.assertEqual(smoother.center_bound, -float("inf"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,162 @@
+import binascii
+import hashlib
 import json
+import logging
+import os
+import zipfile
 from collections import namedtuple, defaultdict
 
+import numpy as np
+
+logger = logging.getLogger("tp3s")
+
 TestRequest = namedtuple("TestRequest", ["test_id", "release", "deadline", "dur"])
 Vehicle = namedtuple("Vehicle", ["vehicle_id", "release"])
 
-# global data info
-TEST_MAP = {}
-VEHICLE_MAP = defaultdict(list)
-REHIT_MAP = {}
+# version of the binary cache format, caches of other versions are rebuilt
+CACHE_VERSION = 1
+
+
+class Instance:
+    """
+    Immutable instance, passed explicitly to the solvers.
+    Tests are indexed densely by increasing test id.
+    tests, tids: test requests and test ids by index, idx: test id to index
+    release, deadline, dur: read-only arrays by test index
+    vehicles: vehicles, vreleases: sorted vehicle releases, vehicle_count: release to number of vehicles
+    release lattice, a vehicle can run any column of its release or of a later one:
+        cum_vehicle_count: release to number of vehicles released at or before it
+        first_releases: by test index, the releases of the columns starting with the test, that is the latest
+                        release not after the test release (the earlier ones start the test at the same time)
+                        and the later releases
+        first_masks: release to bitmask of the test indices a column of the release can start with
+    rehit: read-only bit-packed matrix (numpy.packbits along the rows),
+           bit (i, j) is set if test j can be rehit after test i
+    succ_masks, pred_masks: by test index, the tests that can be rehit after / before it as a bitmask of indices,
+                            the compatibility graph shared by the pricers and the enumerator
+    time windows, read-only arrays by test index, no column starts a test out of its window:
+        earliest_start: the test release or the first vehicle release
+        latest_start: bound on the start from the tests that can be rehit before the test, only they can come
+                      before it on a column and a column only waits for the releases
+    """
+
+    def __init__(self, tests, vehicles, rehit):
+        """
+        constructor of an instance
+        :param tests: test requests
+        :param vehicles: vehicles
+        :param rehit: boolean matrix by test index, or its bit-packed form
+        :return: an instance
+        """
+        self.tests = tuple(sorted(tests, key=lambda t: t.test_id))
+        self.tids = tuple([t.test_id for t in self.tests])
+        self.idx = dict((tid, i) for i, tid in enumerate(self.tids))
+        self.n_tests = len(self.tests)
+        self.release = self._read_only(np.array([t.release for t in self.tests], dtype=int))
+        self.deadline = self._read_only(np.array([t.deadline for t in self.tests], dtype=int))
+        self.dur = self._read_only(np.array([t.dur for t in self.tests], dtype=int))
+
+        self.vehicles = tuple(vehicles)
+        count = defaultdict(int)
+        for v in self.vehicles:
+            count[v.release] += 1
+        self.vehicle_count = dict(count)
+        self.vreleases = tuple(sorted(self.vehicle_count))
+        self.n_vehicles = len(self.vehicles)
+        self._build_release_lattice()
+
+        rehit = np.asarray(rehit)
+        if rehit.dtype == bool:
+            rehit = np.packbits(rehit, axis=1)
+        self.rehit = self._read_only(rehit)
+
+        # a test is never rehit after itself
+        matrix = self.rehit_matrix() & ~np.eye(self.n_tests, dtype=bool)
+        self.succ_masks = tuple([self._to_mask(row) for row in matrix])
+        self.pred_masks = tuple([self._to_mask(col) for col in matrix.T])
+        self._build_time_windows(matrix)
+
+    def _build_release_lattice(self):
+        counts = np.cumsum([self.vehicle_count[r] for r in self.vreleases])
+        self.cum_vehicle_count = dict(zip(self.vreleases, counts.tolist()))
+        vreleases = np.array(self.vreleases, dtype=int)
+        # index of the latest release not after each test release, -1 if none
+        anchor = np.searchsorted(vreleases, self.release, side="right") - 1
+        self.first_releases = tuple([self.vreleases[max(k, 0):] for k in anchor.tolist()])
+        masks = dict((r, 0) for r in self.vreleases)
+        for i, releases in enumerate(self.first_releases):
+            for r in releases:
+                masks[r] |= 1 << i
+        self.first_masks = masks
+
+    def _build_time_windows(self, matrix):
+        first = self.vreleases[0] if self.vreleases else 0
+        last = self.vreleases[-1] if self.vreleases else 0
+        self.earliest_start = self._read_only(np.maximum(self.release, first))
+        # a column starts at a vehicle release, the tests before a test end at the latest
+        # their durations after their releases and the vehicle release
+        pred_release = np.where(matrix, self.release[:, None], last).max(axis=0, initial=last)
+        latest = np.maximum(self.release, pred_release + self.dur.dot(matrix))
+        # and the test right before it ends at the latest its own latest start plus its duration
+        while True:
+            pred_finish = np.where(matrix, (latest + self.dur)[:, None], last).max(axis=0, initial=last)
+            tighter = np.minimum(latest, np.maximum(self.release, pred_finish))
+            if (tighter == latest).all():
+                break
+            latest = tighter
+        self.latest_start = self._read_only(latest)
+
+    @staticmethod
+    def _read_only(array):
+        array.flags.writeable = False
+        return array
+
+    @staticmethod
+    def _to_mask(row):
+        # bit j of the mask is row[j]: pack the reversed row, the padding bits end up at the bottom
+        packed = np.packbits(row[::-1])
+        if not len(packed):
+            return 0
+        return int(binascii.hexlify(packed.tobytes()), 16) >> (-len(row) % 8)
+
+    def rehit_matrix(self):
+        """
+        :return: boolean matrix, entry (i, j) is True if test j can be rehit after test i
+        """
+        return np.unpackbits(self.rehit, axis=1)[:, :self.n_tests].astype(bool)
+
+    def test(self, tid):
+        return self.tests[self.idx[tid]]
+
+    def can_rehit(self, tid1, tid2):
+        """
+        :return: True if test tid2 can be rehit after test tid1
+        """
+        return (self.succ_masks[self.idx[tid1]] >> self.idx[tid2]) & 1 == 1
+
+    def seq_mask(self, seq):
+        """
+        :param seq: test ids
+        :return: bitmask of the test indices
+        """
+        mask = 0
+        for tid in seq:
+            mask |= 1 << self.idx[tid]
+        return mask
+
+    def comp_with(self, seq_mask, tid):
+        """
+        :param seq_mask: bitmask of the tests of a sequence
+        :param tid: test id
+        :return: True if test tid can be appended to the sequence
+        """
+        i = self.idx[tid]
+        return not (seq_mask >> i) & 1 and seq_mask & ~self.pred_masks[i] == 0
 
 
 def _read_json(filepath):
     with open(filepath) as f:
-        data = f.read()
-    j = json.loads(data)
+        j = json.load(f)
     return j
 
 
@@ -53,16 +196,99 @@ def _parse_rehitrule(j):
     return rulemap
 
 
+def _parse_rehit_matrix(j, tests):
+    tids = sorted([t.test_id for t in tests])
+    idx = dict((str(tid), i) for i, tid in enumerate(tids))
+    rehit = np.zeros((len(tids), len(tids)), dtype=bool)
+    for k, v in j["rehit"].iteritems():
+        rehit[idx[k], [idx[k2] for k2, v2 in v.iteritems() if v2]] = True
+    return rehit
+
+
 def read_inst(filepath):
     j = _read_json(filepath)
     tests = _parse_test(j)
     vehicles = _parse_vehicle(j)
     rehits = _parse_rehitrule(j)
-    print "{} tests read in.".format(len(tests))
-    print "{} vehicles read in.".format(len(vehicles))
-    # build the cache maps
-    map(lambda t: TEST_MAP.update({t.test_id: t}), tests)
-    map(lambda v: VEHICLE_MAP[v.release].append(v), vehicles)
-    map(lambda k: REHIT_MAP.update({k[0]: k[1]}), rehits.iteritems())
-
+    logger.info("%d tests read in.", len(tests))
+    logger.info("%d vehicles read in.", len(vehicles))
     return tests, vehicles, rehits
+
+
+def load_inst(filepath, use_cache=True):
+    """
+    Read an instance file.
+    With the cache, the instance is stored in a binary sidecar file next to it (<filepath>.npz)
+    along with the hash of the instance file, and read from there as long as the hash matches.
+    :param filepath: path of the .tp3s file
+    :param use_cache: read and write the binary cache
+    :return: the instance
+    """
+    if use_cache:
+        digest = _file_hash(filepath)
+        inst = _read_cache(_cache_path(filepath), digest)
+        if inst is not None:
+            return inst
+
+    inst = parse_inst(_read_json(filepath))
+
+    if use_cache:
+        _write_cache(_cache_path(filepath), digest, inst)
+    return inst
+
+
+def parse_inst(j):
+    """
+    :param j: instance in the json schema of the .tp3s files
+    :return: the instance
+    """
+    tests = _parse_test(j)
+    vehicles = _parse_vehicle(j)
+    logger.info("%d tests read in.", len(tests))
+    logger.info("%d vehicles read in.", len(vehicles))
+    return Instance(tests, vehicles, _parse_rehit_matrix(j, tests))
+
+
+def _cache_path(filepath):
+    return filepath + ".npz"
+
+
+def _file_hash(filepath):
+    h = hashlib.md5()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_cache(cache_path, digest):
+    """
+    :return: the cached instance, None if there is no valid cache for this hash
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path) as data:
+            if int(data["version"]) != CACHE_VERSION or str(data["digest"]) != digest:
+                return None
+            tests = [TestRequest(*[int(x) for x in row]) for row in data["tests"]]
+            vehicles = [Vehicle(int(vid), int(r)) for vid, r in data["vehicles"]]
+            return Instance(tests, vehicles, data["rehit"])
+    except (IOError, KeyError, ValueError, zipfile.BadZipfile):
+        return None
+
+
+def _write_cache(cache_path, digest, inst):
+    # write then rename, so that a concurrent reader never sees a partial cache
+    tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    try:
+        with open(tmp_path, "wb") as f:
+            np.savez(f, version=CACHE_VERSION, digest=digest,
+                     tests=np.array([list(t) for t in inst.tests], dtype=int).reshape(-1, 4),
+                     vehicles=np.array([list(v) for v in inst.vehicles], dtype=int).reshape(-1, 2),
+                     rehit=inst.rehit)
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError):
+        # read-only directory, or a cache written concurrently on windows
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)